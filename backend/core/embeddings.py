@@ -0,0 +1,80 @@
+"""
+Embeddings - общая на весь процесс модель sentence-transformers.
+
+Векторное хранилище, долговременная память и синтез (семантический кэш,
+сходимость дебатов) используют одну загруженную модель вместо своей копии.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .logger import get_logger
+logger = get_logger(__name__)
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+    SentenceTransformer = None
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 64
+
+_models: Dict[Tuple[str, str], Optional["SentenceTransformer"]] = {}
+_models_lock = threading.Lock()
+
+
+def get_embedder(
+    model_name: str = DEFAULT_EMBEDDING_MODEL,
+    device: str = "cpu",
+    cache_folder: Optional[str] = None
+) -> Optional["SentenceTransformer"]:
+    """
+    Получить модель эмбеддингов (загружается один раз на (model_name, device)).
+
+    Returns:
+        Модель или None, если sentence-transformers недоступен или загрузка не удалась
+    """
+    if not SENTENCE_TRANSFORMERS_AVAILABLE:
+        return None
+
+    key = (model_name, device)
+    with _models_lock:
+        if key not in _models:
+            # Отключаем multiprocessing токенизатора/torch до загрузки модели
+            os.environ.setdefault('TORCH_MULTIPROCESSING', '0')
+            os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+            os.environ.setdefault('OMP_NUM_THREADS', '1')
+            try:
+                _models[key] = SentenceTransformer(model_name, device=device, cache_folder=cache_folder)
+                logger.info(f"Loaded embeddings model: {model_name} ({device})")
+            except Exception as e:
+                logger.warning(f"Failed to load embeddings model {model_name}: {e}")
+                _models[key] = None
+        return _models[key]
+
+
+def embed_batch(
+    texts: List[str],
+    normalize: bool = True,
+    model_name: str = DEFAULT_EMBEDDING_MODEL
+) -> np.ndarray:
+    """
+    Эмбеддинги для списка текстов одним батчем.
+
+    Синхронная и CPU-тяжёлая: из async кода вызывать через asyncio.to_thread.
+    """
+    model = get_embedder(model_name)
+    if model is None:
+        raise RuntimeError("Embeddings model not available")
+    return model.encode(
+        texts,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        normalize_embeddings=normalize,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
@@ -512,7 +512,7 @@ class IDAEngine:
             await self.initialize()
         
         import time
-        start_time = time.time()
+        start_ns = time.monotonic_ns()
         
         try:
             logger.debug(
@@ -547,18 +547,18 @@ class IDAEngine:
             )
             
             # Track metrics
-            duration = time.time() - start_time
+            duration_ns = time.monotonic_ns() - start_ns
             if track_metrics:
-                metrics_collector.record_task_execution(
+                metrics_collector.record_task_execution_ns(
                     task=task,
                     agent_type=agent_type,
-                    duration=duration,
+                    duration_ns=duration_ns,
                     success=result.get("success", True)
                 )
             
             # Monitor performance
             if self.monitor:
-                self.monitor.log_performance_metric("engine", "task_execution_duration_ms", duration * 1000)
+                self.monitor.log_performance_metric("engine", "task_execution_duration_ms", duration_ns / 1_000_000)
                 if not result.get("success", True):
                     self.monitor.log_exception(
                         "engine",
@@ -570,13 +570,11 @@ class IDAEngine:
             return result
         except Exception:
             # Track error in metrics
-            duration = time.time() - start_time
             if track_metrics:
-                duration = time.time() - start_time
-                metrics_collector.record_task_execution(
+                metrics_collector.record_task_execution_ns(
                     task=task,
                     agent_type=agent_type,
-                    duration=duration,
+                    duration_ns=time.monotonic_ns() - start_ns,
                     success=False
                 )
             raise
@@ -2,36 +2,394 @@
 Performance metrics collection
 """
 
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+import functools
+import random
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from itertools import islice
+from operator import attrgetter
+from typing import Dict, Any, Optional, Tuple, List
+from datetime import datetime, timezone
 from collections import defaultdict, deque
 from .logger import get_logger
 logger = get_logger(__name__)
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Below this history size plain Python aggregation beats numpy call overhead
+NUMPY_MIN_HISTORY = 4096
+
+NS_PER_SECOND = 1_000_000_000
+
+# Background ingestion: queue bound (oldest events dropped on overflow) and drain batch
+INGEST_QUEUE_SIZE = 65536
+INGEST_BATCH_SIZE = 1024
+
+
+def _iso(timestamp: float) -> str:
+    """Format a UNIX timestamp as naive UTC ISO string (API output format)"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+@dataclass(slots=True)
+class AgentMetric:
+    """Single agent execution record"""
+    timestamp: float
+    duration_ns: int
+    success: bool
+    tokens_used: Optional[int] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": _iso(self.timestamp),
+            "duration": self.duration_ns / NS_PER_SECOND,
+            "success": self.success,
+            "tokens_used": self.tokens_used
+        }
+
+
+@dataclass(slots=True)
+class ToolMetric:
+    """Single tool execution record"""
+    timestamp: float
+    duration_ns: int
+    success: bool
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": _iso(self.timestamp),
+            "duration": self.duration_ns / NS_PER_SECOND,
+            "success": self.success
+        }
+
+
+@dataclass(slots=True)
+class LlmMetric:
+    """Single LLM request record"""
+    timestamp: float
+    duration_ns: int
+    tokens: Optional[int]
+    success: bool
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": _iso(self.timestamp),
+            "duration": self.duration_ns / NS_PER_SECOND,
+            "tokens": self.tokens,
+            "success": self.success
+        }
+
+
+@dataclass(slots=True)
+class TaskMetric:
+    """Single task execution record"""
+    timestamp: float
+    task: str
+    agent_type: Optional[str]
+    duration_ns: int
+    success: bool
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": _iso(self.timestamp),
+            "task": self.task,
+            "agent_type": self.agent_type,
+            "duration": self.duration_ns / NS_PER_SECOND,
+            "success": self.success
+        }
+
+
+class _ValueRing:
+    """Preallocated int64 ring buffer for vectorized aggregation"""
+    
+    __slots__ = ("_data", "_head", "_count", "_size")
+    
+    def __init__(self, size: int):
+        self._data = np.zeros(size, dtype=np.int64)
+        self._head = 0
+        self._count = 0
+        self._size = size
+    
+    def append(self, value: int):
+        self._data[self._head] = value
+        self._head = (self._head + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+    
+    def view(self):
+        """Valid region (unordered - only used for order-independent aggregates)"""
+        if self._count < self._size:
+            return self._data[:self._count]
+        return self._data
+
+
+_timestamp_of = attrgetter("timestamp")
+
+
+class _MetricSeries:
+    """
+    Chronological metric history capped at maxlen
+    
+    Records are kept in timestamp order in a list, so time-range queries are
+    a bisect on the records' own timestamps plus a tail slice.
+    Evicted entries are dropped lazily in bulk to keep appends amortized O(1).
+    The number of successful records in the window is maintained on append
+    and eviction so stats never rescan for it.
+    
+    Every offered event, stored or not, is also folded into exact running
+    aggregates (observe()): `seen`, `seen_successes`, duration sum/min/max and
+    token sum/count. `sampled` marks that some events were not stored
+    (see MetricsCollector).
+    """
+    
+    __slots__ = (
+        "records", "successes", "seen", "seen_successes", "sampled",
+        "duration_sum", "duration_min", "duration_max", "tokens_sum", "tokens_count",
+        "_start", "_maxlen"
+    )
+    
+    def __init__(self, maxlen: int):
+        self.records: List[Any] = []
+        self.successes = 0
+        self._reset_aggregates()
+        self._start = 0
+        self._maxlen = maxlen
+    
+    def _reset_aggregates(self):
+        self.seen = 0
+        self.seen_successes = 0
+        self.sampled = False
+        self.duration_sum = 0
+        self.duration_min = 0
+        self.duration_max = 0
+        self.tokens_sum = 0
+        self.tokens_count = 0
+    
+    def observe(self, record: Any, tokens: Optional[int] = None):
+        """Fold an offered event into the exact aggregates"""
+        duration = record.duration_ns
+        if not self.seen or duration < self.duration_min:
+            self.duration_min = duration
+        if not self.seen or duration > self.duration_max:
+            self.duration_max = duration
+        self.seen += 1
+        self.duration_sum += duration
+        if record.success:
+            self.seen_successes += 1
+        if tokens:
+            self.tokens_sum += tokens
+            self.tokens_count += 1
+    
+    def append(self, record: Any):
+        records = self.records
+        # Clamp against wall-clock steps backwards to keep records sorted
+        if records and record.timestamp < records[-1].timestamp:
+            record.timestamp = records[-1].timestamp
+        records.append(record)
+        if record.success:
+            self.successes += 1
+        if len(records) - self._start > self._maxlen:
+            if records[self._start].success:
+                self.successes -= 1
+            self._start += 1
+            if self._start >= self._maxlen:
+                del records[:self._start]
+                self._start = 0
+    
+    def since(self, cutoff: float) -> List[Any]:
+        """Records with timestamp >= cutoff"""
+        idx = bisect_left(self.records, cutoff, self._start, key=_timestamp_of)
+        return self.records[idx:]
+    
+    def clear(self):
+        self.records.clear()
+        self.successes = 0
+        self._reset_aggregates()
+        self._start = 0
+    
+    def __len__(self) -> int:
+        return len(self.records) - self._start
+    
+    def __iter__(self):
+        return islice(self.records, self._start, None)
+
+
+def _ring_pair(size: int) -> Tuple[_ValueRing, _ValueRing]:
+    """Create (durations, tokens) numpy columns"""
+    return _ValueRing(size), _ValueRing(size)
+
+
+class _MetricStore(dict):
+    """Per-name store that creates capped containers on first access"""
+    
+    def __init__(self, maxlen: int, factory=_MetricSeries):
+        super().__init__()
+        self._maxlen = maxlen
+        self._factory = factory
+    
+    def __missing__(self, key):
+        value = self[key] = self._factory(self._maxlen)
+        return value
+
+
+def _synchronized(method):
+    """Apply pending events and hold the aggregation lock for the duration of a read"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._apply_lock:
+            self._drain()
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class MetricsCollector:
     """Collects and aggregates performance metrics"""
     
-    def __init__(self, max_history: int = 1000):
+    def __init__(
+        self,
+        max_history: int = 1000,
+        sample_threshold: Optional[int] = None,
+        sample_rate: float = 0.1
+    ):
         """
         Initialize metrics collector
         
         Args:
             max_history: Maximum number of metrics to keep in history
+            sample_threshold: Events per series stored in full before sampling
+                kicks in (None disables sampling). When set, per-name stats
+                come from exact running aggregates over every recorded event;
+                the sampled history only backs get_recent_metrics().
+            sample_rate: Probability of storing an event once sampling
         """
         self.max_history = max_history
+        self.sample_threshold = sample_threshold
+        self.sample_rate = sample_rate
         
         # Metrics storage
-        self._agent_metrics: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_history))
-        self._tool_metrics: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_history))
-        self._llm_metrics: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_history))
-        self._task_metrics: deque = deque(maxlen=max_history)
+        self._agent_metrics: Dict[str, _MetricSeries] = _MetricStore(max_history)
+        self._tool_metrics: Dict[str, _MetricSeries] = _MetricStore(max_history)
+        self._llm_metrics: Dict[Tuple[str, str], _MetricSeries] = _MetricStore(max_history)
+        self._task_metrics = _MetricSeries(max_history)
+        
+        # Numpy columns (durations, tokens) mirroring the series for large histories
+        self._use_numpy = NUMPY_AVAILABLE and max_history >= NUMPY_MIN_HISTORY
+        self._agent_columns: Dict[str, Tuple[_ValueRing, _ValueRing]] = _MetricStore(max_history, _ring_pair)
+        self._tool_columns: Dict[str, _ValueRing] = _MetricStore(max_history, _ValueRing)
+        self._llm_columns: Dict[Tuple[str, str], Tuple[_ValueRing, _ValueRing]] = _MetricStore(max_history, _ring_pair)
         
-        # Counters
-        self._counters: Dict[str, int] = defaultdict(int)
+        # Counters, per category and keyed by name; string keys are only
+        # built when emitting (see _render_counters())
+        self._agent_totals: Dict[str, int] = defaultdict(int)
+        self._agent_success: Dict[str, int] = defaultdict(int)
+        self._agent_errors: Dict[str, int] = defaultdict(int)
+        self._tool_totals: Dict[str, int] = defaultdict(int)
+        self._tool_success: Dict[str, int] = defaultdict(int)
+        self._llm_totals: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._llm_tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._tasks_total = 0
+        self._tasks_success = 0
         
         # Timers
         self._timers: Dict[str, list] = defaultdict(list)
+        
+        # Background ingestion (see start())
+        self._ingest: deque = deque(maxlen=INGEST_QUEUE_SIZE)
+        self._apply_lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._aggregator: Optional[threading.Thread] = None
+        
+        # Pushed stats snapshot rendered by the aggregator (see get_all_stats())
+        self._version = 0
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_version = -1
+    
+    def start(self, flush_interval: float = 0.05, snapshot_interval: float = 1.0):
+        """
+        Start background aggregation
+        
+        While running, record_* calls only enqueue events; a daemon thread
+        applies them to histories and counters in batches. Readers drain
+        pending events first, so per-name stats include everything recorded.
+        The thread also re-renders the get_all_stats() snapshot when data
+        changed, so that endpoint is served from memory.
+        
+        Args:
+            flush_interval: Seconds between aggregation passes
+            snapshot_interval: Minimum seconds between snapshot renders
+        """
+        if self._aggregator is not None:
+            return
+        self._stop_event.clear()
+        self._aggregator = threading.Thread(
+            target=self._aggregate_loop,
+            args=(flush_interval, snapshot_interval),
+            name="metrics-aggregator",
+            daemon=True
+        )
+        self._aggregator.start()
+        logger.debug("Metrics aggregator started")
+    
+    def stop(self):
+        """Stop background aggregation and apply pending events"""
+        if self._aggregator is None:
+            return
+        self._stop_event.set()
+        self._aggregator.join()
+        self._aggregator = None
+        self._snapshot = None
+        self._drain()
+        logger.debug("Metrics aggregator stopped")
+    
+    def _aggregate_loop(self, flush_interval: float, snapshot_interval: float):
+        last_render = 0.0
+        while not self._stop_event.wait(flush_interval):
+            try:
+                self._drain()
+                now = time.monotonic()
+                if self._version != self._snapshot_version and now - last_render >= snapshot_interval:
+                    self._refresh_snapshot()
+                    last_render = now
+            except Exception as e:
+                logger.error(f"Metrics aggregation failed: {e}")
+    
+    def _refresh_snapshot(self):
+        with self._apply_lock:
+            self._snapshot = self._render_all()
+            self._snapshot_version = self._version
+    
+    def _drain(self):
+        """Apply queued events in batches"""
+        ingest = self._ingest
+        if not ingest:
+            return
+        with self._apply_lock:
+            while ingest:
+                batch = [ingest.popleft() for _ in range(min(len(ingest), INGEST_BATCH_SIZE))]
+                for apply, name, metric in batch:
+                    apply(name, metric)
+                self._version += 1
+    
+    def _keep(self, series: _MetricSeries, metric: Any, tokens: Optional[int] = None) -> bool:
+        """Update exact aggregates and decide whether to store the event in the history"""
+        series.observe(metric, tokens)
+        if self.sample_threshold is None or series.seen <= self.sample_threshold:
+            return True
+        series.sampled = True
+        return random.random() < self.sample_rate
+    
+    def _submit(self, apply, name, metric):
+        """Queue event for the aggregator or apply it inline when not running"""
+        if self._aggregator is not None:
+            self._ingest.append((apply, name, metric))
+        else:
+            apply(name, metric)
     
     def record_agent_execution(
         self,
@@ -40,20 +398,33 @@ class MetricsCollector:
         success: bool,
         tokens_used: Optional[int] = None
     ):
-        """Record agent execution metrics"""
-        metric = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "duration": duration,
-            "success": success,
-            "tokens_used": tokens_used
-        }
-        self._agent_metrics[agent_name].append(metric)
+        """Record agent execution metrics (duration in seconds)"""
+        self.record_agent_execution_ns(agent_name, round(duration * NS_PER_SECOND), success, tokens_used)
+    
+    def record_agent_execution_ns(
+        self,
+        agent_name: str,
+        duration_ns: int,
+        success: bool,
+        tokens_used: Optional[int] = None
+    ):
+        """Record agent execution metrics (duration in nanoseconds, e.g. from time.monotonic_ns())"""
+        self._submit(self._apply_agent, agent_name, AgentMetric(time.time(), duration_ns, success, tokens_used))
+    
+    def _apply_agent(self, agent_name: str, metric: AgentMetric):
+        series = self._agent_metrics[agent_name]
+        if self._keep(series, metric, metric.tokens_used):
+            series.append(metric)
+            if self._use_numpy:
+                durations, tokens = self._agent_columns[agent_name]
+                durations.append(metric.duration_ns)
+                tokens.append(metric.tokens_used or 0)
         
-        self._counters[f"agent_{agent_name}_total"] += 1
-        if success:
-            self._counters[f"agent_{agent_name}_success"] += 1
+        self._agent_totals[agent_name] += 1
+        if metric.success:
+            self._agent_success[agent_name] += 1
         else:
-            self._counters[f"agent_{agent_name}_errors"] += 1
+            self._agent_errors[agent_name] += 1
     
     def record_tool_execution(
         self,
@@ -61,17 +432,28 @@ class MetricsCollector:
         duration: float,
         success: bool
     ):
-        """Record tool execution metrics"""
-        metric = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "duration": duration,
-            "success": success
-        }
-        self._tool_metrics[tool_name].append(metric)
+        """Record tool execution metrics (duration in seconds)"""
+        self.record_tool_execution_ns(tool_name, round(duration * NS_PER_SECOND), success)
+    
+    def record_tool_execution_ns(
+        self,
+        tool_name: str,
+        duration_ns: int,
+        success: bool
+    ):
+        """Record tool execution metrics (duration in nanoseconds)"""
+        self._submit(self._apply_tool, tool_name, ToolMetric(time.time(), duration_ns, success))
+    
+    def _apply_tool(self, tool_name: str, metric: ToolMetric):
+        series = self._tool_metrics[tool_name]
+        if self._keep(series, metric):
+            series.append(metric)
+            if self._use_numpy:
+                self._tool_columns[tool_name].append(metric.duration_ns)
         
-        self._counters[f"tool_{tool_name}_total"] += 1
-        if success:
-            self._counters[f"tool_{tool_name}_success"] += 1
+        self._tool_totals[tool_name] += 1
+        if metric.success:
+            self._tool_success[tool_name] += 1
     
     def record_llm_request(
         self,
@@ -81,19 +463,36 @@ class MetricsCollector:
         tokens: Optional[int] = None,
         success: bool = True
     ):
-        """Record LLM request metrics"""
-        key = f"{provider}/{model}"
-        metric = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "duration": duration,
-            "tokens": tokens,
-            "success": success
-        }
-        self._llm_metrics[key].append(metric)
+        """Record LLM request metrics (duration in seconds)"""
+        self.record_llm_request_ns(provider, model, round(duration * NS_PER_SECOND), tokens, success)
+    
+    def record_llm_request_ns(
+        self,
+        provider: str,
+        model: str,
+        duration_ns: int,
+        tokens: Optional[int] = None,
+        success: bool = True
+    ):
+        """Record LLM request metrics (duration in nanoseconds)"""
+        self._submit(
+            self._apply_llm,
+            (provider, model),
+            LlmMetric(time.time(), duration_ns, tokens, success)
+        )
+    
+    def _apply_llm(self, key: Tuple[str, str], metric: LlmMetric):
+        series = self._llm_metrics[key]
+        if self._keep(series, metric, metric.tokens):
+            series.append(metric)
+            if self._use_numpy:
+                durations, tokens_column = self._llm_columns[key]
+                durations.append(metric.duration_ns)
+                tokens_column.append(metric.tokens or 0)
         
-        self._counters[f"llm_{key}_total"] += 1
-        if tokens:
-            self._counters[f"llm_{key}_tokens"] += tokens
+        self._llm_totals[key] += 1
+        if metric.tokens:
+            self._llm_tokens[key] += metric.tokens
     
     def record_task_execution(
         self,
@@ -102,23 +501,46 @@ class MetricsCollector:
         duration: float,
         success: bool
     ):
-        """Record task execution metrics"""
-        metric = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "task": task[:100],  # Truncate long tasks
-            "agent_type": agent_type,
-            "duration": duration,
-            "success": success
-        }
-        self._task_metrics.append(metric)
+        """Record task execution metrics (duration in seconds)"""
+        self.record_task_execution_ns(task, agent_type, round(duration * NS_PER_SECOND), success)
+    
+    def record_task_execution_ns(
+        self,
+        task: str,
+        agent_type: Optional[str],
+        duration_ns: int,
+        success: bool
+    ):
+        """Record task execution metrics (duration in nanoseconds)"""
+        metric = TaskMetric(
+            time.time(),
+            task if len(task) <= 100 else task[:100],  # Truncate long tasks
+            agent_type,
+            duration_ns,
+            success
+        )
+        self._submit(self._apply_task, None, metric)
+    
+    def _apply_task(self, _name: None, metric: TaskMetric):
+        if self._keep(self._task_metrics, metric):
+            self._task_metrics.append(metric)
         
-        self._counters["tasks_total"] += 1
-        if success:
-            self._counters["tasks_success"] += 1
+        self._tasks_total += 1
+        if metric.success:
+            self._tasks_success += 1
     
+    @_synchronized
     def get_agent_stats(self, agent_name: str) -> Dict[str, Any]:
         """Get statistics for an agent"""
-        metrics = list(self._agent_metrics[agent_name])
+        metrics = self._agent_metrics[agent_name]
+        
+        if self.sample_threshold is not None and metrics.seen:
+            stats = self._exact_stats(metrics)
+            return {
+                "agent": agent_name,
+                "total_executions": metrics.seen,
+                **stats
+            }
         
         if not metrics:
             return {
@@ -129,24 +551,48 @@ class MetricsCollector:
                 "total_tokens": 0
             }
         
-        durations = [m["duration"] for m in metrics]
-        successes = [m["success"] for m in metrics]
-        tokens = [m.get("tokens_used", 0) for m in metrics if m.get("tokens_used")]
+        total = len(metrics)
+        
+        if self._use_numpy:
+            durations, tokens = self._agent_columns[agent_name]
+            return {
+                "agent": agent_name,
+                "total_executions": total,
+                "success_rate": metrics.successes / total,
+                "sampled": metrics.sampled,
+                **self._vector_stats(durations.view(), tokens.view())
+            }
+        
+        sum_dur, min_dur, max_dur, sum_tok, n_tok = self._fold_metrics(metrics, "tokens_used")
         
         return {
             "agent": agent_name,
-            "total_executions": len(metrics),
-            "success_rate": sum(successes) / len(successes) if successes else 0.0,
-            "avg_duration": sum(durations) / len(durations) if durations else 0.0,
-            "min_duration": min(durations) if durations else 0.0,
-            "max_duration": max(durations) if durations else 0.0,
-            "total_tokens": sum(tokens),
-            "avg_tokens": sum(tokens) / len(tokens) if tokens else 0.0
+            "total_executions": total,
+            "success_rate": metrics.successes / total,
+            "sampled": metrics.sampled,
+            "avg_duration": sum_dur / total / NS_PER_SECOND,
+            "min_duration": min_dur / NS_PER_SECOND,
+            "max_duration": max_dur / NS_PER_SECOND,
+            "total_tokens": sum_tok,
+            "avg_tokens": sum_tok / n_tok if n_tok else 0.0
         }
     
+    @_synchronized
     def get_tool_stats(self, tool_name: str) -> Dict[str, Any]:
         """Get statistics for a tool"""
-        metrics = list(self._tool_metrics[tool_name])
+        metrics = self._tool_metrics[tool_name]
+        
+        if self.sample_threshold is not None and metrics.seen:
+            stats = self._exact_stats(metrics)
+            return {
+                "tool": tool_name,
+                "total_executions": metrics.seen,
+                "success_rate": stats["success_rate"],
+                "sampled": stats["sampled"],
+                "avg_duration": stats["avg_duration"],
+                "min_duration": stats["min_duration"],
+                "max_duration": stats["max_duration"]
+            }
         
         if not metrics:
             return {
@@ -156,22 +602,50 @@ class MetricsCollector:
                 "avg_duration": 0.0
             }
         
-        durations = [m["duration"] for m in metrics]
-        successes = [m["success"] for m in metrics]
+        total = len(metrics)
+        
+        if self._use_numpy:
+            stats = self._vector_stats(self._tool_columns[tool_name].view())
+            return {
+                "tool": tool_name,
+                "total_executions": total,
+                "success_rate": metrics.successes / total,
+                "sampled": metrics.sampled,
+                "avg_duration": stats["avg_duration"],
+                "min_duration": stats["min_duration"],
+                "max_duration": stats["max_duration"]
+            }
+        
+        sum_dur, min_dur, max_dur, _, _ = self._fold_metrics(metrics)
         
         return {
             "tool": tool_name,
-            "total_executions": len(metrics),
-            "success_rate": sum(successes) / len(successes) if successes else 0.0,
-            "avg_duration": sum(durations) / len(durations) if durations else 0.0,
-            "min_duration": min(durations) if durations else 0.0,
-            "max_duration": max(durations) if durations else 0.0
+            "total_executions": total,
+            "success_rate": metrics.successes / total,
+            "sampled": metrics.sampled,
+            "avg_duration": sum_dur / total / NS_PER_SECOND,
+            "min_duration": min_dur / NS_PER_SECOND,
+            "max_duration": max_dur / NS_PER_SECOND
         }
     
+    @_synchronized
     def get_llm_stats(self, provider: str, model: str) -> Dict[str, Any]:
         """Get statistics for LLM provider/model"""
-        key = f"{provider}/{model}"
-        metrics = list(self._llm_metrics[key])
+        key = (provider, model)
+        metrics = self._llm_metrics[key]
+        
+        if self.sample_threshold is not None and metrics.seen:
+            stats = self._exact_stats(metrics)
+            return {
+                "provider": provider,
+                "model": model,
+                "total_requests": metrics.seen,
+                "success_rate": stats["success_rate"],
+                "sampled": stats["sampled"],
+                "avg_duration": stats["avg_duration"],
+                "total_tokens": stats["total_tokens"],
+                "avg_tokens": stats["avg_tokens"]
+            }
         
         if not metrics:
             return {
@@ -183,22 +657,106 @@ class MetricsCollector:
                 "total_tokens": 0
             }
         
-        durations = [m["duration"] for m in metrics]
-        successes = [m["success"] for m in metrics]
-        tokens = [m.get("tokens", 0) for m in metrics if m.get("tokens")]
+        total = len(metrics)
+        
+        if self._use_numpy:
+            durations, tokens = self._llm_columns[key]
+            stats = self._vector_stats(durations.view(), tokens.view())
+            return {
+                "provider": provider,
+                "model": model,
+                "total_requests": total,
+                "success_rate": metrics.successes / total,
+                "sampled": metrics.sampled,
+                "avg_duration": stats["avg_duration"],
+                "total_tokens": stats["total_tokens"],
+                "avg_tokens": stats["avg_tokens"]
+            }
+        
+        sum_dur, _, _, sum_tok, n_tok = self._fold_metrics(metrics, "tokens")
         
         return {
             "provider": provider,
             "model": model,
-            "total_requests": len(metrics),
-            "success_rate": sum(successes) / len(successes) if successes else 0.0,
-            "avg_duration": sum(durations) / len(durations) if durations else 0.0,
-            "total_tokens": sum(tokens),
-            "avg_tokens": sum(tokens) / len(tokens) if tokens else 0.0
+            "total_requests": total,
+            "success_rate": metrics.successes / total,
+            "sampled": metrics.sampled,
+            "avg_duration": sum_dur / total / NS_PER_SECOND,
+            "total_tokens": sum_tok,
+            "avg_tokens": sum_tok / n_tok if n_tok else 0.0
+        }
+    
+    @staticmethod
+    def _exact_stats(series: _MetricSeries) -> Dict[str, Any]:
+        """Stats from the running aggregates of every offered event (sampling mode)"""
+        total = series.seen
+        return {
+            "success_rate": series.seen_successes / total,
+            "sampled": series.sampled,
+            "avg_duration": series.duration_sum / total / NS_PER_SECOND,
+            "min_duration": series.duration_min / NS_PER_SECOND,
+            "max_duration": series.duration_max / NS_PER_SECOND,
+            "total_tokens": series.tokens_sum,
+            "avg_tokens": series.tokens_sum / series.tokens_count if series.tokens_count else 0.0
         }
     
+    @staticmethod
+    def _fold_metrics(metrics, tokens_field: Optional[str] = None) -> Tuple[int, int, int, int, int]:
+        """
+        Aggregate records in a single pass (durations in nanoseconds)
+        
+        Returns:
+            (sum_duration, min_duration, max_duration, sum_tokens, n_tokens)
+        """
+        sum_dur = 0
+        min_dur = max_dur = next(iter(metrics)).duration_ns
+        sum_tok = 0
+        n_tok = 0
+        
+        for m in metrics:
+            d = m.duration_ns
+            sum_dur += d
+            if d < min_dur:
+                min_dur = d
+            if d > max_dur:
+                max_dur = d
+            if tokens_field is not None:
+                t = getattr(m, tokens_field)
+                if t:
+                    sum_tok += t
+                    n_tok += 1
+        
+        return sum_dur, min_dur, max_dur, sum_tok, n_tok
+    
+    @staticmethod
+    def _vector_stats(durations, tokens=None) -> Dict[str, Any]:
+        """Aggregate numpy duration (ns)/token columns in single vectorized passes"""
+        stats = {
+            "avg_duration": int(durations.sum()) / len(durations) / NS_PER_SECOND,
+            "min_duration": int(durations.min()) / NS_PER_SECOND,
+            "max_duration": int(durations.max()) / NS_PER_SECOND
+        }
+        if tokens is not None:
+            total_tokens = int(tokens.sum())
+            tokens_count = int(np.count_nonzero(tokens))
+            stats["total_tokens"] = total_tokens
+            stats["avg_tokens"] = total_tokens / tokens_count if tokens_count else 0.0
+        return stats
+    
     def get_all_stats(self) -> Dict[str, Any]:
-        """Get all statistics"""
+        """
+        Get all statistics
+        
+        While the aggregator runs this returns its latest pushed snapshot
+        (at most snapshot_interval old); treat the result as read-only.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and self._aggregator is not None:
+            return snapshot
+        return self._render_all()
+    
+    @_synchronized
+    def _render_all(self) -> Dict[str, Any]:
         agent_stats = {
             name: self.get_agent_stats(name)
             for name in self._agent_metrics.keys()
@@ -210,12 +768,12 @@ class MetricsCollector:
         }
         
         llm_stats = {
-            key: self.get_llm_stats(*key.split("/"))
-            for key in self._llm_metrics.keys()
+            f"{provider}/{model}": self.get_llm_stats(provider, model)
+            for provider, model in self._llm_metrics.keys()
         }
         
-        task_total = self._counters.get("tasks_total", 0)
-        task_success = self._counters.get("tasks_success", 0)
+        task_total = self._tasks_total
+        task_success = self._tasks_success
         
         return {
             "agents": agent_stats,
@@ -226,26 +784,39 @@ class MetricsCollector:
                 "success": task_success,
                 "success_rate": task_success / task_total if task_total > 0 else 0.0
             },
-            "counters": dict(self._counters)
+            "counters": self._render_counters()
         }
     
+    def _render_counters(self) -> Dict[str, int]:
+        """Materialize flat 'category_name_suffix' counter keys"""
+        counters: Dict[str, int] = {}
+        for suffix, values in (("_total", self._agent_totals), ("_success", self._agent_success), ("_errors", self._agent_errors)):
+            for name, value in values.items():
+                counters["agent_" + name + suffix] = value
+        for suffix, values in (("_total", self._tool_totals), ("_success", self._tool_success)):
+            for name, value in values.items():
+                counters["tool_" + name + suffix] = value
+        for suffix, values in (("_total", self._llm_totals), ("_tokens", self._llm_tokens)):
+            for (provider, model), value in values.items():
+                counters["llm_" + provider + "/" + model + suffix] = value
+        if self._tasks_total:
+            counters["tasks_total"] = self._tasks_total
+        if self._tasks_success:
+            counters["tasks_success"] = self._tasks_success
+        return counters
+    
+    @_synchronized
     def get_recent_metrics(self, minutes: int = 60) -> Dict[str, Any]:
         """Get metrics from recent time period"""
-        cutoff = datetime.utcnow() - timedelta(minutes=minutes)
+        cutoff = time.time() - minutes * 60
         
         recent_agent_metrics = {}
         for agent_name, metrics in self._agent_metrics.items():
-            recent = [
-                m for m in metrics
-                if datetime.fromisoformat(m["timestamp"]) >= cutoff
-            ]
+            recent = [m.to_dict() for m in metrics.since(cutoff)]
             if recent:
                 recent_agent_metrics[agent_name] = recent
         
-        recent_task_metrics = [
-            m for m in self._task_metrics
-            if datetime.fromisoformat(m["timestamp"]) >= cutoff
-        ]
+        recent_task_metrics = [m.to_dict() for m in self._task_metrics.since(cutoff)]
         
         return {
             "agents": recent_agent_metrics,
@@ -253,13 +824,26 @@ class MetricsCollector:
             "period_minutes": minutes
         }
     
+    @_synchronized
     def reset(self):
         """Reset all metrics"""
+        self._snapshot = None
+        self._version += 1
         self._agent_metrics.clear()
         self._tool_metrics.clear()
         self._llm_metrics.clear()
         self._task_metrics.clear()
-        self._counters.clear()
+        self._agent_columns.clear()
+        self._tool_columns.clear()
+        self._llm_columns.clear()
+        for counters in (
+            self._agent_totals, self._agent_success, self._agent_errors,
+            self._tool_totals, self._tool_success,
+            self._llm_totals, self._llm_tokens
+        ):
+            counters.clear()
+        self._tasks_total = 0
+        self._tasks_success = 0
         self._timers.clear()
         logger.info("Metrics reset")
 
@@ -6,16 +6,130 @@ Model Performance Tracker - Отслеживание производитель
 """
 
 import asyncio
+import heapq
 import json
+import time
 import aiosqlite
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set, Tuple
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import datetime
+from operator import attrgetter
 from .logger import get_logger
 logger = get_logger(__name__)
-import statistics
+import math
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+if ORJSON_AVAILABLE:
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+    _json_loads = orjson.loads
+else:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# Сколько последних значений duration/tokens_per_sec хранится в истории
+HISTORY_SIZE = 100
+
+# С меньшим числом моделей обычная сортировка быстрее накладных расходов numpy
+VECTOR_MIN_MODELS = 64
+
+
+def _compute_scores(successful, total, avg_tps, dur_mean, dur_m2, n_history):
+    """
+    Векторный расчёт performance score для набора моделей.
+    
+    Та же формула, что и ModelMetrics._calculate_score, над массивами
+    (по одному элементу на модель). Компилируется numba при наличии.
+    """
+    safe_total = np.maximum(total, 1.0)
+    score = np.where(total > 0, successful / safe_total * 50.0, 0.0)
+    
+    # Скорость: 100 токенов/сек = 30 баллов
+    score = score + np.where(avg_tps > 0, np.minimum(avg_tps / 100.0 * 30.0, 30.0), 0.0)
+    
+    # Стабильность по коэффициенту вариации окна истории
+    has_window = (n_history > 1) & (dur_mean > 0)
+    variance = np.maximum(dur_m2, 0.0) / np.maximum(n_history - 1.0, 1.0)
+    cv = np.sqrt(variance) / np.where(dur_mean > 0, dur_mean, 1.0)
+    score = score + np.where(has_window, np.maximum(0.0, 20.0 - cv * 20.0), 0.0)
+    
+    return np.where(total > 0, score, 0.0)
+
+
+compute_scores = njit(cache=True, nogil=True)(_compute_scores) if NUMBA_AVAILABLE else _compute_scores
+
+
+def _warmup_score_kernel() -> None:
+    """
+    Прогрев JIT, чтобы компиляция не попала на первый запрос.
+    
+    Если numba не смогла скомпилировать ядро - переходим на numpy-версию.
+    """
+    global compute_scores
+    if compute_scores is _compute_scores:
+        return
+    empty = np.zeros(1, dtype=np.float64)
+    try:
+        compute_scores(empty, empty, empty, empty, empty, empty)
+    except Exception as e:
+        logger.warning(f"Numba score kernel unavailable, using numpy: {e}")
+        compute_scores = _compute_scores
+
+
+# Версия схемы БД (PRAGMA user_version)
+# 1: duration_history/tokens_per_sec_history хранятся как BLOB float32 вместо JSON
+SCHEMA_VERSION = 1
+
+
+def _history(values=()) -> deque:
+    return deque(values, maxlen=HISTORY_SIZE)
+
+
+def _pack_history(history) -> bytes:
+    """История -> BLOB float32"""
+    return np.asarray(history, dtype=np.float32).tobytes()
+
+
+def _iso_timestamp(ts: float) -> Optional[str]:
+    """Unix timestamp -> ISO строка (0.0 - не использовалась)"""
+    return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+
+def _parse_timestamp(value: Optional[str]) -> float:
+    """ISO строка из БД -> unix timestamp"""
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _unpack_history(value) -> List[float]:
+    """BLOB float32 (или JSON из старой схемы) -> список значений"""
+    if not value:
+        return []
+    if isinstance(value, bytes):
+        return np.frombuffer(value, dtype=np.float32).tolist()
+    try:
+        return _json_loads(value)
+    except (ValueError, TypeError):
+        return []
 
 
 @dataclass
@@ -34,42 +148,100 @@ class ModelMetrics:
     avg_duration: float = 0.0
     min_duration: float = float('inf')
     max_duration: float = 0.0
-    duration_history: List[float] = field(default_factory=list)
+    duration_history: deque = field(default_factory=_history)
     
     # Токены
     total_tokens: int = 0
     avg_tokens_per_sec: float = 0.0
-    tokens_per_sec_history: List[float] = field(default_factory=list)
+    tokens_per_sec_history: deque = field(default_factory=_history)
     
     # Ошибки
     error_types: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
     
-    # Последнее использование
-    last_used: Optional[datetime] = None
+    # Последнее использование (unix timestamp, в ISO - только при сериализации)
+    last_used_ts: float = 0.0
     
-    # Рейтинг (вычисляется динамически)
-    performance_score: float = 0.0
+    # Скользящие агрегаты по окну истории (Welford), O(1) на обновление
+    _dur_mean: float = field(default=0.0, init=False, repr=False)
+    _dur_m2: float = field(default=0.0, init=False, repr=False)
+    _tps_sum: float = field(default=0.0, init=False, repr=False)
+    
+    # Рейтинг: пересчитывается лениво, при первом чтении после update
+    _score: float = field(default=0.0, init=False, repr=False)
+    _score_dirty: bool = field(default=False, init=False, repr=False)
+    
+    # Строка в SoA-массивах трекера (ModelPerformanceTracker._arr): счётчик,
+    # рейтинг и признак устаревания пишутся туда в момент изменения
+    _arr: Optional[Dict[str, np.ndarray]] = field(default=None, init=False, repr=False, compare=False)
+    _row: int = field(default=-1, init=False, repr=False, compare=False)
+    
+    @property
+    def performance_score(self) -> float:
+        self._ensure_score()
+        return self._score
+    
+    @performance_score.setter
+    def performance_score(self, value: float):
+        # Явная установка (загрузка из БД, feedback, recompute_scores)
+        self._score = value
+        self._score_dirty = False
+        if self._arr is not None:
+            self._arr["score"][self._row] = value
+            self._arr["stale"][self._row] = False
+    
+    def _ensure_score(self):
+        """Пересчитать рейтинг, если метрики менялись с прошлого чтения"""
+        if self._score_dirty:
+            self._calculate_score()
+    
+    def __post_init__(self):
+        # История может прийти списком из БД - приводим к deque и пересчитываем агрегаты
+        self.duration_history = _history(self.duration_history)
+        self.tokens_per_sec_history = _history(self.tokens_per_sec_history)
+        for n, duration in enumerate(self.duration_history, 1):
+            self._add_duration(duration, n)
+        self._tps_sum = math.fsum(self.tokens_per_sec_history)
+    
+    def _add_duration(self, duration: float, n: int):
+        """Welford: добавить значение в окно размером n (уже с ним)"""
+        delta = duration - self._dur_mean
+        self._dur_mean += delta / n
+        self._dur_m2 += delta * (duration - self._dur_mean)
+    
+    def _remove_duration(self, duration: float, n: int):
+        """Welford: убрать значение из окна размером n (уже без него)"""
+        if n == 0:
+            self._dur_mean = 0.0
+            self._dur_m2 = 0.0
+            return
+        delta = duration - self._dur_mean
+        self._dur_mean -= delta / n
+        self._dur_m2 -= delta * (duration - self._dur_mean)
     
     def update(self, duration: float, tokens: int, success: bool, error_type: Optional[str] = None):
         """Обновить метрики"""
         self.total_requests += 1
-        self.last_used = datetime.now()
+        self.last_used_ts = time.time()
         
         if success:
             self.successful_requests += 1
             self.total_duration += duration
             self.total_tokens += tokens
             
-            # Обновляем историю (храним последние 100 записей)
-            self.duration_history.append(duration)
-            if len(self.duration_history) > 100:
-                self.duration_history.pop(0)
+            # Обновляем историю (deque хранит последние HISTORY_SIZE записей)
+            history = self.duration_history
+            if len(history) == HISTORY_SIZE:
+                self._remove_duration(history[0], HISTORY_SIZE - 1)
+            history.append(duration)
+            self._add_duration(duration, len(history))
             
             if duration > 0:
+                tps_history = self.tokens_per_sec_history
+                if len(tps_history) == HISTORY_SIZE:
+                    self._tps_sum -= tps_history[0]
                 tokens_per_sec = tokens / duration
-                self.tokens_per_sec_history.append(tokens_per_sec)
-                if len(self.tokens_per_sec_history) > 100:
-                    self.tokens_per_sec_history.pop(0)
+                tps_history.append(tokens_per_sec)
+                self._tps_sum += tokens_per_sec
             
             # Обновляем min/max
             if duration < self.min_duration:
@@ -81,17 +253,20 @@ class ModelMetrics:
             if self.successful_requests > 0:
                 self.avg_duration = self.total_duration / self.successful_requests
                 if self.tokens_per_sec_history:
-                    self.avg_tokens_per_sec = statistics.mean(self.tokens_per_sec_history)
+                    self.avg_tokens_per_sec = self._tps_sum / len(self.tokens_per_sec_history)
         else:
             self.failed_requests += 1
             if error_type:
                 self.error_types[error_type] += 1
         
-        # Пересчитываем performance score
-        self._calculate_score()
+        # Рейтинг пересчитается при следующем чтении
+        self._score_dirty = True
+        if self._arr is not None:
+            self._arr["total_requests"][self._row] = self.total_requests
+            self._arr["stale"][self._row] = True
     
     def _calculate_score(self):
-        """Вычисляет общий рейтинг производительности модели"""
+        """Вычисляет общий рейтинг производительности модели (см. также compute_scores)"""
         if self.total_requests == 0:
             self.performance_score = 0.0
             return
@@ -107,18 +282,15 @@ class ModelMetrics:
             score += speed_score
         
         # Стабильность (0-20 баллов) - на основе стандартного отклонения
-        if len(self.duration_history) > 1:
-            try:
-                std_dev = statistics.stdev(self.duration_history)
-                avg = statistics.mean(self.duration_history)
-                if avg > 0:
-                    # Коэффициент вариации (меньше = стабильнее)
-                    cv = std_dev / avg
-                    stability_score = max(0, 20 - cv * 20)  # До 20 баллов
-                    score += stability_score
-            except Exception as e:
-                logger.debug(f"Failed to calculate stability score: {e}")
-                # Continue without stability score
+        n = len(self.duration_history)
+        if n > 1:
+            avg = self._dur_mean
+            if avg > 0:
+                std_dev = math.sqrt(max(self._dur_m2, 0.0) / (n - 1))
+                # Коэффициент вариации (меньше = стабильнее)
+                cv = std_dev / avg
+                stability_score = max(0, 20 - cv * 20)  # До 20 баллов
+                score += stability_score
         
         self.performance_score = score
     
@@ -138,7 +310,7 @@ class ModelMetrics:
             "total_tokens": self.total_tokens,
             "performance_score": self.performance_score,
             "error_types": dict(self.error_types),
-            "last_used": self.last_used.isoformat() if self.last_used else None
+            "last_used": _iso_timestamp(self.last_used_ts)
         }
 
 
@@ -150,80 +322,156 @@ class ModelPerformanceTracker:
     позволяя системе учиться на опыте использования моделей.
     """
     
+    # Настройки соединения: WAL + synchronous=NORMAL (fsync только на checkpoint),
+    # 64MB page cache, временные таблицы в памяти, mmap 256MB.
+    # Применяются к каждому соединению отдельно.
+    _PRAGMAS_SQL = """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA cache_size=-64000;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+        PRAGMA busy_timeout=5000;
+        PRAGMA wal_autocheckpoint=1000;
+    """
+    
+    # SQL для пакетной записи
+    _SCHEMA_SQL = """
+        -- Метрики моделей
+        CREATE TABLE IF NOT EXISTS model_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            provider TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            total_requests INTEGER DEFAULT 0,
+            successful_requests INTEGER DEFAULT 0,
+            failed_requests INTEGER DEFAULT 0,
+            total_duration REAL DEFAULT 0.0,
+            avg_duration REAL DEFAULT 0.0,
+            min_duration REAL DEFAULT 0.0,
+            max_duration REAL DEFAULT 0.0,
+            total_tokens INTEGER DEFAULT 0,
+            avg_tokens_per_sec REAL DEFAULT 0.0,
+            performance_score REAL DEFAULT 0.0,
+            error_types TEXT DEFAULT '{}',
+            duration_history BLOB DEFAULT X'',
+            tokens_per_sec_history BLOB DEFAULT X'',
+            last_used TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(provider, model_name)
+        );
+        
+        -- История запросов (для детального анализа)
+        CREATE TABLE IF NOT EXISTS request_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            provider TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            duration REAL,
+            tokens INTEGER,
+            success INTEGER,
+            error_type TEXT,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        -- Индексы для быстрого поиска
+        CREATE INDEX IF NOT EXISTS idx_metrics_provider_model 
+        ON model_metrics(provider, model_name);
+        CREATE INDEX IF NOT EXISTS idx_history_timestamp 
+        ON request_history(timestamp);
+    """
+    
+    _LOAD_METRICS_SQL = """
+        SELECT provider, model_name, total_requests, successful_requests,
+               failed_requests, total_duration, avg_duration, min_duration,
+               max_duration, total_tokens, avg_tokens_per_sec, performance_score,
+               error_types, duration_history, tokens_per_sec_history, last_used
+        FROM model_metrics
+    """
+    
+    # Строка создаётся один раз (INSERT OR IGNORE), дальше только UPDATE:
+    # INSERT OR REPLACE удаляет и вставляет строку заново, переписывая индексы
+    _INSERT_METRICS_KEY_SQL = """
+        INSERT OR IGNORE INTO model_metrics (provider, model_name) VALUES (?, ?)
+    """
+    _UPDATE_METRICS_SQL = """
+        UPDATE model_metrics SET
+            total_requests = ?, successful_requests = ?, failed_requests = ?,
+            total_duration = ?, avg_duration = ?, min_duration = ?, max_duration = ?,
+            total_tokens = ?, avg_tokens_per_sec = ?, performance_score = ?,
+            error_types = ?, duration_history = ?, tokens_per_sec_history = ?,
+            last_used = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE provider = ? AND model_name = ?
+    """
+    _SAVE_HISTORY_SQL = """
+        INSERT INTO request_history 
+        (provider, model_name, duration, tokens, success, error_type)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """
+    
+    # Размер кэша подготовленных выражений sqlite3 на соединение
+    _STATEMENT_CACHE_SIZE = 32
+    
     def __init__(self, db_path: str = "memory/model_metrics.db"):
         self.metrics: Dict[str, ModelMetrics] = {}
         self._lock = asyncio.Lock()
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self.db: Optional[aiosqlite.Connection] = None
+        # Курсор для всех записей: одни и те же SQL-тексты берутся из кэша
+        # подготовленных выражений соединения, без повторного разбора
+        self._write_cursor: Optional[aiosqlite.Cursor] = None
         self._initialized = False
-        self._save_interval = 10  # Сохранять каждые N запросов
-        self._request_count = 0
+        
+        # Пакетная запись: изменения копятся в памяти и сбрасываются
+        # одной транзакцией (executemany + один commit)
+        self._flush_interval = 0.2  # Секунды между сбросами
+        self._flush_batch_size = 64  # Внеочередной сброс при N записях
+        self._pending_history: List[Tuple] = []
+        self._dirty_keys: Set[str] = set()
+        self._flush_wakeup: Optional[asyncio.Event] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._init_task: Optional[asyncio.Task] = None
+        self._known_keys: Set[Tuple[str, str]] = set()  # (provider, model_name) уже в БД
+        
+        # SoA-представление метрик для get_best_models: параллельные массивы
+        # по строке на модель (см. _columns()); строится лениво и сбрасывается
+        # только при добавлении моделей
+        self._arr: Optional[Dict[str, np.ndarray]] = None
+        self._arr_models: List[ModelMetrics] = []
+        self._closing = False
+        
+        # Очистка request_history: раз в N вставок, а не на каждую
+        self._history_limit = 10000  # Храним последние N записей
+        self._history_cleanup_every = 1000
+        self._history_writes = 0
     
     async def initialize(self) -> None:
         """Инициализация базы данных и загрузка метрик"""
         if self._initialized:
             return
         
+        # Вне try с БД: ошибка JIT не должна отключать персистентность
+        _warmup_score_kernel()
+        
         try:
-            self.db = await aiosqlite.connect(str(self.db_path))
-            await self.db.execute("PRAGMA journal_mode=WAL")
-            
-            # Создаем таблицу для метрик моделей
-            await self.db.execute("""
-                CREATE TABLE IF NOT EXISTS model_metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    provider TEXT NOT NULL,
-                    model_name TEXT NOT NULL,
-                    total_requests INTEGER DEFAULT 0,
-                    successful_requests INTEGER DEFAULT 0,
-                    failed_requests INTEGER DEFAULT 0,
-                    total_duration REAL DEFAULT 0.0,
-                    avg_duration REAL DEFAULT 0.0,
-                    min_duration REAL DEFAULT 0.0,
-                    max_duration REAL DEFAULT 0.0,
-                    total_tokens INTEGER DEFAULT 0,
-                    avg_tokens_per_sec REAL DEFAULT 0.0,
-                    performance_score REAL DEFAULT 0.0,
-                    error_types TEXT DEFAULT '{}',
-                    duration_history TEXT DEFAULT '[]',
-                    tokens_per_sec_history TEXT DEFAULT '[]',
-                    last_used TEXT,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(provider, model_name)
-                )
-            """)
-            
-            # Создаем таблицу для истории запросов (для детального анализа)
-            await self.db.execute("""
-                CREATE TABLE IF NOT EXISTS request_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    provider TEXT NOT NULL,
-                    model_name TEXT NOT NULL,
-                    duration REAL,
-                    tokens INTEGER,
-                    success INTEGER,
-                    error_type TEXT,
-                    timestamp TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Индексы для быстрого поиска
-            await self.db.execute("""
-                CREATE INDEX IF NOT EXISTS idx_metrics_provider_model 
-                ON model_metrics(provider, model_name)
-            """)
-            await self.db.execute("""
-                CREATE INDEX IF NOT EXISTS idx_history_timestamp 
-                ON request_history(timestamp)
-            """)
+            self.db = await aiosqlite.connect(
+                str(self.db_path), cached_statements=self._STATEMENT_CACHE_SIZE
+            )
             
+            # PRAGMA + схема одним вызовом
+            await self.db.executescript(self._PRAGMAS_SQL + self._SCHEMA_SQL)
             await self.db.commit()
             
+            await self._migrate_schema()
+            
             # Загружаем существующие метрики
             await self._load_metrics()
             
+            # Запускаем фоновую запись
+            self._write_cursor = await self.db.cursor()
+            self._flush_wakeup = asyncio.Event()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+            
             self._initialized = True
             logger.info(f"Performance tracker initialized with {len(self.metrics)} models loaded")
             
@@ -232,144 +480,187 @@ class ModelPerformanceTracker:
             # Продолжаем работу в memory-only режиме
             self._initialized = True
     
-    async def _load_metrics(self) -> None:
-        """Загрузка метрик из базы данных"""
-        if not self.db:
+    async def _migrate_schema(self) -> None:
+        """Миграция данных между версиями схемы"""
+        async with self.db.execute("PRAGMA user_version") as cursor:
+            (version,) = await cursor.fetchone()
+        if version >= SCHEMA_VERSION:
             return
         
-        try:
+        if version < 1:
+            # JSON-истории -> BLOB float32 (тип колонки в SQLite не ограничивает хранимое значение)
             async with self.db.execute(
-                "SELECT * FROM model_metrics"
+                "SELECT id, duration_history, tokens_per_sec_history FROM model_metrics"
             ) as cursor:
-                async for row in cursor:
-                    (id_, provider, model_name, total_requests, successful_requests,
-                     failed_requests, total_duration, avg_duration, min_duration,
-                     max_duration, total_tokens, avg_tokens_per_sec, performance_score,
-                     error_types_json, duration_history_json, tokens_per_sec_history_json,
-                     last_used, created_at, updated_at) = row
-                    
-                    key = f"{provider}:{model_name}"
-                    
-                    # Парсим JSON данные
-                    try:
-                        error_types = defaultdict(int, json.loads(error_types_json or "{}"))
-                    except (json.JSONDecodeError, TypeError):
-                        error_types = defaultdict(int)
-                    
-                    try:
-                        duration_history = json.loads(duration_history_json or "[]")
-                    except (json.JSONDecodeError, TypeError):
-                        duration_history = []
-                    
-                    try:
-                        tokens_per_sec_history = json.loads(tokens_per_sec_history_json or "[]")
-                    except (json.JSONDecodeError, TypeError):
-                        tokens_per_sec_history = []
-                    
-                    # Парсим last_used
-                    last_used_dt = None
-                    if last_used:
-                        try:
-                            last_used_dt = datetime.fromisoformat(last_used)
-                        except (ValueError, TypeError):
-                            pass
-                    
-                    self.metrics[key] = ModelMetrics(
-                        model_name=model_name,
-                        provider=provider,
-                        total_requests=total_requests,
-                        successful_requests=successful_requests,
-                        failed_requests=failed_requests,
-                        total_duration=total_duration,
-                        avg_duration=avg_duration,
-                        min_duration=min_duration if min_duration > 0 else float('inf'),
-                        max_duration=max_duration,
-                        total_tokens=total_tokens,
-                        avg_tokens_per_sec=avg_tokens_per_sec,
-                        performance_score=performance_score,
-                        error_types=error_types,
-                        duration_history=duration_history,
-                        tokens_per_sec_history=tokens_per_sec_history,
-                        last_used=last_used_dt
-                    )
-                    
-        except Exception as e:
-            logger.error(f"Failed to load metrics: {e}")
+                rows = await cursor.fetchall()
+            await self.db.executemany(
+                "UPDATE model_metrics SET duration_history = ?, tokens_per_sec_history = ? WHERE id = ?",
+                [
+                    (_pack_history(_unpack_history(durations)), _pack_history(_unpack_history(tps)), id_)
+                    for id_, durations, tps in rows
+                ]
+            )
+        
+        await self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        await self.db.commit()
+        logger.info(f"Performance tracker schema migrated from v{version} to v{SCHEMA_VERSION}")
     
-    async def _save_metrics(self, metrics: ModelMetrics) -> None:
-        """Сохранение метрик в базу данных"""
+    async def _load_metrics(self) -> None:
+        """Загрузка метрик из базы данных"""
         if not self.db:
             return
         
         try:
-            await self.db.execute("""
-                INSERT OR REPLACE INTO model_metrics 
-                (provider, model_name, total_requests, successful_requests, failed_requests,
-                 total_duration, avg_duration, min_duration, max_duration, total_tokens,
-                 avg_tokens_per_sec, performance_score, error_types, duration_history,
-                 tokens_per_sec_history, last_used, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (
-                metrics.provider,
-                metrics.model_name,
-                metrics.total_requests,
-                metrics.successful_requests,
-                metrics.failed_requests,
-                metrics.total_duration,
-                metrics.avg_duration,
-                metrics.min_duration if metrics.min_duration != float('inf') else 0.0,
-                metrics.max_duration,
-                metrics.total_tokens,
-                metrics.avg_tokens_per_sec,
-                metrics.performance_score,
-                json.dumps(dict(metrics.error_types)),
-                json.dumps(metrics.duration_history[-100:]),  # Храним последние 100
-                json.dumps(metrics.tokens_per_sec_history[-100:]),
-                metrics.last_used.isoformat() if metrics.last_used else None
-            ))
-            await self.db.commit()
+            # Все строки одним fetchall - один переход в поток aiosqlite вместо
+            # построчной асинхронной итерации
+            async with self.db.execute(self._LOAD_METRICS_SQL) as cursor:
+                rows = await cursor.fetchall()
+            
+            for (provider, model_name, total_requests, successful_requests,
+                 failed_requests, total_duration, avg_duration, min_duration,
+                 max_duration, total_tokens, avg_tokens_per_sec, performance_score,
+                 error_types_json, duration_history_blob, tokens_per_sec_history_blob,
+                 last_used) in rows:
+                
+                # Парсим JSON данные
+                try:
+                    error_types = defaultdict(int, _json_loads(error_types_json or "{}"))
+                except (ValueError, TypeError):
+                    error_types = defaultdict(int)
+                
+                metrics = ModelMetrics(
+                    model_name=model_name,
+                    provider=provider,
+                    total_requests=total_requests,
+                    successful_requests=successful_requests,
+                    failed_requests=failed_requests,
+                    total_duration=total_duration,
+                    avg_duration=avg_duration,
+                    min_duration=min_duration if min_duration > 0 else float('inf'),
+                    max_duration=max_duration,
+                    total_tokens=total_tokens,
+                    avg_tokens_per_sec=avg_tokens_per_sec,
+                    error_types=error_types,
+                    duration_history=_unpack_history(duration_history_blob),
+                    tokens_per_sec_history=_unpack_history(tokens_per_sec_history_blob),
+                    last_used_ts=_parse_timestamp(last_used)
+                )
+                # Сохранённый рейтинг может включать поправки из feedback
+                metrics.performance_score = performance_score
+                self.metrics[f"{provider}:{model_name}"] = metrics
+            
+            self._known_keys.update((row[0], row[1]) for row in rows)
+            self._arr = None
+            
         except Exception as e:
-            logger.error(f"Failed to save metrics: {e}")
+            logger.error(f"Failed to load metrics: {e}")
     
-    async def _save_request_history(
-        self,
-        provider: str,
-        model: str,
-        duration: float,
-        tokens: int,
-        success: bool,
-        error_type: Optional[str]
-    ) -> None:
-        """Сохранение истории запросов для анализа"""
-        if not self.db:
+    @staticmethod
+    def _metrics_row(metrics: ModelMetrics) -> Tuple:
+        """Параметры для _UPDATE_METRICS_SQL"""
+        return (
+            metrics.total_requests,
+            metrics.successful_requests,
+            metrics.failed_requests,
+            metrics.total_duration,
+            metrics.avg_duration,
+            metrics.min_duration if metrics.min_duration != float('inf') else 0.0,
+            metrics.max_duration,
+            metrics.total_tokens,
+            metrics.avg_tokens_per_sec,
+            metrics.performance_score,
+            _json_dumps(dict(metrics.error_types)),
+            _pack_history(metrics.duration_history),
+            _pack_history(metrics.tokens_per_sec_history),
+            _iso_timestamp(metrics.last_used_ts),
+            metrics.provider,
+            metrics.model_name
+        )
+    
+    async def _write_metrics(self, metrics_list: List[ModelMetrics]) -> None:
+        """Записать метрики без commit (вызывающий код завершает транзакцию)"""
+        new_keys = [
+            (m.provider, m.model_name) for m in metrics_list
+            if (m.provider, m.model_name) not in self._known_keys
+        ]
+        if new_keys:
+            await self._write_cursor.executemany(self._INSERT_METRICS_KEY_SQL, new_keys)
+            self._known_keys.update(new_keys)
+        await self._write_cursor.executemany(self._UPDATE_METRICS_SQL, [self._metrics_row(m) for m in metrics_list])
+    
+    def _enqueue(self, key: str, history_row: Tuple) -> None:
+        """Поставить изменения в очередь фоновой записи"""
+        if self._writer_task is None:
+            if self._initialized:
+                # memory-only режим - писать некуда
+                return
+            # БД ещё не открыта - инициализируем лениво, если есть event loop
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            if self._init_task is None:
+                self._init_task = asyncio.create_task(self.initialize())
+        
+        self._dirty_keys.add(key)
+        self._pending_history.append(history_row)
+        
+        if self._writer_task is not None and len(self._pending_history) >= self._flush_batch_size:
+            self._flush_wakeup.set()
+    
+    async def _writer_loop(self) -> None:
+        """Фоновая задача: периодически сбрасывает накопленные изменения"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            await self.flush()
+    
+    async def flush(self) -> None:
+        """Записать накопленные метрики и историю одной транзакцией"""
+        if not self.db or not (self._pending_history or self._dirty_keys):
             return
         
-        try:
-            await self.db.execute("""
-                INSERT INTO request_history 
-                (provider, model_name, duration, tokens, success, error_type)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (provider, model, duration, tokens, 1 if success else 0, error_type))
+        async with self._lock:
+            history, self._pending_history = self._pending_history, []
+            keys, self._dirty_keys = self._dirty_keys, set()
+            dirty = [self.metrics[key] for key in keys if key in self.metrics]
             
-            # Очистка старых записей (храним последние 10000)
-            await self.db.execute("""
-                DELETE FROM request_history 
-                WHERE id NOT IN (
-                    SELECT id FROM request_history 
-                    ORDER BY timestamp DESC 
-                    LIMIT 10000
-                )
-            """)
-            await self.db.commit()
-        except Exception as e:
-            logger.debug(f"Failed to save request history: {e}")
+            try:
+                if dirty:
+                    await self._write_metrics(dirty)
+                if history:
+                    await self._write_cursor.executemany(self._SAVE_HISTORY_SQL, history)
+                    self._history_writes += len(history)
+                    if self._history_writes >= self._history_cleanup_every:
+                        self._history_writes = 0
+                        # id монотонно растёт (AUTOINCREMENT) - range scan по PK без сортировки
+                        await self._write_cursor.execute("""
+                            DELETE FROM request_history 
+                            WHERE id <= (SELECT MAX(id) FROM request_history) - ?
+                        """, (self._history_limit,))
+                await self.db.commit()
+            except Exception as e:
+                logger.error(f"Failed to flush metrics: {e}")
     
     async def shutdown(self) -> None:
         """Закрытие соединения с базой данных"""
+        if self._writer_task:
+            # Даём писателю завершить текущую транзакцию и выйти
+            self._closing = True
+            self._flush_wakeup.set()
+            await self._writer_task
+            self._writer_task = None
+        
         if self.db:
-            # Сохраняем все метрики перед закрытием
-            for metrics in self.metrics.values():
-                await self._save_metrics(metrics)
+            # Сохраняем все метрики перед закрытием - одной транзакцией
+            self._dirty_keys.update(self.metrics)
+            await self.flush()
+            if self._write_cursor:
+                await self._write_cursor.close()
+                self._write_cursor = None
             await self.db.close()
             self.db = None
             logger.info("Performance tracker shutdown complete")
@@ -382,6 +673,7 @@ class ModelPerformanceTracker:
                 model_name=model,
                 provider=provider
             )
+            self._arr = None  # Состав моделей изменился
         return self.metrics[key]
     
     def record_request(
@@ -397,18 +689,11 @@ class ModelPerformanceTracker:
         metrics = self.get_metrics(provider, model)
         metrics.update(duration, tokens, success, error_type)
         
-        # Планируем асинхронное сохранение
-        self._request_count += 1
-        if self._request_count >= self._save_interval:
-            self._request_count = 0
-            # Создаем задачу для асинхронного сохранения
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    asyncio.create_task(self._async_save(provider, model, duration, tokens, success, error_type))
-            except RuntimeError:
-                # Если нет event loop, сохраним позже
-                pass
+        # Сохранение выполняет фоновая пакетная запись
+        self._enqueue(
+            f"{provider}:{model}",
+            (provider, model, duration, tokens, 1 if success else 0, error_type)
+        )
     
     async def record_request_async(
         self,
@@ -417,36 +702,43 @@ class ModelPerformanceTracker:
         duration: float,
         tokens: int,
         success: bool,
-        error_type: Optional[str] = None
+        error_type: Optional[str] = None,
+        flush: bool = False
     ):
-        """Записать метрики запроса (асинхронная версия с персистентностью)"""
+        """
+        Записать метрики запроса (асинхронная версия с персистентностью)
+        
+        Запись идёт тем же путём, что и record_request - через очередь
+        фонового писателя. С flush=True дожидается сброса пакета в БД.
+        """
         # Инициализируем если нужно
         if not self._initialized:
-            await self.initialize()
+            if self._init_task is None:
+                self._init_task = asyncio.create_task(self.initialize())
+            await self._init_task
         
-        metrics = self.get_metrics(provider, model)
-        metrics.update(duration, tokens, success, error_type)
+        self.record_request(provider, model, duration, tokens, success, error_type)
         
-        # Сохраняем в базу данных
-        await self._save_metrics(metrics)
-        await self._save_request_history(provider, model, duration, tokens, success, error_type)
+        if flush:
+            await self.flush()
     
-    async def _async_save(
-        self,
-        provider: str,
-        model: str,
-        duration: float,
-        tokens: int,
-        success: bool,
-        error_type: Optional[str]
-    ):
-        """Асинхронное сохранение метрик"""
-        if not self._initialized:
-            await self.initialize()
+    def recompute_scores(self, metrics_list: Optional[List[ModelMetrics]] = None) -> None:
+        """Пересчитать performance score для набора моделей одним векторным проходом"""
+        if metrics_list is None:
+            metrics_list = list(self.metrics.values())
+        if not metrics_list:
+            return
         
-        metrics = self.get_metrics(provider, model)
-        await self._save_metrics(metrics)
-        await self._save_request_history(provider, model, duration, tokens, success, error_type)
+        scores = compute_scores(
+            np.array([m.successful_requests for m in metrics_list], dtype=np.float64),
+            np.array([m.total_requests for m in metrics_list], dtype=np.float64),
+            np.array([m.avg_tokens_per_sec for m in metrics_list], dtype=np.float64),
+            np.array([m._dur_mean for m in metrics_list], dtype=np.float64),
+            np.array([m._dur_m2 for m in metrics_list], dtype=np.float64),
+            np.array([len(m.duration_history) for m in metrics_list], dtype=np.float64)
+        )
+        for m, score in zip(metrics_list, scores.tolist()):
+            m.performance_score = score
     
     def get_best_models(
         self,
@@ -455,21 +747,66 @@ class ModelPerformanceTracker:
         limit: int = 10
     ) -> List[Dict[str, Any]]:
         """Получить лучшие модели по производительности"""
-        candidates = []
+        if not self.metrics or limit <= 0:
+            return []
         
-        for key, metrics in self.metrics.items():
-            if metrics.total_requests < min_requests:
-                continue
-            
-            if provider and metrics.provider != provider:
-                continue
-            
-            candidates.append(metrics)
+        if len(self.metrics) < VECTOR_MIN_MODELS:
+            candidates = [
+                m for m in self.metrics.values()
+                if m.total_requests >= min_requests and (not provider or m.provider == provider)
+            ]
+            candidates.sort(key=attrgetter("performance_score"), reverse=True)
+            return [m.get_stats() for m in candidates[:limit]]
+        
+        arr = self._columns()
+        
+        # Устаревшие рейтинги пересчитываем одним векторным проходом;
+        # recompute_scores пишет их обратно в arr["score"]
+        stale = np.flatnonzero(arr["stale"])
+        if stale.size:
+            self.recompute_scores([self._arr_models[i] for i in stale])
+        
+        mask = arr["total_requests"] >= min_requests
+        if provider:
+            mask &= arr["provider"] == provider
+        
+        top = self._top_indices(arr["score"], np.flatnonzero(mask), limit)
+        return [self._arr_models[i].get_stats() for i in top]
+    
+    def _columns(self) -> Dict[str, np.ndarray]:
+        """
+        SoA-массивы метрик (по строке на модель), перестраиваются только
+        при изменении состава моделей.
         
-        # Сортируем по performance_score
-        candidates.sort(key=lambda m: m.performance_score, reverse=True)
+        Дальше их поддерживают сами ModelMetrics: update() пишет счётчик
+        и помечает рейтинг устаревшим, установка performance_score (в т.ч.
+        из feedback-роутера и recompute_scores) пишет рейтинг.
+        """
+        if self._arr is not None and len(self._arr_models) == len(self.metrics):
+            return self._arr
         
-        return [m.get_stats() for m in candidates[:limit]]
+        models = list(self.metrics.values())
+        arr = {
+            "provider": np.array([m.provider for m in models], dtype=object),
+            "score": np.array([m._score for m in models], dtype=np.float64),
+            "total_requests": np.array([m.total_requests for m in models], dtype=np.int64),
+            "stale": np.array([m._score_dirty for m in models], dtype=bool),
+        }
+        for row, m in enumerate(models):
+            m._arr = arr
+            m._row = row
+        self._arr = arr
+        self._arr_models = models
+        return arr
+    
+    @staticmethod
+    def _top_indices(scores: np.ndarray, candidates: np.ndarray, limit: int) -> np.ndarray:
+        """Индексы top-`limit` кандидатов по убыванию score (O(N) отбор + сортировка K)"""
+        if candidates.size > limit:
+            part = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[part]
+        order = np.argsort(-scores[candidates], kind="stable")
+        return candidates[order]
     
     def get_model_recommendation(
         self,
@@ -507,14 +844,26 @@ class ModelPerformanceTracker:
     
     def get_all_stats(self) -> Dict[str, Any]:
         """Получить статистику всех моделей"""
+        # Один проход по моделям вместо отдельного sum/mean на каждое поле
+        models = []
+        total_requests = total_successful = total_failed = 0
+        score_sum = 0.0
+        for m in self.metrics.values():
+            stats = m.get_stats()
+            models.append(stats)
+            total_requests += m.total_requests
+            total_successful += m.successful_requests
+            total_failed += m.failed_requests
+            score_sum += stats["performance_score"]
+        
         return {
-            "total_models": len(self.metrics),
-            "models": [m.get_stats() for m in self.metrics.values()],
+            "total_models": len(models),
+            "models": models,
             "summary": {
-                "total_requests": sum(m.total_requests for m in self.metrics.values()),
-                "total_successful": sum(m.successful_requests for m in self.metrics.values()),
-                "total_failed": sum(m.failed_requests for m in self.metrics.values()),
-                "avg_performance_score": statistics.mean([m.performance_score for m in self.metrics.values()]) if self.metrics else 0.0
+                "total_requests": total_requests,
+                "total_successful": total_successful,
+                "total_failed": total_failed,
+                "avg_performance_score": score_sum / len(models) if models else 0.0
             }
         }
     
@@ -526,52 +875,55 @@ class ModelPerformanceTracker:
         if not self.metrics:
             return {"status": "no_data", "recommendations": []}
         
-        insights = {
-            "status": "ok",
-            "total_experience": sum(m.total_requests for m in self.metrics.values()),
-            "models_analyzed": len(self.metrics),
-            "recommendations": [],
-            "top_performers": [],
-            "underperformers": [],
-            "error_patterns": {}
-        }
-        
-        # Топ-3 лучших модели
-        sorted_models = sorted(
-            self.metrics.values(),
-            key=lambda m: m.performance_score,
-            reverse=True
-        )
-        
-        insights["top_performers"] = [
-            {
-                "model": m.model_name,
-                "provider": m.provider,
-                "score": m.performance_score,
-                "success_rate": m.successful_requests / max(m.total_requests, 1),
-                "avg_speed": m.avg_tokens_per_sec
-            }
-            for m in sorted_models[:3] if m.total_requests >= 3
-        ]
+        # Один проход: опыт, топ-3 (куча), проблемные модели, паттерны ошибок
+        total_experience = 0
+        top_heap: List[Tuple[float, int, ModelMetrics]] = []
+        underperformers = []
+        all_errors: Dict[str, int] = defaultdict(int)
         
-        # Модели с проблемами
-        for m in self.metrics.values():
+        for i, m in enumerate(self.metrics.values()):
+            total_experience += m.total_requests
+            
+            # -i: при равном score раньше идёт модель, добавленная раньше
+            entry = (m.performance_score, -i, m)
+            if len(top_heap) < 3:
+                heapq.heappush(top_heap, entry)
+            elif entry[:2] > top_heap[0][:2]:
+                heapq.heapreplace(top_heap, entry)
+            
             if m.total_requests >= 5:
                 success_rate = m.successful_requests / m.total_requests
                 if success_rate < 0.8:
-                    insights["underperformers"].append({
+                    underperformers.append({
                         "model": m.model_name,
                         "provider": m.provider,
                         "success_rate": success_rate,
                         "common_errors": dict(m.error_types)
                     })
-        
-        # Паттерны ошибок
-        all_errors: Dict[str, int] = defaultdict(int)
-        for m in self.metrics.values():
+            
             for error_type, count in m.error_types.items():
                 all_errors[error_type] += count
-        insights["error_patterns"] = dict(all_errors)
+        
+        top = [m for _, _, m in sorted(top_heap, key=lambda e: e[:2], reverse=True)]
+        
+        insights = {
+            "status": "ok",
+            "total_experience": total_experience,
+            "models_analyzed": len(self.metrics),
+            "recommendations": [],
+            "top_performers": [
+                {
+                    "model": m.model_name,
+                    "provider": m.provider,
+                    "score": m.performance_score,
+                    "success_rate": m.successful_requests / max(m.total_requests, 1),
+                    "avg_speed": m.avg_tokens_per_sec
+                }
+                for m in top if m.total_requests >= 3
+            ],
+            "underperformers": underperformers,
+            "error_patterns": dict(all_errors)
+        }
         
         # Рекомендации
         if insights["top_performers"]:
@@ -8,16 +8,208 @@ Multi-Agent Synthesis - синтез результатов от несколь
 - Оценку качества синтеза
 """
 
+import asyncio
+import functools
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from typing import Awaitable, Callable, List, Dict, Any, Optional, Tuple
 from enum import Enum
 
+import numpy as np
+
+from .embeddings import SENTENCE_TRANSFORMERS_AVAILABLE, embed_batch
 from .logger import get_logger
 from ..llm.providers import LLMProviderManager
 from ..llm.base import LLMMessage
 
 logger = get_logger(__name__)
 
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    tiktoken = None
+
+# Вызовы с температурой выше не кэшируются: ответ не детерминирован
+SEMANTIC_CACHE_MAX_TEMPERATURE = 0.3
+# Точный кэш - только для практически детерминированных вызовов (оценка, выбор)
+EXACT_CACHE_MAX_TEMPERATURE = 0.1
+
+# Отрыв уверенности лидера от второго агента, при котором выбор очевиден без LLM
+DOMINANT_CONFIDENCE_GAP = 0.3
+
+# Порог сходства (Jaccard по шинглам), выше которого ответы агентов считаются дубликатами
+DUPLICATE_SIMILARITY = 0.85
+SHINGLE_SIZE = 3
+
+# Дебаты останавливаются, когда ответы сошлись (среднее попарное сходство)
+# или перестали сближаться между раундами
+DEBATE_CONVERGENCE_SIMILARITY = 0.97
+DEBATE_MIN_SIMILARITY_DELTA = 0.01
+
+# Бюджет ответа: база + N токенов на токен входа (не больше лимита вызова).
+# Длина входа считается по первым OUTPUT_BUDGET_PREFIX символам каждого ответа
+OUTPUT_BUDGET_BASE = 200
+OUTPUT_BUDGET_PER_INPUT_TOKEN = 2
+OUTPUT_BUDGET_PREFIX = 3000
+
+_SCORE_RE = re.compile(r'\b(\d{1,3})\b')
+_WORD_RE = re.compile(r'\w+')
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoding():
+    """Токенизатор cl100k_base или None (без tiktoken или без сети для загрузки)"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.debug(f"tiktoken encoding unavailable, using length heuristic: {e}")
+        return None
+
+
+@functools.lru_cache(maxsize=1024)
+def _token_len(text: str) -> int:
+    """Число токенов в начале текста (~4 символа на токен без tiktoken)"""
+    prefix = text[:OUTPUT_BUDGET_PREFIX]
+    encoding = _token_encoding()
+    if encoding is None:
+        return len(prefix) // 4
+    return len(encoding.encode(prefix, disallowed_special=()))
+
+
+def _output_budget(contents: List[str], limit: int) -> int:
+    """max_tokens для ответа по длине входных ответов агентов"""
+    input_tokens = sum(_token_len(content) for content in contents)
+    return min(limit, OUTPUT_BUDGET_BASE + OUTPUT_BUDGET_PER_INPUT_TOKEN * input_tokens)
+
+
+def _shingles(text: str) -> set:
+    """Множество словесных шинглов текста"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard_matrix(texts: List[str]) -> np.ndarray:
+    """
+    Матрица попарного Jaccard-сходства текстов по шинглам.
+    
+    Шинглы кодируются бинарной матрицей (N, V): пересечения - одно
+    произведение M @ M.T (BLAS), объединения - |A| + |B| - |A & B|.
+    """
+    sets = [_shingles(text) for text in texts]
+    vocabulary: Dict[tuple, int] = {}
+    rows, cols = [], []
+    for row, shingles in enumerate(sets):
+        for shingle in shingles:
+            rows.append(row)
+            cols.append(vocabulary.setdefault(shingle, len(vocabulary)))
+    
+    matrix = np.zeros((len(texts), max(len(vocabulary), 1)), dtype=np.float32)
+    matrix[rows, cols] = 1.0
+    intersections = matrix @ matrix.T
+    sizes = np.diag(intersections)
+    unions = sizes[:, None] + sizes[None, :] - intersections
+    return np.divide(intersections, unions, out=np.ones_like(intersections), where=unions > 0)
+
+
+def _mean_off_diagonal(similarities: np.ndarray) -> float:
+    """Среднее попарное сходство по матрице (без диагонали)"""
+    n = len(similarities)
+    if n < 2:
+        return 1.0
+    return float((similarities.sum() - np.trace(similarities)) / (n * (n - 1)))
+
+
+def _cluster_duplicates(agents_content: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Схлопывает почти одинаковые ответы агентов.
+    
+    Жадная кластеризация по убыванию уверенности: ответ присоединяется к
+    первому представителю с Jaccard >= DUPLICATE_SIMILARITY. Агентов в
+    синтезе единицы, поэтому точный Jaccard дешевле MinHash/LSH; матрица
+    сходства считается целиком одним матричным произведением.
+    Представителю добавляются ключи "duplicates" (имена поглощённых агентов).
+    """
+    order = sorted(range(len(agents_content)), key=lambda i: agents_content[i]["confidence"], reverse=True)
+    duplicate = _jaccard_matrix([a["content"] for a in agents_content]) >= DUPLICATE_SIMILARITY
+    
+    representatives: Dict[int, Dict[str, Any]] = {}
+    for i in order:
+        agent = agents_content[i]
+        owner = next((r for r in representatives if duplicate[i, r]), None)
+        if owner is None:
+            representatives[i] = {**agent, "duplicates": []}
+        else:
+            representatives[owner]["duplicates"].append(agent["agent"])
+    
+    # Сохраняем исходный порядок агентов
+    return [representatives[i] for i in sorted(representatives)]
+
+
+def _mean_pairwise_jaccard(texts: List[str]) -> float:
+    """Среднее попарное сходство текстов по шинглам"""
+    return _mean_off_diagonal(_jaccard_matrix(texts))
+
+
+def _coverage_quality(synthesis: str, contents: List[str]) -> float:
+    """
+    Быстрая оценка качества синтеза без LLM: доля слов ответов агентов,
+    вошедших в синтез, отображённая в [0.5, 1.0] (0.5 - оценка по умолчанию).
+    """
+    synthesis_words = set(_WORD_RE.findall(synthesis.lower()))
+    coverages = []
+    for content in contents:
+        words = set(_WORD_RE.findall(content.lower()))
+        if words:
+            coverages.append(len(words & synthesis_words) / len(words))
+    if not coverages:
+        return 0.5
+    return 0.5 + 0.5 * sum(coverages) / len(coverages)
+
+
+def _find_json(text: str) -> Optional[str]:
+    """
+    Первый сбалансированный JSON-объект {...} в тексте.
+    
+    Линейный проход со счётчиком скобок: вложенные объекты и скобки внутри
+    строк обрабатываются корректно, сканирование останавливается на первом
+    закрытом объекте.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
 
 class SynthesisStrategy(Enum):
     """Стратегия синтеза."""
@@ -38,17 +230,32 @@ class AgentResult:
     confidence: float = 0.5
     execution_time: float = 0.0
     
+    # Кэш извлечённого содержимого и его обрезанных версий (result не меняется
+    # после создания, а стратегии синтеза читают содержимое многократно)
+    _content: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _trimmed: Dict[int, str] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
     def get_content(self) -> str:
         """Извлекает основное содержимое результата."""
-        result = self.result
-        return (
-            result.get("code") or
-            result.get("report") or
-            result.get("analysis") or
-            result.get("final_answer") or
-            result.get("answer") or
-            str(result.get("result", ""))
-        )
+        if self._content is None:
+            result = self.result
+            self._content = (
+                result.get("code") or
+                result.get("report") or
+                result.get("analysis") or
+                result.get("final_answer") or
+                result.get("answer") or
+                result.get("content") or  # Промежуточные результаты синтеза
+                str(result.get("result", ""))
+            )
+        return self._content
+    
+    def get_trimmed(self, limit: int) -> str:
+        """Содержимое, обрезанное до limit символов (кэшируется по limit)."""
+        trimmed = self._trimmed.get(limit)
+        if trimmed is None:
+            trimmed = self._trimmed[limit] = self.get_content()[:limit]
+        return trimmed
 
 
 @dataclass
@@ -62,6 +269,26 @@ class SynthesisResult:
     quality_score: float = 0.0
     metadata: Dict[str, Any] = field(default_factory=dict)
     
+    # Отложенная LLM-оценка качества: результат доступен сразу с эвристической
+    # оценкой, LLM вызывается только если кто-то запросит quality()
+    _quality_eval: Optional[Callable[[], Awaitable[float]]] = field(default=None, repr=False, compare=False)
+    
+    async def quality(self) -> float:
+        """
+        Уточнённая оценка качества.
+        
+        Запускает LLM-оценку (если она предусмотрена) и обновляет
+        quality_score и confidence. Повторные вызовы не пересчитывают.
+        """
+        if self._quality_eval is not None:
+            evaluate, self._quality_eval = self._quality_eval, None
+            self.quality_score = await evaluate()
+            self.metadata["quality_source"] = "llm"
+            avg_confidence = self.metadata.get("avg_agent_confidence")
+            if avg_confidence is not None:
+                self.confidence = avg_confidence * self.quality_score
+        return self.quality_score
+    
     def to_dict(self) -> Dict[str, Any]:
         return {
             "synthesized_content": self.synthesized_content,
@@ -74,6 +301,244 @@ class SynthesisResult:
         }
 
 
+class SemanticResponseCache:
+    """
+    Семантический кэш ответов LLM.
+    
+    Ключ - эмбеддинг пары (задача, ответы агентов) (см. embed_key), поиск -
+    скалярное произведение нормированных векторов (numpy), отдельно по каждой
+    области (merge, consensus, ...): шаблон промпта и стратегия задаются
+    областью и в эмбеддинг не входят. LRU-вытеснение и TTL.
+    """
+    
+    # Эмбеддинг считается по кускам текста и усредняется: модель обрезает
+    # вход (~256 токенов), а промпт синтеза содержит ответы всех агентов
+    CHUNK_SIZE = 1000
+    
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        threshold: float = 0.92,
+        max_entries: int = 512,
+        ttl: int = 3600
+    ):
+        """
+        Args:
+            embed_fn: Функция: список текстов -> матрица эмбеддингов
+            threshold: Минимальное косинусное сходство для попадания
+            max_entries: Максимум записей в одной области
+            ttl: Время жизни записи в секундах
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # scope -> OrderedDict[id, (embedding, response, created_at)]
+        self._scopes: Dict[str, OrderedDict] = {}
+        # scope -> (ids, матрица эмбеддингов), сбрасывается при изменении области
+        self._matrices: Dict[str, Tuple[List[int], np.ndarray]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Нормированный эмбеддинг текста (среднее по кускам)"""
+        return self.embed_many([text])[0]
+    
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Нормированные эмбеддинги текстов (N, D) одним вызовом модели"""
+        chunks: List[str] = []
+        starts: List[int] = []
+        for text in texts:
+            starts.append(len(chunks))
+            chunks.extend(
+                text[i:i + self.CHUNK_SIZE]
+                for i in range(0, max(len(text), 1), self.CHUNK_SIZE)
+            )
+        
+        embeddings = np.asarray(self.embed_fn(chunks), dtype=np.float32)
+        counts = np.diff(starts + [len(chunks)])
+        vectors = np.add.reduceat(embeddings, starts, axis=0) / counts[:, None]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=vectors, where=norms > 0)
+    
+    def embed_key(self, task: str, contents: List[str]) -> np.ndarray:
+        """
+        Эмбеддинг ключа (задача, ответы агентов).
+        
+        Задача и отсортированные ответы кодируются отдельно и склеиваются,
+        поэтому сходство ключей - среднее сходства задач и сходства ответов:
+        совпадающие ответы не перекрывают другую задачу.
+        """
+        task_vec, contents_vec = self.embed_many([task, "\n\n".join(sorted(contents))])
+        return np.concatenate([task_vec, contents_vec]) / np.sqrt(np.float32(2.0))
+    
+    def get(self, scope: str, embedding: np.ndarray) -> Optional[str]:
+        """Найти ответ для близкого промпта в области"""
+        entries = self._scopes.get(scope)
+        if not entries:
+            self.misses += 1
+            return None
+        
+        self._evict_expired(scope)
+        if scope not in self._matrices:
+            ids = list(entries)
+            if not ids:
+                self.misses += 1
+                return None
+            self._matrices[scope] = (ids, np.stack([entries[i][0] for i in ids]))
+        
+        ids, matrix = self._matrices[scope]
+        similarities = matrix @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+        
+        entry_id = ids[best]
+        entries.move_to_end(entry_id)
+        self.hits += 1
+        return entries[entry_id][1]
+    
+    def put(self, scope: str, embedding: np.ndarray, response: str) -> None:
+        """Сохранить ответ"""
+        entries = self._scopes.setdefault(scope, OrderedDict())
+        entries[self._next_id] = (embedding, response, time.time())
+        self._next_id += 1
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        self._matrices.pop(scope, None)
+    
+    def _evict_expired(self, scope: str) -> None:
+        entries = self._scopes[scope]
+        deadline = time.time() - self.ttl
+        expired = [entry_id for entry_id, (_, _, created) in entries.items() if created < deadline]
+        for entry_id in expired:
+            del entries[entry_id]
+        if expired:
+            self._matrices.pop(scope, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": sum(len(entries) for entries in self._scopes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class ExactResponseCache:
+    """Точный кэш ответов LLM: SHA-256 от (messages, temperature, max_tokens), LRU + TTL"""
+    
+    def __init__(self, max_entries: int = 10_000, ttl: int = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # key -> (response, created_at)
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(messages: List[LLMMessage], temperature: float, max_tokens: int) -> str:
+        payload = json.dumps({
+            "messages": [[m.role, m.content] for m in messages],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+    
+    def put(self, key: str, response: str) -> None:
+        self._entries[key] = (response, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class MicroBatcher:
+    """
+    Микро-батчинг LLM запросов.
+    
+    Запросы, пришедшие в течение короткого окна, группируются по параметрам
+    сэмплирования и уходят одной пачкой через LLMProviderManager.generate_batch
+    (с его ограничением параллельности) - в том числе запросы от разных
+    одновременно идущих дебатов.
+    """
+    
+    def __init__(
+        self,
+        llm_manager: LLMProviderManager,
+        max_batch: int = 8,
+        max_wait_ms: float = 10.0,
+        max_concurrent: int = 4
+    ):
+        self.llm_manager = llm_manager
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent = max_concurrent
+        # (temperature, max_tokens) -> [(messages, future)]
+        self._pending: Dict[Tuple[float, int], List[Tuple[List[LLMMessage], asyncio.Future]]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+    
+    async def generate(self, messages: List[LLMMessage], temperature: float, max_tokens: int) -> str:
+        """Поставить запрос в текущую пачку и дождаться ответа"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (temperature, max_tokens)
+        group = self._pending.setdefault(key, [])
+        group.append((messages, future))
+        
+        if len(group) >= self.max_batch:
+            self._dispatch(key)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._dispatch_all)
+        
+        return await future
+    
+    def _dispatch_all(self) -> None:
+        self._flush_handle = None
+        for key in list(self._pending):
+            self._dispatch(key)
+    
+    def _dispatch(self, key: Tuple[float, int]) -> None:
+        group = self._pending.pop(key)
+        task = asyncio.create_task(self._run(key, group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, key: Tuple[float, int], group: List[Tuple[List[LLMMessage], asyncio.Future]]) -> None:
+        temperature, max_tokens = key
+        try:
+            responses = await self.llm_manager.generate_batch(
+                [(messages, None) for messages, _ in group],
+                max_concurrent=self.max_concurrent,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                return_exceptions=True
+            )
+        except Exception as e:
+            responses = [e] * len(group)
+        
+        for (_, future), response in zip(group, responses):
+            if future.done():  # Вызывающий отменил ожидание
+                continue
+            if isinstance(response, Exception):
+                future.set_exception(response)
+            else:
+                future.set_result(response.content)
+
+
 class MultiAgentSynthesizer:
     """
     Синтезатор результатов от нескольких агентов.
@@ -88,7 +553,10 @@ class MultiAgentSynthesizer:
     def __init__(
         self,
         llm_manager: LLMProviderManager,
-        default_strategy: SynthesisStrategy = SynthesisStrategy.MERGE
+        default_strategy: SynthesisStrategy = SynthesisStrategy.MERGE,
+        max_concurrency: int = 4,
+        semantic_cache: Optional[SemanticResponseCache] = None,
+        exact_cache: Optional[ExactResponseCache] = None
     ):
         """
         Инициализация.
@@ -96,9 +564,107 @@ class MultiAgentSynthesizer:
         Args:
             llm_manager: LLM провайдер
             default_strategy: Стратегия синтеза по умолчанию
+            max_concurrency: Максимум одновременных LLM запросов (лимиты провайдера)
+            semantic_cache: Семантический кэш ответов (по умолчанию - на
+                общей модели эмбеддингов, если sentence-transformers установлен)
+            exact_cache: Точный кэш детерминированных вызовов
         """
         self.llm_manager = llm_manager
         self.default_strategy = default_strategy
+        self.max_concurrency = max_concurrency
+        
+        if semantic_cache is None and SENTENCE_TRANSFORMERS_AVAILABLE:
+            # Модель общая для процесса и загружается при первом эмбеддинге
+            semantic_cache = SemanticResponseCache(embed_batch)
+        self.semantic_cache = semantic_cache
+        self.exact_cache = exact_cache or ExactResponseCache()
+        self.batcher = MicroBatcher(llm_manager, max_concurrent=max_concurrency)
+    
+    async def _cached_generate(
+        self,
+        messages: List[LLMMessage],
+        temperature: float,
+        max_tokens: int,
+        cache_scope: str,
+        semantic_key: Optional[Tuple[str, List[str]]] = None,
+        exact_only: bool = False
+    ) -> str:
+        """
+        Вызов LLM через кэши.
+        
+        Детерминированные вызовы (temperature <= 0.1) сначала ищутся в точном
+        кэше по хэшу промпта, затем - в семантическом по semantic_key
+        (исходная задача, ответы агентов). С exact_only=True (или без
+        semantic_key) семантический кэш не используется: структурированные
+        ответы (номер варианта, оценка) привязаны к конкретному промпту, и
+        ответ на похожий промпт с другим порядком вариантов был бы неверным.
+        """
+        if exact_only:
+            semantic_key = None
+        
+        if temperature > EXACT_CACHE_MAX_TEMPERATURE:
+            return await self._semantic_generate(messages, temperature, max_tokens, cache_scope, semantic_key)
+        
+        key = self.exact_cache.make_key(messages, temperature, max_tokens)
+        cached = self.exact_cache.get(key)
+        if cached is not None:
+            logger.debug(f"Exact cache HIT: {cache_scope}")
+            return cached
+        
+        content = await self._semantic_generate(messages, temperature, max_tokens, cache_scope, semantic_key)
+        self.exact_cache.put(key, content)
+        return content
+    
+    async def _llm_generate(
+        self,
+        messages: List[LLMMessage],
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """Вызов LLM без кэшей."""
+        response = await self.llm_manager.generate(
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.content
+    
+    async def _semantic_generate(
+        self,
+        messages: List[LLMMessage],
+        temperature: float,
+        max_tokens: int,
+        cache_scope: str,
+        semantic_key: Optional[Tuple[str, List[str]]]
+    ) -> str:
+        """
+        Вызов LLM через семантический кэш.
+        
+        Почти совпадающие ключи (перефразированная задача, те же ответы
+        агентов) получают сохранённый ответ без инференса. В эмбеддинг идут
+        только задача и ответы: шаблон промпта одинаков для всей области и
+        иначе доминировал бы в эмбеддинге.
+        """
+        cache = self.semantic_cache
+        if cache is None or semantic_key is None or temperature > SEMANTIC_CACHE_MAX_TEMPERATURE:
+            return await self._llm_generate(messages, temperature, max_tokens)
+        
+        task, contents = semantic_key
+        try:
+            embedding = await asyncio.to_thread(cache.embed_key, task, contents)
+        except Exception as e:
+            # Только этот вызов идёт мимо кэша: сбой может быть временным
+            logger.warning(f"Semantic cache bypassed, embedding failed: {e}")
+            return await self._llm_generate(messages, temperature, max_tokens)
+        
+        cached = cache.get(cache_scope, embedding)
+        if cached is not None:
+            logger.debug(f"Semantic cache HIT: {cache_scope}")
+            return cached
+        
+        content = await self._llm_generate(messages, temperature, max_tokens)
+        cache.put(cache_scope, embedding, content)
+        return content
     
     async def synthesize(
         self,
@@ -159,7 +725,8 @@ class MultiAgentSynthesizer:
     async def _merge_results(
         self,
         results: List[AgentResult],
-        original_task: str
+        original_task: str,
+        evaluate_quality: bool = True
     ) -> SynthesisResult:
         """
         Объединяет результаты от всех агентов.
@@ -168,12 +735,12 @@ class MultiAgentSynthesizer:
         agents_content = []
         for r in results:
             if r.success:
-                content = r.get_content()
+                content = r.get_trimmed(3000)  # Ограничиваем размер
                 if content:
                     agents_content.append({
                         "agent": r.agent_name,
                         "type": r.agent_type,
-                        "content": content[:3000],  # Ограничиваем размер
+                        "content": content,
                         "confidence": r.confidence
                     })
         
@@ -185,10 +752,20 @@ class MultiAgentSynthesizer:
                 contributing_agents=[]
             )
         
+        # Почти одинаковые ответы отправляем в LLM один раз
+        unique_content = _cluster_duplicates(agents_content)
+        conflicts_resolved = [
+            f"{duplicate} ≈ {a['agent']}"
+            for a in unique_content
+            for duplicate in a["duplicates"]
+        ]
+        
         # Формируем промпт для синтеза
         agents_text = "\n\n".join(
-            f"=== {a['agent']} ({a['type']}) [confidence: {a['confidence']:.2f}] ===\n{a['content']}"
-            for a in agents_content
+            f"=== {a['agent']} ({a['type']}) [confidence: {a['confidence']:.2f}]"
+            + (f" [то же ответили: {', '.join(a['duplicates'])}]" if a["duplicates"] else "")
+            + f" ===\n{a['content']}"
+            for a in unique_content
         )
         
         synthesis_prompt = f"""Объедини и синтезируй результаты от нескольких экспертных агентов в ЕДИНЫЙ, СВЯЗНЫЙ ответ.
@@ -215,8 +792,9 @@ class MultiAgentSynthesizer:
 
 СИНТЕЗИРОВАННЫЙ ОТВЕТ:"""
 
+        unique_texts = [a["content"] for a in unique_content]
         try:
-            response = await self.llm_manager.generate(
+            synthesized = await self._cached_generate(
                 messages=[
                     LLMMessage(
                         role="system",
@@ -225,29 +803,37 @@ class MultiAgentSynthesizer:
                     LLMMessage(role="user", content=synthesis_prompt)
                 ],
                 temperature=0.3,
-                max_tokens=4000
+                max_tokens=_output_budget(unique_texts, 4000),
+                cache_scope="merge",
+                semantic_key=(original_task, unique_texts)
             )
             
-            # Оценка качества синтеза
-            quality = await self._evaluate_synthesis_quality(
-                response.content,
-                [a["content"] for a in agents_content],
-                original_task
-            )
+            # Сразу - быстрая оценка; LLM-оценка не задерживает ответ и
+            # выполняется только по запросу (await result.quality())
+            quality = _coverage_quality(synthesized, unique_texts)
+            quality_eval = None
+            if evaluate_quality:
+                quality_eval = functools.partial(
+                    self._evaluate_synthesis_quality, synthesized, unique_texts, original_task
+                )
             
             # Вычисляем среднюю уверенность
             avg_confidence = sum(a["confidence"] for a in agents_content) / len(agents_content)
             
             return SynthesisResult(
-                synthesized_content=response.content,
+                synthesized_content=synthesized,
                 strategy_used=SynthesisStrategy.MERGE,
                 confidence=avg_confidence * quality,  # Комбинированная уверенность
                 contributing_agents=[a["agent"] for a in agents_content],
+                conflicts_resolved=conflicts_resolved,
                 quality_score=quality,
                 metadata={
                     "agents_count": len(agents_content),
-                    "avg_agent_confidence": avg_confidence
-                }
+                    "unique_answers": len(unique_content),
+                    "avg_agent_confidence": avg_confidence,
+                    "quality_source": "heuristic"
+                },
+                _quality_eval=quality_eval
             )
             
         except Exception as e:
@@ -255,7 +841,7 @@ class MultiAgentSynthesizer:
             # Fallback: просто объединяем тексты
             fallback_content = "\n\n---\n\n".join(
                 f"## {a['agent']}\n{a['content']}"
-                for a in agents_content
+                for a in unique_content
             )
             return SynthesisResult(
                 synthesized_content=fallback_content,
@@ -290,11 +876,22 @@ class MultiAgentSynthesizer:
                 contributing_agents=[successful[0].agent_name]
             )
         
+        # Один агент заметно увереннее остальных - LLM не нужен
+        ranked = sorted(successful, key=lambda r: r.confidence, reverse=True)
+        if ranked[0].confidence - ranked[1].confidence >= DOMINANT_CONFIDENCE_GAP:
+            best = ranked[0]
+            return SynthesisResult(
+                synthesized_content=best.get_content(),
+                strategy_used=SynthesisStrategy.SELECT_BEST,
+                confidence=best.confidence,
+                contributing_agents=[best.agent_name],
+                metadata={"selection_reason": "dominant_confidence"}
+            )
+        
         # Используем LLM для выбора лучшего
         candidates = []
         for i, r in enumerate(successful):
-            content = r.get_content()
-            candidates.append(f"=== Option {i+1} ({r.agent_name}) ===\n{content[:1500]}")
+            candidates.append(f"=== Option {i+1} ({r.agent_name}) ===\n{r.get_trimmed(1500)}")
         
         selection_prompt = f"""Выбери ЛУЧШИЙ ответ на задачу из предложенных вариантов.
 
@@ -313,18 +910,17 @@ class MultiAgentSynthesizer:
 JSON:"""
 
         try:
-            response = await self.llm_manager.generate(
+            selection = await self._cached_generate(
                 messages=[LLMMessage(role="user", content=selection_prompt)],
                 temperature=0.1,
-                max_tokens=200
+                max_tokens=200,
+                cache_scope="select",
+                exact_only=True  # номер варианта / оценка привязаны к конкретному промпту
             )
             
-            import json
-            import re
-            
-            match = re.search(r'\{[^}]+\}', response.content, re.DOTALL)
-            if match:
-                data = json.loads(match.group())
+            json_text = _find_json(selection)
+            if json_text:
+                data = json.loads(json_text)
                 best_idx = int(data.get("best_option", 1)) - 1
                 best_idx = max(0, min(best_idx, len(successful) - 1))
                 score = float(data.get("score", 0.5))
@@ -371,15 +967,29 @@ JSON:"""
                 groups[key] = []
             groups[key].append(r)
         
-        # Синтезируем внутри каждой группы
+        # Синтезируем внутри каждой группы: группы независимы, объединяем параллельно
+        multi_groups = [
+            (agent_type, group_results)
+            for agent_type, group_results in groups.items()
+            if len(group_results) > 1
+        ]
+        # Промежуточные группы не оцениваем через LLM - оценивается финальный синтез
+        merged = await asyncio.gather(*(
+            self._merge_results(group_results, original_task, evaluate_quality=False)
+            for _, group_results in multi_groups
+        ))
+        merged_by_type = {
+            agent_type: group_synthesis
+            for (agent_type, _), group_synthesis in zip(multi_groups, merged)
+        }
+        
         group_syntheses: List[AgentResult] = []
         
         for agent_type, group_results in groups.items():
             if len(group_results) == 1:
                 group_syntheses.append(group_results[0])
             else:
-                # Синтезируем группу
-                group_synthesis = await self._merge_results(group_results, original_task)
+                group_synthesis = merged_by_type[agent_type]
                 group_syntheses.append(AgentResult(
                     agent_name=f"synthesized_{agent_type}",
                     agent_type=agent_type,
@@ -405,7 +1015,7 @@ JSON:"""
             return await self._select_best(results, original_task)
         
         # Формируем промпт для поиска консенсуса
-        contents = [r.get_content()[:2000] for r in successful]
+        contents = [r.get_trimmed(2000) for r in successful]
         
         consensus_prompt = f"""Найди КОНСЕНСУС между этими ответами. Определи:
 1. На чём ВСЕ агенты согласны
@@ -428,14 +1038,16 @@ JSON:"""
 [объединённый ответ на основе консенсуса]"""
 
         try:
-            response = await self.llm_manager.generate(
+            consensus = await self._cached_generate(
                 messages=[LLMMessage(role="user", content=consensus_prompt)],
                 temperature=0.2,
-                max_tokens=3000
+                max_tokens=_output_budget(contents, 3000),
+                cache_scope="consensus",
+                semantic_key=(original_task, contents)
             )
             
             return SynthesisResult(
-                synthesized_content=response.content,
+                synthesized_content=consensus,
                 strategy_used=SynthesisStrategy.CONSENSUS,
                 confidence=0.7,  # Консенсус даёт среднюю уверенность
                 contributing_agents=[r.agent_name for r in successful]
@@ -461,25 +1073,19 @@ JSON:"""
         if len(successful) < 2:
             return await self._select_best(results, original_task)
         
-        current_answers = [r.get_content()[:2000] for r in successful]
+        current_answers = [r.get_trimmed(2000) for r in successful]
         agent_names = [r.agent_name for r in successful]
         
-        for round_num in range(max_rounds):
-            logger.debug(f"Debate round {round_num + 1}/{max_rounds}")
-            
-            # Каждый агент критикует других
-            improved_answers = []
+        async def debate_turn(i: int, answers: List[str], max_tokens: int) -> str:
+            other_answers = [
+                f"**{agent_names[j]}**: {a[:500]}"
+                for j, a in enumerate(answers)
+                if j != i
+            ]
             
-            for i, (answer, name) in enumerate(zip(current_answers, agent_names)):
-                other_answers = [
-                    f"**{agent_names[j]}**: {a[:500]}"
-                    for j, a in enumerate(current_answers)
-                    if j != i
-                ]
-                
-                debate_prompt = f"""Ты играешь роль агента {name}.
+            debate_prompt = f"""Ты играешь роль агента {agent_names[i]}.
 Ваш текущий ответ на задачу:
-{answer}
+{answers[i]}
 
 Другие агенты ответили:
 {chr(10).join(other_answers)}
@@ -491,18 +1097,49 @@ JSON:"""
 
 Улучшенный ответ:"""
 
-                try:
-                    response = await self.llm_manager.generate(
-                        messages=[LLMMessage(role="user", content=debate_prompt)],
-                        temperature=0.4,
-                        max_tokens=2000
-                    )
-                    improved_answers.append(response.content)
-                except Exception as e:
-                    logger.warning(f"Debate round failed for {name}: {e}")
+            # Высокая температура - без кэша; запросы раунда уходят одной пачкой
+            return await self.batcher.generate(
+                messages=[LLMMessage(role="user", content=debate_prompt)],
+                temperature=0.4,
+                max_tokens=max_tokens
+            )
+        
+        rounds_done = 0
+        # Исходное сходство нужно только для сравнения после первого из нескольких раундов
+        prev_similarity = await self._answers_similarity(current_answers) if max_rounds > 1 else 0.0
+        
+        for round_num in range(max_rounds):
+            logger.debug(f"Debate round {round_num + 1}/{max_rounds}")
+            
+            # Каждый агент критикует других - запросы раунда независимы, идут параллельно
+            # (параллельность ограничивает MicroBatcher). Бюджет общий на раунд,
+            # чтобы запросы попали в одну пачку
+            max_tokens = _output_budget(current_answers, 2000)
+            responses = await asyncio.gather(
+                *(debate_turn(i, current_answers, max_tokens) for i in range(len(current_answers))),
+                return_exceptions=True
+            )
+            
+            improved_answers = []
+            for answer, name, response in zip(current_answers, agent_names, responses):
+                if isinstance(response, Exception):
+                    logger.warning(f"Debate round failed for {name}: {response}")
                     improved_answers.append(answer)
+                else:
+                    improved_answers.append(response)
             
             current_answers = improved_answers
+            rounds_done = round_num + 1
+            
+            if rounds_done < max_rounds:
+                similarity = await self._answers_similarity(current_answers)
+                if (similarity >= DEBATE_CONVERGENCE_SIMILARITY
+                        or abs(similarity - prev_similarity) < DEBATE_MIN_SIMILARITY_DELTA):
+                    logger.debug(
+                        f"Debate converged after round {rounds_done}: similarity {similarity:.3f}"
+                    )
+                    break
+                prev_similarity = similarity
         
         # Финальный синтез после дебатов
         debate_results = [
@@ -519,9 +1156,26 @@ JSON:"""
         result = await self._merge_results(debate_results, original_task)
         result.strategy_used = SynthesisStrategy.DEBATE
         result.metadata["debate_rounds"] = max_rounds
+        result.metadata["debate_rounds_actual"] = rounds_done
         
         return result
     
+    async def _answers_similarity(self, answers: List[str]) -> float:
+        """
+        Среднее попарное сходство ответов дебатов.
+        
+        Косинус эмбеддингов семантического кэша, если он доступен,
+        иначе Jaccard по шинглам.
+        """
+        cache = self.semantic_cache
+        if cache is not None:
+            try:
+                embeddings = await asyncio.to_thread(cache.embed_many, answers)
+                return _mean_off_diagonal(embeddings @ embeddings.T)
+            except Exception as e:
+                logger.debug(f"Embedding similarity failed, using shingles: {e}")
+        return _mean_pairwise_jaccard(answers)
+    
     async def _evaluate_synthesis_quality(
         self,
         synthesis: str,
@@ -550,14 +1204,15 @@ JSON:"""
 
 Ответь ТОЛЬКО числом от 0 до 100:"""
 
-            response = await self.llm_manager.generate(
+            evaluation = await self._cached_generate(
                 messages=[LLMMessage(role="user", content=eval_prompt)],
                 temperature=0.1,
-                max_tokens=10
+                max_tokens=10,
+                cache_scope="quality",
+                exact_only=True  # номер варианта / оценка привязаны к конкретному промпту
             )
             
-            import re
-            match = re.search(r'\b(\d{1,3})\b', response.content)
+            match = _SCORE_RE.search(evaluation)
             if match:
                 score = int(match.group(1))
                 return min(score / 100, 1.0)
@@ -4,15 +4,27 @@ PreviewManager: запускает пользовательские веб-пр
 """
 
 import asyncio
+import heapq
 import os
-import socket
+import sys
 import time
 import secrets
-from typing import Dict, Any, Optional, Set
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 from .logger import get_logger
 logger = get_logger(__name__)
 
+try:
+    import fcntl
+    F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031) if sys.platform.startswith("linux") else None
+except ImportError:
+    fcntl = None
+    F_SETPIPE_SZ = None
+
+# Размер pipe для вывода превью: болтливые dev-серверы (webpack, vite) не
+# блокируются на заполненном 64 KB буфере, пока _drain_stream не проснётся
+PREVIEW_PIPE_SIZE = 1 << 20
+
 
 class PreviewState:
     def __init__(
@@ -35,15 +47,26 @@ class PreviewState:
         self.ttl_seconds = ttl_seconds
         self.started_at = started_at
         self.expires_at = started_at + ttl_seconds if ttl_seconds else None
-        self.stdout: str = ""
-        self.stderr: str = ""
+        # Логи копятся в байтовых буферах, в строку - только при чтении
+        self._stdout_buf = bytearray()
+        self._stderr_buf = bytearray()
         self.returncode: Optional[int] = None
         self._stdout_task: Optional[asyncio.Task] = None
         self._stderr_task: Optional[asyncio.Task] = None
-        self._reaper_task: Optional[asyncio.Task] = None
+
+    @property
+    def stdout(self) -> str:
+        return self._stdout_buf.decode("utf-8", errors="ignore")
+
+    @property
+    def stderr(self) -> str:
+        return self._stderr_buf.decode("utf-8", errors="ignore")
 
 
 class PreviewManager:
+    # Таймаут проверки порта: на localhost отказ приходит сразу
+    PORT_PROBE_TIMEOUT = 0.05
+
     def __init__(
         self,
         port_pool: Set[int],
@@ -54,7 +77,12 @@ class PreviewManager:
         self.default_ttl = default_ttl
         self.log_limit = log_limit
         self._by_id: Dict[str, PreviewState] = {}
+        self._reserved: Set[int] = set()  # Порты запускаемых/останавливаемых превью
         self._lock = asyncio.Lock()
+        # Один фоновый reaper на все превью: куча (expires_at, preview_id)
+        self._ttl_heap: List[Tuple[float, str]] = []
+        self._wake = asyncio.Event()
+        self._reaper: Optional[asyncio.Task] = None
 
     async def start_preview(
         self,
@@ -65,13 +93,15 @@ class PreviewManager:
         ttl: Optional[int] = None,
     ) -> PreviewState:
         ttl_seconds = ttl or self.default_ttl
+        # Под блокировкой - только выбор и резервирование порта; запуск процесса
+        # идёт без неё, чтобы превью стартовали и останавливались параллельно
         async with self._lock:
-            port = port_hint or await self._find_free_port()
-            if port not in self.port_pool:
+            if port_hint is not None and port_hint not in self.port_pool:
                 raise ValueError("Port not allowed")
-            if not self._is_port_free(port):
-                port = await self._find_free_port()
+            port = await self._find_free_port(preferred=port_hint)
+            self._reserved.add(port)
 
+        try:
             preview_id = secrets.token_urlsafe(12)
             token = secrets.token_urlsafe(16)
 
@@ -102,20 +132,27 @@ class PreviewManager:
                 started_at=time.time(),
             )
             self._by_id[preview_id] = state
+            self._enlarge_pipes(process)
+        finally:
+            # Порт теперь учитывается через _by_id (или процесс не запустился)
+            self._reserved.discard(port)
 
-            state._stdout_task = asyncio.create_task(self._drain_stream(process.stdout, state, "stdout"))
-            state._stderr_task = asyncio.create_task(self._drain_stream(process.stderr, state, "stderr"))
-            state._reaper_task = asyncio.create_task(self._auto_stop(preview_id, ttl_seconds))
+        state._stdout_task = asyncio.create_task(self._drain_stream(process.stdout, state, "stdout"))
+        state._stderr_task = asyncio.create_task(self._drain_stream(process.stderr, state, "stderr"))
+        self._schedule_expiry(state)
 
-            logger.info(f"Preview started id={preview_id} port={port} cmd='{command}' ttl={ttl_seconds}s")
-            return state
+        logger.info(f"Preview started id={preview_id} port={port} cmd='{command}' ttl={ttl_seconds}s")
+        return state
 
     async def stop_preview(self, preview_id: str) -> bool:
         async with self._lock:
-            state = self._by_id.get(preview_id)
+            state = self._by_id.pop(preview_id, None)
             if not state:
                 return False
+            # Порт занят, пока процесс не завершится
+            self._reserved.add(state.port)
 
+        try:
             proc = state.process
             if proc and proc.returncode is None:
                 proc.terminate()
@@ -126,8 +163,9 @@ class PreviewManager:
                     await proc.wait()
 
             state.returncode = proc.returncode if proc else state.returncode
-            self._by_id.pop(preview_id, None)
-            return True
+        finally:
+            self._reserved.discard(state.port)
+        return True
 
     async def get_status(self, preview_id: str) -> Optional[Dict[str, Any]]:
         state = self._by_id.get(preview_id)
@@ -149,32 +187,109 @@ class PreviewManager:
             "stderr": state.stderr,
         }
 
+    @staticmethod
+    def _enlarge_pipes(process: asyncio.subprocess.Process):
+        if F_SETPIPE_SZ is None:
+            return
+        for fd in (1, 2):
+            try:
+                pipe = process._transport.get_pipe_transport(fd).get_extra_info("pipe")
+                fcntl.fcntl(pipe.fileno(), F_SETPIPE_SZ, PREVIEW_PIPE_SIZE)
+            except (AttributeError, OSError) as e:
+                # Лимит /proc/sys/fs/pipe-max-size или нестандартный транспорт
+                logger.debug(f"Could not enlarge preview pipe {fd}: {e}")
+                return
+
     async def _drain_stream(self, stream: asyncio.StreamReader, state: PreviewState, field: str):
+        buf: bytearray = getattr(state, f"_{field}_buf")
         try:
             while not stream.at_eof():
-                chunk = await stream.read(1024)
+                chunk = await stream.read(65536)
                 if not chunk:
                     break
-                text = chunk.decode("utf-8", errors="ignore")
-                current = getattr(state, field)
-                new_value = (current + text)[-self.log_limit :]
-                setattr(state, field, new_value)
+                # Дописываем на месте и отрезаем голову, без пересборки строки
+                buf += chunk
+                if len(buf) > self.log_limit:
+                    del buf[: -self.log_limit]
         except Exception as e:
             logger.warning(f"Error reading {field} for preview {state.id}: {e}")
 
-    async def _auto_stop(self, preview_id: str, ttl: int):
-        await asyncio.sleep(ttl)
-        await self.stop_preview(preview_id)
-        logger.info(f"Preview {preview_id} stopped by TTL")
+    def _schedule_expiry(self, state: PreviewState):
+        if state.expires_at is None:
+            return
+        heapq.heappush(self._ttl_heap, (state.expires_at, state.id))
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reaper_loop())
+        # Будим reaper: новое превью может истечь раньше текущего первого
+        self._wake.set()
 
-    async def _find_free_port(self) -> int:
-        for port in sorted(self.port_pool):
-            if self._is_port_free(port) and not any(s.port == port for s in self._by_id.values()):
+    async def _reaper_loop(self):
+        while True:
+            if not self._ttl_heap:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+
+            expires_at, preview_id = self._ttl_heap[0]
+            delay = expires_at - time.time()
+            if delay > 0:
+                # asyncio.wait, а не wait_for: в 3.11 wait_for теряет отмену,
+                # если ожидание завершилось одновременно с ней, и close() зависает
+                waiter = asyncio.ensure_future(self._wake.wait())
+                try:
+                    await asyncio.wait((waiter,), timeout=delay)
+                finally:
+                    waiter.cancel()
+                self._wake.clear()
+                continue
+
+            heapq.heappop(self._ttl_heap)
+            # Превью могло быть остановлено вручную раньше TTL
+            try:
+                if await self.stop_preview(preview_id):
+                    logger.info(f"Preview {preview_id} stopped by TTL")
+            except Exception as e:
+                # Ошибка одного превью не должна останавливать reaper
+                logger.error(f"Failed to stop expired preview {preview_id}: {e}")
+
+    async def close(self):
+        """Остановить reaper и все запущенные превью"""
+        if self._reaper:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        for preview_id in list(self._by_id):
+            await self.stop_preview(preview_id)
+
+    async def _find_free_port(self, preferred: Optional[int] = None) -> int:
+        # Порты пула проверяем параллельно, без блокирующих вызовов в event loop
+        used = {s.port for s in self._by_id.values()} | self._reserved
+        candidates = sorted(self.port_pool - used)
+        # Подсказанный порт - первым, но с теми же проверками занятости
+        if preferred in candidates:
+            candidates.remove(preferred)
+            candidates.insert(0, preferred)
+        free = await asyncio.gather(*(self._is_port_free(port) for port in candidates))
+        for port, is_free in zip(candidates, free):
+            if is_free:
                 return port
         raise RuntimeError("No free preview ports available")
 
-    def _is_port_free(self, port: int) -> bool:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            return s.connect_ex(("127.0.0.1", port)) != 0
+    async def _is_port_free(self, port: int) -> bool:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection("127.0.0.1", port), timeout=self.PORT_PROBE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            # Нет ответа - не считаем порт свободным, берём следующий
+            # (ловим до OSError: в 3.11+ TimeoutError - его подкласс)
+            return False
+        except OSError:
+            # Соединение отклонено - порт никто не слушает
+            return True
+        writer.close()
+        return False
 
@@ -8,17 +8,72 @@ Progress Tracker - система отслеживания прогресса о
 """
 
 import asyncio
-from typing import Dict, Any, Optional, List, AsyncIterator
+import heapq
+import sys
+import time
+import zlib
+from collections import deque
+from typing import Deque, Dict, Any, Optional, List, AsyncIterator, Union
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 import uuid
 import json
 
+from fastapi.responses import StreamingResponse
+
 from .logger import get_logger
 
 logger = get_logger(__name__)
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+if ORJSON_AVAILABLE:
+    _json_bytes = orjson.dumps
+else:
+    def _json_bytes(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+# Размер очереди слушателя по умолчанию: медленный SSE-клиент не копит
+# события бесконечно, при переполнении вытесняются самые старые
+LISTENER_QUEUE_SIZE = 64
+
+# Период публикации накопленных обновлений: частые update() одного этапа
+# (сканирование тысяч файлов) схлопываются в одно событие за интервал
+FLUSH_INTERVAL = 0.05
+
+# История трекера ограничена последними событиями; новому подписчику по
+# умолчанию отдаются только последние REPLAY_LAST из них
+HISTORY_SIZE = 256
+REPLAY_LAST = 32
+
+
+def _put_latest(queue: asyncio.Queue, item: Any) -> bool:
+    """
+    Кладёт элемент в ограниченную очередь без ожидания.
+    
+    При переполнении вытесняет самый старый элемент (клиенту важнее
+    актуальный прогресс, чем промежуточные шаги).
+    
+    Returns:
+        False, если пришлось вытеснить событие
+    """
+    try:
+        queue.put_nowait(item)
+        return True
+    except asyncio.QueueFull:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        queue.put_nowait(item)
+        return False
+
 
 class ProgressStage(Enum):
     """Стандартные этапы прогресса."""
@@ -34,14 +89,25 @@ class ProgressStage(Enum):
     ERROR = "error"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ProgressEvent:
     """Событие прогресса."""
     stage: str
     message: str
     progress: float  # 0.0 - 1.0
     details: Optional[Dict[str, Any]] = None
-    timestamp: datetime = field(default_factory=datetime.now)
+    timestamp: float = field(default_factory=time.time)  # Unix time
+    
+    # SSE-кадр строится один раз и переиспользуется для истории и всех
+    # слушателей (событие неизменно после создания)
+    _sse: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def sse_bytes(self) -> bytes:
+        """SSE-кадр события в UTF-8."""
+        if self._sse is None:
+            object.__setattr__(self, "_sse", b"data: " + _json_bytes(self.to_dict()) + b"\n\n")
+        return self._sse
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -49,12 +115,12 @@ class ProgressEvent:
             "message": self.message,
             "progress": round(self.progress, 2),
             "details": self.details or {},
-            "timestamp": self.timestamp.isoformat()
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat()
         }
     
     def to_sse(self) -> str:
         """Форматирует как SSE событие."""
-        return f"data: {json.dumps(self.to_dict(), ensure_ascii=False)}\n\n"
+        return self.sse_bytes.decode("utf-8")
 
 
 class ProgressTracker:
@@ -66,25 +132,36 @@ class ProgressTracker:
         await tracker.update("profiling", "Анализируем структуру...", 0.1)
         await tracker.update("scanning", "Сканируем файлы...", 0.3)
         await tracker.complete("Анализ завершён")
+    
+    Обновления публикуются раз в FLUSH_INTERVAL: подряд идущие обновления
+    одного этапа заменяют друг друга, в историю и слушателям попадает
+    последнее. complete() и error() публикуют накопленное сразу.
     """
     
     def __init__(self, operation_id: str, operation_type: str = "unknown"):
         self.operation_id = operation_id
         self.operation_type = operation_type
-        self.events: List[ProgressEvent] = []
-        self.listeners: List[asyncio.Queue] = []
+        self.events: Deque[ProgressEvent] = deque(maxlen=HISTORY_SIZE)
+        # id(queue) -> queue: отписка за O(1) при отключении SSE-клиента
+        self.listeners: Dict[int, asyncio.Queue] = {}
         self.started_at = datetime.now()
         self.completed = False
-        self._lock = asyncio.Lock()
+        # Ещё не опубликованные события (по одному на подряд идущий этап).
+        # Блокировка не нужна: update/complete/error не уступают управление
+        # циклу событий между чтением и изменением состояния
+        self._pending: List[ProgressEvent] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
     
     async def update(
         self,
-        stage: str,
+        stage: Union[str, ProgressStage],
         message: str,
         progress: float,
         details: Optional[Dict[str, Any]] = None
     ) -> None:
         """Отправляет обновление прогресса всем слушателям."""
+        # Этапы повторяются тысячи раз - храним одну интернированную строку
+        stage = stage.value if isinstance(stage, ProgressStage) else sys.intern(stage)
         event = ProgressEvent(
             stage=stage,
             message=message,
@@ -92,66 +169,161 @@ class ProgressTracker:
             details=details
         )
         
-        async with self._lock:
-            self.events.append(event)
-            
-            # Отправляем всем слушателям
-            for queue in self.listeners:
-                try:
-                    await queue.put(event)
-                except asyncio.QueueFull:
-                    pass  # Пропускаем если очередь переполнена
+        # Устаревшее обновление того же этапа заменяется новым
+        if self._pending and self._pending[-1].stage == stage:
+            self._pending[-1] = event
+        else:
+            self._pending.append(event)
+        
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(FLUSH_INTERVAL, self._flush)
         
         logger.debug(f"[Progress:{self.operation_id}] {stage}: {message} ({progress*100:.0f}%)")
     
+    def _flush(self) -> None:
+        """Публикует накопленные события в историю и всем слушателям."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        pending, self._pending = self._pending, []
+        listeners = tuple(self.listeners.values())
+        for event in pending:
+            # Сериализуем один раз - слушатели получают готовый кадр
+            event.sse_bytes
+            self.events.append(event)
+            
+            # Отправляем всем слушателям (без ожидания: медленный клиент
+            # теряет старые события, а не тормозит операцию)
+            for queue in listeners:
+                if not _put_latest(queue, event):
+                    logger.debug(f"[Progress:{self.operation_id}] Slow listener, dropped oldest event")
+    
     async def complete(self, message: str = "Завершено", details: Optional[Dict[str, Any]] = None) -> None:
         """Завершает отслеживание."""
-        await self.update(ProgressStage.COMPLETED.value, message, 1.0, details)
-        self.completed = True
+        await self.update(ProgressStage.COMPLETED, message, 1.0, details)
         
-        # Закрываем все очереди
-        async with self._lock:
-            for queue in self.listeners:
-                await queue.put(None)  # Сигнал завершения
+        # Публикуем накопленное и закрываем все очереди
+        self._finish()
     
     async def error(self, message: str, details: Optional[Dict[str, Any]] = None) -> None:
         """Сообщает об ошибке."""
-        await self.update(ProgressStage.ERROR.value, message, -1, details)
+        await self.update(ProgressStage.ERROR, message, -1, details)
+        self._finish()
+    
+    def _finish(self) -> None:
+        """Публикует накопленное и отправляет слушателям сигнал завершения."""
+        self._flush()
         self.completed = True
-        
-        async with self._lock:
-            for queue in self.listeners:
-                await queue.put(None)
+        for queue in tuple(self.listeners.values()):
+            _put_latest(queue, None)  # Сигнал завершения
     
-    def subscribe(self) -> asyncio.Queue:
-        """Подписывается на события прогресса."""
-        queue: asyncio.Queue = asyncio.Queue()
-        self.listeners.append(queue)
+    def subscribe(self, maxsize: int = LISTENER_QUEUE_SIZE) -> asyncio.Queue:
+        """
+        Подписывается на события прогресса.
+        
+        Очередь ограничена maxsize событиями: если клиент не успевает читать,
+        самые старые события вытесняются (сигнал завершения None не теряется).
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.listeners[id(queue)] = queue
         return queue
     
     def unsubscribe(self, queue: asyncio.Queue) -> None:
         """Отписывается от событий."""
-        if queue in self.listeners:
-            self.listeners.remove(queue)
+        self.listeners.pop(id(queue), None)
     
-    async def stream_events(self) -> AsyncIterator[ProgressEvent]:
-        """Генератор событий для SSE."""
+    async def stream_events(self, replay_last: int = REPLAY_LAST) -> AsyncIterator[bytes]:
+        """
+        Генератор SSE-кадров (bytes), сериализованных один раз на событие.
+        
+        События, успевшие накопиться в очереди, отдаются одним куском.
+        
+        Args:
+            replay_last: Сколько последних событий истории отправить сначала
+                (0 - без истории)
+        """
+        async for batch in self._stream_batches(replay_last):
+            yield b"".join(event.sse_bytes for event in batch)
+    
+    async def stream_events_obj(self, replay_last: int = REPLAY_LAST) -> AsyncIterator[ProgressEvent]:
+        """Генератор событий прогресса (последние replay_last из истории, затем новые)."""
+        async for batch in self._stream_batches(replay_last):
+            for event in batch:
+                yield event
+    
+    async def _stream_batches(self, replay_last: int) -> AsyncIterator[List[ProgressEvent]]:
+        """История одной пачкой, затем всё, что готово в очереди на момент чтения."""
         queue = self.subscribe()
+        # Снимок истории в момент подписки: более новые события придут через очередь
+        history = list(self.events)[-replay_last:] if replay_last > 0 else []
+        completed = self.completed
         try:
-            # Отправляем историю
-            for event in self.events:
-                yield event
+            if history:
+                yield history
+            if completed:
+                # Операция уже завершена - сигнал завершения в очередь не придёт
+                return
             
             # Слушаем новые события
-            while True:
+            finished = False
+            while not finished:
+                batch = []
                 event = await queue.get()
-                if event is None:
-                    break
-                yield event
+                while event is not None:
+                    batch.append(event)
+                    if queue.empty():
+                        break
+                    event = queue.get_nowait()
+                finished = event is None
+                if batch:
+                    yield batch
         finally:
             self.unsubscribe(queue)
 
 
+async def _gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Потоковое gzip-сжатие SSE.
+    
+    После каждого куска - Z_SYNC_FLUSH: клиент получает событие сразу,
+    а не по заполнении буфера компрессора.
+    """
+    compressor = zlib.compressobj(wbits=31)  # 31 - формат gzip
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def make_sse_response(
+    tracker: ProgressTracker,
+    accept_encoding: str = "",
+    replay_last: int = REPLAY_LAST
+) -> StreamingResponse:
+    """
+    SSE-ответ с событиями трекера.
+    
+    Args:
+        tracker: Трекер, события которого транслируются
+        accept_encoding: Заголовок Accept-Encoding клиента; при поддержке gzip
+            поток сжимается (JSON событий с повторяющимися ключами жмётся в разы)
+        replay_last: Сколько последних событий истории отправить (0 - без истории)
+    """
+    headers = {
+        # no-transform и X-Accel-Buffering: прокси (nginx) не буферизует и не пережимает поток
+        "Cache-Control": "no-cache, no-transform",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding"
+    }
+    stream = tracker.stream_events(replay_last)
+    if "gzip" in accept_encoding.lower():
+        headers["Content-Encoding"] = "gzip"
+        stream = _gzip_stream(stream)
+    
+    return StreamingResponse(stream, media_type="text/event-stream", headers=headers)
+
+
 class ProgressManager:
     """
     Менеджер прогресса для всего приложения.
@@ -172,6 +344,9 @@ class ProgressManager:
             return
         self._initialized = True
         self._trackers: Dict[str, ProgressTracker] = {}
+        # Куча (время создания по monotonic, operation_id): очистка снимает
+        # только самые старые записи, а не обходит все трекеры
+        self._created: List[tuple] = []
         self._lock = asyncio.Lock()
     
     async def create_tracker(self, operation_type: str) -> ProgressTracker:
@@ -181,6 +356,7 @@ class ProgressManager:
         
         async with self._lock:
             self._trackers[operation_id] = tracker
+            heapq.heappush(self._created, (time.monotonic(), operation_id))
         
         logger.debug(f"[ProgressManager] Created tracker: {operation_id} for {operation_type}")
         return tracker
@@ -197,20 +373,25 @@ class ProgressManager:
     
     async def cleanup_old_trackers(self, max_age_seconds: int = 3600) -> int:
         """Очищает старые завершённые трекеры."""
-        now = datetime.now()
+        deadline = time.monotonic() - max_age_seconds
         removed = 0
         
         async with self._lock:
-            to_remove = []
-            for op_id, tracker in self._trackers.items():
+            still_running = []
+            while self._created and self._created[0][0] <= deadline:
+                entry = heapq.heappop(self._created)
+                tracker = self._trackers.get(entry[1])
+                if tracker is None:
+                    continue  # Уже удалён через remove_tracker
                 if tracker.completed:
-                    age = (now - tracker.started_at).total_seconds()
-                    if age > max_age_seconds:
-                        to_remove.append(op_id)
+                    del self._trackers[entry[1]]
+                    removed += 1
+                else:
+                    still_running.append(entry)
             
-            for op_id in to_remove:
-                del self._trackers[op_id]
-                removed += 1
+            # Незавершённые возвращаем - проверим при следующей очистке
+            for entry in still_running:
+                heapq.heappush(self._created, entry)
         
         return removed
 
@@ -3,12 +3,44 @@ Prompt Optimizer - Оптимизация промптов для малых м
 Минимизирует потерю качества при работе с ограниченными ресурсами
 """
 
-from typing import List, Optional
+import asyncio
+import functools
+import re
+from itertools import groupby
+from typing import List, Optional, Tuple
 from .logger import get_logger
 logger = get_logger(__name__)
 
 from ..llm.base import LLMMessage
 
+# Строки с приветствиями и вежливыми фразами (поиск подстроки без учёта
+# регистра - одно регулярное выражение на строку вместо lower() и 9 поисков)
+_GREETINGS_RE = re.compile(
+    "|".join(re.escape(greeting) for greeting in (
+        "Привет", "Здравствуй", "Добро пожаловать",
+        "Hello", "Hi", "Welcome",
+        "Спасибо", "Thank you", "Thanks"
+    )),
+    re.IGNORECASE
+)
+
+# Упрощение инструкций: сложные конструкции -> простые (и с заглавной буквы)
+_SIMPLE_WORDS = {
+    "необходимо": "нужно",
+    "осуществить": "сделать",
+    "реализовать": "создать",
+    "обеспечить": "сделать",
+    "предоставить": "дать",
+    "необходимо убедиться": "проверить",
+    "следует": "нужно",
+}
+_SIMPLE_WORDS.update({old.capitalize(): new.capitalize() for old, new in list(_SIMPLE_WORDS.items())})
+# Одна альтернатива на все замены - один проход по тексту; длинные фразы
+# первыми, чтобы "необходимо убедиться" не перехватывалось "необходимо"
+_SIMPLE_WORDS_RE = re.compile(
+    "|".join(re.escape(old) for old in sorted(_SIMPLE_WORDS, key=len, reverse=True))
+)
+
 
 class PromptOptimizer:
     """
@@ -19,16 +51,25 @@ class PromptOptimizer:
     - Упрощение инструкций
     - Удаление избыточной информации
     - Структурирование для лучшего понимания
+    
+    Правила - атрибуты-флаги в __slots__ (проверка на каждом вызове без
+    поиска по словарю).
     """
     
+    __slots__ = (
+        "remove_greetings",
+        "simplify_instructions",
+        "remove_examples",
+        "compress_redundancy",
+        "structure_output",
+    )
+    
     def __init__(self):
-        self.optimization_rules = {
-            "remove_greetings": True,
-            "simplify_instructions": True,
-            "remove_examples": False,  # Примеры важны для понимания
-            "compress_redundancy": True,
-            "structure_output": True
-        }
+        self.remove_greetings = True
+        self.simplify_instructions = True
+        self.remove_examples = False  # Примеры важны для понимания
+        self.compress_redundancy = True
+        self.structure_output = True
     
     def optimize_for_small_model(
         self,
@@ -70,105 +111,76 @@ class PromptOptimizer:
         
         return optimized
     
-    def _optimize_system_prompt(self, content: str, max_length: int) -> str:
-        """Оптимизирует системный промпт"""
-        # Удаляем приветствия
-        if self.optimization_rules["remove_greetings"]:
-            content = self._remove_greetings(content)
-        
-        # Упрощаем инструкции
-        if self.optimization_rules["simplify_instructions"]:
-            content = self._simplify_instructions(content)
-        
-        # Сжимаем избыточность
-        if self.optimization_rules["compress_redundancy"]:
-            content = self._compress_redundancy(content)
-        
-        # Структурируем
-        if self.optimization_rules["structure_output"]:
-            content = self._structure_prompt(content)
-        
-        # Обрезаем если слишком длинный
-        if len(content) > max_length:
-            content = content[:max_length] + "..."
+    async def aoptimize_for_small_model(
+        self,
+        messages: List[LLMMessage],
+        max_length: int = 1000
+    ) -> List[LLMMessage]:
+        """
+        Асинхронная версия optimize_for_small_model
         
-        return content
+        Проходы по тексту выполняются в потоке: на больших системных
+        промптах они не блокируют цикл событий (SSE, другие запросы).
+        """
+        return await asyncio.to_thread(self.optimize_for_small_model, messages, max_length)
+    
+    def _optimize_system_prompt(self, content: str, max_length: int) -> str:
+        """Оптимизирует системный промпт (результат кэшируется)"""
+        # Системные промпты почти не меняются между запросами: результат
+        # зависит только от текста, длины и включённых правил
+        rules = (
+            self.remove_greetings,
+            self.simplify_instructions,
+            self.compress_redundancy,
+            self.structure_output
+        )
+        return _optimize_system_prompt_cached(content, max_length, rules)
     
     def _optimize_user_prompt(self, content: str, max_length: int) -> str:
         """Оптимизирует пользовательский промпт"""
         # Менее агрессивная оптимизация для пользовательских промптов
         # Только сжатие избыточности
-        if self.optimization_rules["compress_redundancy"]:
+        if self.compress_redundancy:
             content = self._compress_redundancy(content)
         
         # Обрезаем если слишком длинный
         if len(content) > max_length:
-            # Пытаемся обрезать умно (по предложениям)
-            sentences = content.split('. ')
+            # Пытаемся обрезать умно (по предложениям); длина собранного
+            # текста считается накопительно, без повторных join
             result = []
-            for sentence in sentences:
-                if len('. '.join(result + [sentence])) <= max_length:
-                    result.append(sentence)
-                else:
+            length = 0
+            for sentence in content.split('. '):
+                added = len(sentence) + (2 if result else 0)  # + разделитель '. '
+                if length + added > max_length:
                     break
-            content = '. '.join(result)
-            if len(content) < len(content.split('. ')[0]):  # Если ничего не собрали
-                content = content[:max_length]
+                result.append(sentence)
+                length += added
+            # Если даже первое предложение не влезло - режем по длине
+            content = '. '.join(result) or content[:max_length]
         
         return content
     
-    def _remove_greetings(self, content: str) -> str:
+    @staticmethod
+    def _remove_greetings(content: str) -> str:
         """Удаляет приветствия и вежливые фразы"""
-        greetings = [
-            "Привет", "Здравствуй", "Добро пожаловать",
-            "Hello", "Hi", "Welcome",
-            "Спасибо", "Thank you", "Thanks"
-        ]
-        
-        lines = content.split('\n')
-        filtered = []
-        for line in lines:
-            line_lower = line.lower().strip()
-            if not any(greeting.lower() in line_lower for greeting in greetings):
-                filtered.append(line)
-        
+        filtered = [line for line in content.split('\n') if not _GREETINGS_RE.search(line)]
         return '\n'.join(filtered)
     
-    def _simplify_instructions(self, content: str) -> str:
+    @staticmethod
+    def _simplify_instructions(content: str) -> str:
         """Упрощает инструкции"""
         # Заменяем сложные конструкции на простые
-        replacements = {
-            "необходимо": "нужно",
-            "осуществить": "сделать",
-            "реализовать": "создать",
-            "обеспечить": "сделать",
-            "предоставить": "дать",
-            "необходимо убедиться": "проверить",
-            "следует": "нужно",
-        }
-        
-        for old, new in replacements.items():
-            content = content.replace(old, new)
-            content = content.replace(old.capitalize(), new.capitalize())
-        
-        return content
+        return _SIMPLE_WORDS_RE.sub(lambda m: _SIMPLE_WORDS[m.group(0)], content)
     
-    def _compress_redundancy(self, content: str) -> str:
+    @staticmethod
+    def _compress_redundancy(content: str) -> str:
         """Сжимает избыточность"""
-        # Удаляем повторяющиеся слова
-        words = content.split()
-        compressed = []
-        prev_word = None
-        
-        for word in words:
-            if word.lower() != prev_word:
-                compressed.append(word)
-                prev_word = word.lower()
-            # Пропускаем повторения, но сохраняем структуру
-        
-        return ' '.join(compressed)
+        # Схлопываем подряд идущие повторы слов (без учёта регистра),
+        # оставляя первое написание
+        return ' '.join(next(group) for _, group in groupby(content.split(), key=str.lower))
     
-    def _structure_prompt(self, content: str) -> str:
+    @staticmethod
+    def _structure_prompt(content: str) -> str:
         """Структурирует промпт для лучшего понимания"""
         # Добавляем нумерацию для списков
         lines = content.split('\n')
@@ -215,3 +227,30 @@ class PromptOptimizer:
         
         return "\n".join(parts)
 
+
+@functools.lru_cache(maxsize=1024)
+def _optimize_system_prompt_cached(content: str, max_length: int, rules: Tuple[bool, bool, bool, bool]) -> str:
+    """Проходы оптимизации системного промпта (rules - флаги PromptOptimizer)"""
+    remove_greetings, simplify_instructions, compress_redundancy, structure_output = rules
+    
+    # Удаляем приветствия
+    if remove_greetings:
+        content = PromptOptimizer._remove_greetings(content)
+    
+    # Упрощаем инструкции
+    if simplify_instructions:
+        content = PromptOptimizer._simplify_instructions(content)
+    
+    # Сжимаем избыточность
+    if compress_redundancy:
+        content = PromptOptimizer._compress_redundancy(content)
+    
+    # Структурируем
+    if structure_output:
+        content = PromptOptimizer._structure_prompt(content)
+    
+    # Обрезаем если слишком длинный
+    if len(content) > max_length:
+        content = content[:max_length] + "..."
+    
+    return content
@@ -2,27 +2,53 @@
 Pydantic utilities for compatibility between v1 and v2
 """
 
-from typing import Any, Dict
+from operator import methodcaller
+from typing import Any, Callable, Dict, Tuple
+
+
+_model_dump = methodcaller('model_dump')  # Pydantic v2
+_dict = methodcaller('dict')  # Pydantic v1
+
+
+def _identity(obj: Any) -> Dict[str, Any]:
+    return obj
+
+
+def _empty(obj: Any) -> Dict[str, Any]:
+    return {}
+
+
+# Converters for types whose behaviour is fixed by the class
+# (no hasattr probes on the hot path)
+_DISPATCH: Dict[type, Callable[[Any], Dict[str, Any]]] = {}
+
+
+def _resolve(obj: Any) -> Tuple[Callable[[Any], Dict[str, Any]], bool]:
+    """Pick a converter for obj and tell whether it can be cached by type"""
+    cls = type(obj)
+    if hasattr(obj, 'model_dump'):
+        # Instance attributes / __getattr__ (proxies, mocks) vary per object
+        return _model_dump, hasattr(cls, 'model_dump')
+    if hasattr(obj, 'dict'):
+        return _dict, hasattr(cls, 'dict')
+    if isinstance(obj, dict):
+        return _identity, True
+    return _empty, False
 
 
 def pydantic_to_dict(obj: Any) -> Dict[str, Any]:
     """
     Convert Pydantic model to dict, compatible with v1 and v2
-    
+
     Args:
         obj: Pydantic model instance or dict
-        
+
     Returns:
         Dictionary representation of the object
     """
-    if hasattr(obj, 'model_dump'):
-        # Pydantic v2
-        return obj.model_dump()
-    elif hasattr(obj, 'dict'):
-        # Pydantic v1
-        return obj.dict()
-    elif isinstance(obj, dict):
-        return obj
-    else:
-        return {}
-
+    convert = _DISPATCH.get(type(obj))
+    if convert is None:
+        convert, cacheable = _resolve(obj)
+        if cacheable:
+            _DISPATCH[type(obj)] = convert
+    return convert(obj)
@@ -2,21 +2,55 @@
 Rate Limiter - Middleware для ограничения частоты запросов
 """
 
+import threading
 import time
-from typing import Dict, Optional, Tuple
-from collections import defaultdict
-from fastapi import Request, HTTPException, status
+from typing import Dict, List, Optional, Tuple
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from .logger import get_logger
 
 logger = get_logger(__name__)
 
+# Число шардов хранилища клиентов (степень двойки): у каждого своя блокировка,
+# клиенты из разных шардов не ждут друг друга
+RATE_LIMIT_SHARDS = 16
+
+# Системные endpoints без rate limiting: точные пути и префиксы
+# (статика и OAuth-редирект Swagger UI)
+_SKIP_PATHS = frozenset({"/health", "/", "/docs", "/openapi.json", "/redoc"})
+_SKIP_PREFIXES = ("/static/", "/docs/oauth2-redirect")
+
+_Buckets = Tuple["_TokenBucket", "_TokenBucket", "_TokenBucket"]
+
+
+class _TokenBucket:
+    """
+    Token bucket одного лимита: ёмкость - лимит за период, пополнение
+    равномерное (лимит / период в секунду). Два числа на клиента.
+    """
+    
+    __slots__ = ("tokens", "last")
+    
+    def __init__(self, capacity: float, now: float):
+        self.tokens = float(capacity)
+        self.last = now
+    
+    def refill(self, now: float, rate: float, capacity: float) -> float:
+        """Пополняет корзину к текущему времени, возвращает число токенов"""
+        self.tokens = min(capacity, self.tokens + (now - self.last) * rate)
+        self.last = now
+        return self.tokens
+
 
 class RateLimiter:
     """
     Rate limiter для ограничения частоты запросов
     
-    Использует sliding window алгоритм для более точного ограничения
+    Иерархические token bucket: для каждого клиента три корзины (минута,
+    час, сутки). Запрос проходит, если в каждой есть токен, и забирает по
+    одному из всех. Проверка - несколько операций с числами, память не
+    зависит от частоты запросов.
     """
     
     def __init__(
@@ -37,13 +71,34 @@ class RateLimiter:
         self.requests_per_hour = requests_per_hour
         self.requests_per_day = requests_per_day
         
-        # Хранилище запросов: {identifier: [timestamps]}
-        self.requests: Dict[str, list] = defaultdict(list)
+        # (ёмкость, пополнение в секунду, текст ошибки) для минуты, часа и суток
+        self._limits = (
+            (requests_per_minute, requests_per_minute / 60, f"{requests_per_minute} requests per minute"),
+            (requests_per_hour, requests_per_hour / 3600, f"{requests_per_hour} requests per hour"),
+            (requests_per_day, requests_per_day / 86400, f"{requests_per_day} requests per day"),
+        )
+        
+        # Корзины клиентов по шардам: [({identifier: (минута, час, сутки)}, lock)]
+        self._shards: List[Tuple[Dict[str, _Buckets], threading.Lock]] = [
+            ({}, threading.Lock()) for _ in range(RATE_LIMIT_SHARDS)
+        ]
         
         # Время последней очистки
         self.last_cleanup = time.time()
         self.cleanup_interval = 300  # Очистка каждые 5 минут
     
+    @property
+    def requests(self) -> Dict[str, _Buckets]:
+        """Снимок корзин всех клиентов (для статистики и отладки)"""
+        snapshot: Dict[str, _Buckets] = {}
+        for clients, lock in self._shards:
+            with lock:
+                snapshot.update(clients)
+        return snapshot
+    
+    def _shard(self, identifier: str) -> Tuple[Dict[str, _Buckets], threading.Lock]:
+        return self._shards[hash(identifier) & (RATE_LIMIT_SHARDS - 1)]
+    
     def _get_identifier(self, request: Request) -> str:
         """
         Получает идентификатор клиента для rate limiting
@@ -62,89 +117,81 @@ class RateLimiter:
         return f"ip:{client_ip}"
     
     def _cleanup_old_requests(self):
-        """Очищает старые записи для экономии памяти"""
+        """Удаляет клиентов, чьи корзины снова полные (состояние как у нового)"""
         current_time = time.time()
         if current_time - self.last_cleanup < self.cleanup_interval:
             return
         
-        # Удаляем записи старше 24 часов
-        cutoff_time = current_time - 86400  # 24 часа
-        
-        for identifier in list(self.requests.keys()):
-            self.requests[identifier] = [
-                ts for ts in self.requests[identifier]
-                if ts > cutoff_time
-            ]
-            # Удаляем пустые списки
-            if not self.requests[identifier]:
-                del self.requests[identifier]
-        
         self.last_cleanup = current_time
+        
+        for clients, lock in self._shards:
+            with lock:
+                for identifier, buckets in list(clients.items()):
+                    if all(
+                        bucket.refill(current_time, rate, capacity) >= capacity
+                        for bucket, (capacity, rate, _) in zip(buckets, self._limits)
+                    ):
+                        del clients[identifier]
     
-    def is_allowed(self, request: Request) -> Tuple[bool, Optional[str]]:
+    def _tokens(self, buckets: Optional[_Buckets], current_time: float) -> Tuple[float, float, float]:
+        """Доступные токены клиента на минуту, час и сутки"""
+        if buckets is None:
+            return tuple(float(capacity) for capacity, _, _ in self._limits)
+        return tuple(
+            bucket.refill(current_time, rate, capacity)
+            for bucket, (capacity, rate, _) in zip(buckets, self._limits)
+        )
+    
+    @staticmethod
+    def _remaining(tokens: Tuple[float, float, float]) -> Dict[str, int]:
+        minute, hour, day = tokens
+        return {
+            "per_minute": max(0, int(minute)),
+            "per_hour": max(0, int(hour)),
+            "per_day": max(0, int(day))
+        }
+    
+    def is_allowed(self, request: Request) -> Tuple[bool, Optional[str], Dict[str, int]]:
         """
         Проверяет, разрешен ли запрос
         
         Returns:
-            (is_allowed, error_message)
+            (is_allowed, error_message, remaining) - remaining как в
+            get_remaining_requests, уже с учётом этого запроса
         """
         self._cleanup_old_requests()
         
         identifier = self._get_identifier(request)
-        current_time = time.time()
-        
-        # Получаем историю запросов
-        request_times = self.requests[identifier]
-        
-        # Удаляем запросы старше 24 часов
-        request_times = [ts for ts in request_times if ts > current_time - 86400]
-        self.requests[identifier] = request_times
-        
-        # Проверяем лимиты
-        # 1. Минутный лимит
-        minute_ago = current_time - 60
-        recent_requests = [ts for ts in request_times if ts > minute_ago]
-        if len(recent_requests) >= self.requests_per_minute:
-            return False, f"Rate limit exceeded: {self.requests_per_minute} requests per minute"
-        
-        # 2. Часовой лимит
-        hour_ago = current_time - 3600
-        hour_requests = [ts for ts in request_times if ts > hour_ago]
-        if len(hour_requests) >= self.requests_per_hour:
-            return False, f"Rate limit exceeded: {self.requests_per_hour} requests per hour"
-        
-        # 3. Дневной лимит
-        day_ago = current_time - 86400
-        day_requests = [ts for ts in request_times if ts > day_ago]
-        if len(day_requests) >= self.requests_per_day:
-            return False, f"Rate limit exceeded: {self.requests_per_day} requests per day"
-        
-        # Запрос разрешен - добавляем timestamp
-        request_times.append(current_time)
-        self.requests[identifier] = request_times
-        
-        return True, None
+        clients, lock = self._shard(identifier)
+        
+        with lock:
+            current_time = time.time()
+            buckets = clients.get(identifier)
+            tokens = self._tokens(buckets, current_time)
+            
+            # Проверяем лимиты: минута, час, сутки
+            for available, (_, _, limit_text) in zip(tokens, self._limits):
+                if available < 1:
+                    return False, f"Rate limit exceeded: {limit_text}", self._remaining(tokens)
+            
+            # Запрос разрешен - забираем токен из каждой корзины
+            if buckets is None:
+                buckets = clients[identifier] = tuple(
+                    _TokenBucket(capacity, current_time) for capacity, _, _ in self._limits
+                )
+            for bucket in buckets:
+                bucket.tokens -= 1
+            
+            return True, None, self._remaining(tuple(bucket.tokens for bucket in buckets))
     
     def get_remaining_requests(self, request: Request) -> Dict[str, int]:
         """
         Возвращает количество оставшихся запросов для каждого периода
         """
         identifier = self._get_identifier(request)
-        current_time = time.time()
-        request_times = self.requests.get(identifier, [])
-        
-        # Удаляем старые запросы
-        request_times = [ts for ts in request_times if ts > current_time - 86400]
-        
-        minute_ago = current_time - 60
-        hour_ago = current_time - 3600
-        day_ago = current_time - 86400
-        
-        return {
-            "per_minute": max(0, self.requests_per_minute - len([ts for ts in request_times if ts > minute_ago])),
-            "per_hour": max(0, self.requests_per_hour - len([ts for ts in request_times if ts > hour_ago])),
-            "per_day": max(0, self.requests_per_day - len([ts for ts in request_times if ts > day_ago]))
-        }
+        clients, lock = self._shard(identifier)
+        with lock:
+            return self._remaining(self._tokens(clients.get(identifier), time.time()))
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
@@ -158,31 +205,32 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next):
         # Пропускаем health check и другие системные endpoints
-        if request.url.path in ["/health", "/", "/docs", "/openapi.json", "/redoc"]:
+        path = request.url.path
+        if path in _SKIP_PATHS or path.startswith(_SKIP_PREFIXES):
             return await call_next(request)
         
-        # Проверяем rate limit
-        is_allowed, error_message = self.rate_limiter.is_allowed(request)
+        # Проверяем rate limit (остаток лимитов считается в той же проверке)
+        is_allowed, error_message, remaining = self.rate_limiter.is_allowed(request)
         
         if not is_allowed:
-            remaining = self.rate_limiter.get_remaining_requests(request)
             logger.warning(
                 f"Rate limit exceeded for {self.rate_limiter._get_identifier(request)}: {error_message}"
             )
-            raise HTTPException(
+            # Ответ, а не HTTPException: исключение из BaseHTTPMiddleware не
+            # доходит до обработчиков FastAPI и превращается в 500
+            return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail={
+                content={"detail": {
                     "error": "Rate limit exceeded",
                     "message": error_message,
                     "remaining": remaining
-                }
+                }}
             )
         
         # Выполняем запрос
         response = await call_next(request)
         
         # Добавляем заголовки с информацией о rate limit
-        remaining = self.rate_limiter.get_remaining_requests(request)
         response.headers["X-RateLimit-Limit-Minute"] = str(self.rate_limiter.requests_per_minute)
         response.headers["X-RateLimit-Limit-Hour"] = str(self.rate_limiter.requests_per_hour)
         response.headers["X-RateLimit-Limit-Day"] = str(self.rate_limiter.requests_per_day)
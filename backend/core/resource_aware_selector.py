@@ -8,8 +8,15 @@ Resource-Aware Model Selector - Адаптивный выбор модели п
 - Fallback на альтернативные модели/серверы
 """
 
+import asyncio
+import atexit
+import os
+import re
 import time
-from typing import Dict, Any, Optional, List, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Dict, Any, FrozenSet, Optional, List, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 from .logger import get_logger
@@ -19,10 +26,156 @@ logger = get_logger(__name__)
 
 from ..llm.providers import LLMProviderManager
 from .smart_model_selector import SmartModelSelector, ModelSelection
-from .model_performance_tracker import get_performance_tracker
+from .model_performance_tracker import get_performance_tracker, ModelMetrics
 from .distributed_model_router import DistributedModelRouter
 from .intelligent_model_router import IntelligentModelRouter, ScoredModel
 
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+    psutil = None
+
+try:
+    import pynvml
+    PYNVML_AVAILABLE = True
+except ImportError:
+    PYNVML_AVAILABLE = False
+    pynvml = None
+
+
+# CPU и объём RAM не меняются в пределах процесса - считаем один раз
+_CPU_CORES = os.cpu_count() or 4
+try:
+    _TOTAL_MEMORY_GB: Optional[float] = psutil.virtual_memory().total / (1024**3) if PSUTIL_AVAILABLE else None
+except (AttributeError, OSError):
+    _TOTAL_MEMORY_GB = None
+
+# Размер модели по названию: "llama3:70b", "qwen2.5:14b-instruct", "mixtral:8x7b"
+_SIZE_PATTERN = re.compile(r'(?<!\d)(1|2|3|7|8|13|14|15|20|30|34|40|65|67|70|72)b(?!\d)')
+_TINY_NAME_MARKERS = frozenset({"tiny"})
+
+# Классы размера моделей (чем больше, тем мощнее)
+SIZE_UNKNOWN = 0
+SIZE_TINY = 1  # 1-3B
+SIZE_SMALL = 2  # 7-8B
+SIZE_MEDIUM = 3  # 13-20B
+SIZE_LARGE = 4  # 30-40B
+SIZE_XL = 5  # 65B+
+
+_SIZE_TIERS = {
+    "1": SIZE_TINY, "2": SIZE_TINY, "3": SIZE_TINY,
+    "7": SIZE_SMALL, "8": SIZE_SMALL,
+    "13": SIZE_MEDIUM, "14": SIZE_MEDIUM, "15": SIZE_MEDIUM, "20": SIZE_MEDIUM,
+    "30": SIZE_LARGE, "34": SIZE_LARGE, "40": SIZE_LARGE,
+    "65": SIZE_XL, "67": SIZE_XL, "70": SIZE_XL, "72": SIZE_XL,
+}
+
+# Ключевые слова сложных задач (поиск без учёта регистра, в C вместо цикла any())
+_COMPLEX_RE = re.compile(
+    r'система|system|framework|фреймворк|приложение|application|app|'
+    r'игра|game|cloud|облако|редактор|editor',
+    re.IGNORECASE
+)
+
+
+def _classify_size(model_lower: str) -> int:
+    """Класс размера модели по названию (в нижнем регистре)"""
+    tier = max((_SIZE_TIERS[m] for m in _SIZE_PATTERN.findall(model_lower)), default=SIZE_UNKNOWN)
+    if tier == SIZE_UNKNOWN and any(marker in model_lower for marker in _TINY_NAME_MARKERS):
+        return SIZE_TINY
+    return tier
+
+
+# Предпочтительные альтернативы для каждого tier
+_PREFERRED_ALTERNATIVES: Dict[ModelTier, Tuple[str, ...]] = {
+    ModelTier.FAST: ("gemma3:1b", "tinyllama", "phi"),
+    ModelTier.BALANCED: ("llama2", "mistral", "neural-chat"),
+    ModelTier.POWERFUL: ("llama2:70b", "codellama:70b", "mistral:70b"),
+}
+
+# Базовое качество (0.0 - 1.0) и скорость (токенов/с) по tier
+_TIER_QUALITY: Dict[ModelTier, float] = {
+    ModelTier.FAST: 0.6,
+    ModelTier.BALANCED: 0.8,
+    ModelTier.POWERFUL: 0.95,
+}
+_TIER_SPEED: Dict[ModelTier, float] = {
+    ModelTier.FAST: 50.0,
+    ModelTier.BALANCED: 20.0,
+    ModelTier.POWERFUL: 10.0,
+}
+
+
+def _model_tier_for_size(size: int) -> ModelTier:
+    """ModelTier по классу размера модели"""
+    if size == SIZE_TINY:
+        return ModelTier.FAST
+    if size == SIZE_XL:
+        return ModelTier.POWERFUL
+    return ModelTier.BALANCED
+
+
+def _build_tier_index(size_tiers: Dict[str, int]) -> Dict[ModelTier, List[str]]:
+    """Модели по ModelTier (порядок внутри tier - как в списке доступных)"""
+    by_tier: Dict[ModelTier, List[str]] = {tier: [] for tier in ModelTier}
+    for model, size in size_tiers.items():
+        by_tier[_model_tier_for_size(size)].append(model)
+    return by_tier
+
+
+def _classify_complexity(task: str, task_type: Optional[str]) -> str:
+    """
+    Оценка сложности задачи по длине и ключевым словам.
+    Без кэша: ключевые слова ищутся только в задачах короче 200 символов
+    (длинные и так "high"), так что оценка дешёвая, а полные тексты
+    промптов не держатся в памяти как ключи кэша.
+    """
+    task_len = len(task)
+    
+    if task_len < 50:
+        return "low"
+    if task_len >= 200:
+        return "high"
+    
+    return "high" if _COMPLEX_RE.search(task) else "medium"
+
+
+@lru_cache(maxsize=1)
+def _nvml_gpu_info() -> Optional[Tuple[float, int, float]]:
+    """
+    Память GPU через NVML (в процессе, без запуска nvidia-smi).
+    Опрашивается один раз на процесс: набор GPU не меняется во время работы.
+    
+    Returns:
+        (memory_per_gpu_gb, gpu_count, total_memory_gb) или None если NVML недоступен
+    """
+    if not PYNVML_AVAILABLE:
+        return None
+    try:
+        pynvml.nvmlInit()
+    except Exception as e:
+        logger.debug(f"NVML init failed: {e}")
+        return None
+    atexit.register(pynvml.nvmlShutdown)
+    
+    try:
+        gpu_count = pynvml.nvmlDeviceGetCount()
+        if gpu_count == 0:
+            return None
+        total_bytes = sum(
+            pynvml.nvmlDeviceGetMemoryInfo(pynvml.nvmlDeviceGetHandleByIndex(i)).total
+            for i in range(gpu_count)
+        )
+    except Exception as e:
+        logger.debug(f"Failed to get GPU memory via NVML: {e}")
+        return None
+    
+    total_memory_gb = total_bytes / (1024**3)
+    logger.info(f"Detected {gpu_count} GPU(s) with {total_memory_gb:.1f} GB total VRAM (NVML)")
+    return total_memory_gb / gpu_count, gpu_count, total_memory_gb
+
 
 class ResourceLevel(Enum):
     """Уровни доступных ресурсов"""
@@ -33,7 +186,83 @@ class ResourceLevel(Enum):
     MAXIMUM = "maximum"  # Максимальные ресурсы (30B+)
 
 
-@dataclass
+_BASE_CAPACITY = {
+    ResourceLevel.MINIMAL: 1,
+    ResourceLevel.LOW: 2,
+    ResourceLevel.MEDIUM: 5,
+    ResourceLevel.HIGH: 10,
+    ResourceLevel.MAXIMUM: 20
+}
+
+# Корзины памяти на одну GPU и ядер CPU для расчёта capacity
+GPU_NONE, GPU_SMALL, GPU_MID, GPU_LARGE = 0, 1, 2, 3  # нет/8-16GB, <8GB, 16-24GB, 24GB+
+CPU_FEW, CPU_NORMAL, CPU_MANY, CPU_HUGE = 0, 1, 2, 3  # <4, 4-15, 16-23, 24+
+_CAPACITY_TABLE_MAX_GPUS = 8
+
+
+def _gpu_bucket(gpu_memory: Optional[float]) -> int:
+    if not gpu_memory:
+        return GPU_NONE
+    if gpu_memory >= 24:  # RTX 3090, RTX 4090, A100
+        return GPU_LARGE
+    if gpu_memory >= 16:  # RTX 4080, A10
+        return GPU_MID
+    if gpu_memory < 8:
+        return GPU_SMALL
+    return GPU_NONE
+
+
+def _cpu_bucket(cpu_cores: int) -> int:
+    # 12900K = 24 threads
+    if cpu_cores >= 24:
+        return CPU_HUGE
+    if cpu_cores >= 16:
+        return CPU_MANY
+    if cpu_cores < 4:
+        return CPU_FEW
+    return CPU_NORMAL
+
+
+def _compute_capacity(level: ResourceLevel, gpu_bucket: int, cpu_bucket: int, gpu_count: int) -> int:
+    """Capacity (количество параллельных запросов) по корзинам ресурсов"""
+    capacity = _BASE_CAPACITY.get(level, 1)
+    
+    # Корректируем на основе GPU памяти (на одну карту)
+    if gpu_bucket == GPU_LARGE:
+        capacity = min(capacity * 2, 30)
+    elif gpu_bucket == GPU_MID:
+        capacity = min(int(capacity * 1.5), 20)
+    elif gpu_bucket == GPU_SMALL:
+        capacity = max(1, capacity // 2)
+    
+    # MULTI-GPU: каждый дополнительный GPU добавляет ~80% capacity
+    # (не 100% из-за overhead на координацию)
+    if gpu_count > 1:
+        capacity = int(capacity * (1 + (gpu_count - 1) * 0.8))
+    
+    # Корректируем на основе CPU
+    if cpu_bucket == CPU_HUGE:
+        capacity = min(capacity + 10, 50)
+    elif cpu_bucket == CPU_MANY:
+        capacity = min(capacity + 5, 40)
+    elif cpu_bucket == CPU_FEW:
+        capacity = max(1, capacity - 1)
+    
+    # Верхний предел для стабильности
+    return min(capacity, 50)
+
+
+# Все комбинации корзин считаются один раз при импорте
+_CAPACITY_TABLE: Dict[Tuple[ResourceLevel, int, int, int], int] = {
+    (level, gpu, cpu, count): _compute_capacity(level, gpu, cpu, count)
+    for level in ResourceLevel
+    for gpu in (GPU_NONE, GPU_SMALL, GPU_MID, GPU_LARGE)
+    for cpu in (CPU_FEW, CPU_NORMAL, CPU_MANY, CPU_HUGE)
+    for count in range(_CAPACITY_TABLE_MAX_GPUS + 1)
+}
+
+
+@dataclass(slots=True)
 class ResourceInfo:
     """Информация о доступных ресурсах"""
     level: ResourceLevel
@@ -45,9 +274,22 @@ class ResourceInfo:
     total_memory_gb: Optional[float] = None
     estimated_capacity: int = 1  # Количество параллельных запросов
     can_run_large_models: bool = False  # Может ли запускать 70B+ модели
+    available_models_set: FrozenSet[str] = frozenset()  # Те же модели для проверки вхождения за O(1)
+    size_tiers: Dict[str, int] = field(default_factory=dict)  # Класс размера каждой модели (SIZE_*)
+    by_tier: Dict[ModelTier, List[str]] = field(default_factory=dict)  # Доступные модели по ModelTier
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class AdaptationConfig:
+    """Настройки адаптации под малые ресурсы"""
+    minimal_quality_threshold: float = 0.6  # Минимальное качество для малых моделей
+    enable_prompt_optimization: bool = True  # Оптимизация промптов для малых моделей
+    enable_task_decomposition: bool = True  # Декомпозиция сложных задач
+    fallback_enabled: bool = True  # Включить fallback
+    quality_vs_speed_balance: float = 0.7  # Баланс качества и скорости (0.0 = скорость, 1.0 = качество)
+
+
+@dataclass(frozen=True, slots=True)
 class AdaptiveSelection:
     """Адаптивный выбор модели с учетом ресурсов и распределения между серверами"""
     model: str
@@ -103,15 +345,18 @@ class ResourceAwareSelector:
         self._resource_info: Optional[ResourceInfo] = None
         self._resource_cache_ttl = 300  # 5 минут
         self._last_resource_check = 0.0
+        # Текущее обновление (single-flight: один опрос на всех ожидающих)
+        self._inflight: Optional[asyncio.Task] = None
+        
+        # LRU готовых выборов (только без распределённого режима - там решение зависит от нагрузки серверов)
+        self._selection_cache: "OrderedDict[tuple, AdaptiveSelection]" = OrderedDict()
+        self._selection_cache_size = 256
+        
+        # Информация о GPU стабильна в пределах процесса
+        self._gpu_info_cached: Optional[Tuple[float, int, float]] = _nvml_gpu_info()
         
         # Конфигурация адаптации
-        self.adaptation_config = {
-            "minimal_quality_threshold": 0.6,  # Минимальное качество для малых моделей
-            "enable_prompt_optimization": True,  # Оптимизация промптов для малых моделей
-            "enable_task_decomposition": True,  # Декомпозиция сложных задач
-            "fallback_enabled": True,  # Включить fallback
-            "quality_vs_speed_balance": 0.7  # Баланс качества и скорости (0.0 = скорость, 1.0 = качество)
-        }
+        self.adaptation_config = AdaptationConfig()
     
     async def discover_resources(self) -> ResourceInfo:
         """Обнаруживает доступные ресурсы со всех серверов (при распределённом режиме)"""
@@ -121,52 +366,34 @@ class ResourceAwareSelector:
             current_time - self._last_resource_check < self._resource_cache_ttl):
             return self._resource_info
         
-        available_models = []
-        resource_level = ResourceLevel.MINIMAL
+        # Истёкший кэш обновляет одна корутина, остальные ждут её результат
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh_resources())
+            self._inflight.add_done_callback(self._clear_inflight)
+        # shield: отмена одного из ожидающих не отменяет общий опрос
+        return await asyncio.shield(self._inflight)
+    
+    def _clear_inflight(self, task: asyncio.Task) -> None:
+        if self._inflight is task:
+            self._inflight = None
+    
+    async def _refresh_resources(self) -> ResourceInfo:
+        """Опрашивает модели и ресурсы и обновляет кэш"""
+        current_time = time.time()
         
-        # ======= РАСПРЕДЕЛЁННЫЙ РЕЖИМ: собираем модели со ВСЕХ серверов =======
-        if self.distributed_router:
-            try:
-                servers = await self.distributed_router.discover_all_servers()
-                # Собираем уникальные модели со всех доступных серверов
-                all_models = set()
-                for server in servers.values():
-                    if server.is_available:
-                        all_models.update(server.available_models)
-                available_models = list(all_models)
-                logger.info(f"Distributed discovery: {len(available_models)} models across {len([s for s in servers.values() if s.is_available])} servers")
-            except Exception as e:
-                logger.warning(f"Distributed discovery failed: {e}, falling back to local")
+        # Модели и GPU опрашиваем параллельно
+        available_models, (gpu_memory, gpu_count, total_gpu_memory) = await asyncio.gather(
+            self._discover_models(),
+            self._estimate_gpu_memory()
+        )
+        cpu_cores, total_memory_gb = _CPU_CORES, _TOTAL_MEMORY_GB
         
-        # Fallback на локальный провайдер если нет распределённого или он не сработал
-        if not available_models and self.llm_manager:
-            ollama_provider = self.llm_manager.providers.get("ollama")
-            if ollama_provider:
-                try:
-                    available_models = await ollama_provider.list_models()
-                    logger.info(f"Local discovery: {len(available_models)} available models")
-                except Exception as e:
-                    logger.warning(f"Failed to list models: {e}")
+        # Классифицируем модели по размеру один раз на discovery
+        size_tiers = {model: _classify_size(model.lower()) for model in available_models}
+        by_tier = _build_tier_index(size_tiers)
         
         # Определяем уровень ресурсов на основе доступных моделей
-        resource_level = self._determine_resource_level(available_models)
-        
-        # Оцениваем GPU память (если доступно)
-        gpu_memory, gpu_count, total_gpu_memory = await self._estimate_gpu_memory()
-        
-        # Оцениваем CPU
-        try:
-            import os
-            cpu_cores = os.cpu_count() or 4
-        except (OSError, AttributeError):
-            cpu_cores = 4
-        
-        # Оцениваем общую память
-        try:
-            import psutil
-            total_memory_gb = psutil.virtual_memory().total / (1024**3)
-        except (ImportError, AttributeError, OSError):
-            total_memory_gb = None
+        resource_level = self._determine_resource_level(size_tiers)
         
         # Оцениваем capacity на основе ресурсов (с учётом multi-GPU)
         capacity = self._estimate_capacity(resource_level, gpu_memory, cpu_cores, gpu_count)
@@ -178,65 +405,75 @@ class ResourceAwareSelector:
         self._resource_info = ResourceInfo(
             level=resource_level,
             available_models=available_models,
+            available_models_set=frozenset(available_models),
             gpu_memory_gb=gpu_memory,
             gpu_count=gpu_count,
             total_gpu_memory_gb=total_gpu_memory,
             cpu_cores=cpu_cores,
             total_memory_gb=total_memory_gb,
             estimated_capacity=capacity,
-            can_run_large_models=can_run_large
+            can_run_large_models=can_run_large,
+            size_tiers=size_tiers,
+            by_tier=by_tier
         )
         
         self._last_resource_check = current_time
+        # Выборы, посчитанные для старых ресурсов, больше не актуальны
+        self._selection_cache.clear()
         
         logger.info(
-            f"Resource level: {resource_level.value}, "
-            f"Models: {len(available_models)}, "
-            f"Capacity: {capacity} parallel requests"
+            "Resource level: {}, Models: {}, Capacity: {} parallel requests",
+            resource_level.value, len(available_models), capacity
         )
         
         return self._resource_info
     
-    def _determine_resource_level(self, models: List[str]) -> ResourceLevel:
-        """Определяет уровень ресурсов на основе доступных моделей"""
-        if not models:
-            return ResourceLevel.MINIMAL
+    async def _discover_models(self) -> List[str]:
+        """Список доступных моделей: со всех серверов или с локального Ollama"""
+        available_models: List[str] = []
         
-        # Анализируем модели по размеру
-        large_models = 0  # 30B+
-        medium_models = 0  # 13-30B
-        small_models = 0  # 7-13B
-        tiny_models = 0  # <7B
-        
-        for model in models:
-            model_lower = model.lower()
-            
-            # Определяем размер модели по названию
-            if any(x in model_lower for x in ["70b", "72b", "65b", "67b"]):
-                large_models += 1
-            elif any(x in model_lower for x in ["30b", "34b", "40b"]):
-                medium_models += 1
-            elif any(x in model_lower for x in ["13b", "14b", "15b", "20b"]):
-                small_models += 1
-            else:
-                # Проверяем на малые модели
-                if any(x in model_lower for x in ["1b", "2b", "3b", "7b", "8b"]):
-                    tiny_models += 1
-                else:
-                    # Если не можем определить, считаем маленькой
-                    tiny_models += 1
+        # ======= РАСПРЕДЕЛЁННЫЙ РЕЖИМ: собираем модели со ВСЕХ серверов =======
+        if self.distributed_router:
+            try:
+                servers = await self.distributed_router.discover_all_servers()
+                # Собираем уникальные модели со всех доступных серверов (порядок - по первому вхождению)
+                available_servers = [s for s in servers.values() if s.is_available]
+                available_models = list(dict.fromkeys(
+                    chain.from_iterable(s.available_models for s in available_servers)
+                ))
+                logger.info(
+                    "Distributed discovery: {} models across {} servers",
+                    len(available_models), len(available_servers)
+                )
+            except Exception as e:
+                logger.warning(f"Distributed discovery failed: {e}, falling back to local")
         
-        # Определяем уровень ресурсов
-        if large_models > 0:
+        # Fallback на локальный провайдер если нет распределённого или он не сработал
+        if not available_models and self.llm_manager:
+            ollama_provider = self.llm_manager.providers.get("ollama")
+            if ollama_provider:
+                try:
+                    available_models = await ollama_provider.list_models()
+                    logger.info("Local discovery: {} available models", len(available_models))
+                except Exception as e:
+                    logger.warning(f"Failed to list models: {e}")
+        
+        return available_models
+    
+    def _determine_resource_level(self, size_tiers: Dict[str, int]) -> ResourceLevel:
+        """Определяет уровень ресурсов по классам размера доступных моделей"""
+        if not size_tiers:
+            return ResourceLevel.MINIMAL
+        
+        largest = max(size_tiers.values())
+        if largest >= SIZE_XL:
             return ResourceLevel.MAXIMUM
-        elif medium_models > 0:
+        elif largest == SIZE_LARGE:
             return ResourceLevel.HIGH
-        elif small_models > 0:
+        elif largest == SIZE_MEDIUM:
             return ResourceLevel.MEDIUM
-        elif tiny_models > 0:
-            return ResourceLevel.LOW
-        else:
-            return ResourceLevel.MINIMAL
+        # Малые и неопознанные модели
+        return ResourceLevel.LOW
     
     async def _estimate_gpu_memory(self) -> Tuple[Optional[float], int, Optional[float]]:
         """
@@ -245,17 +482,25 @@ class ResourceAwareSelector:
         Returns:
             Tuple[memory_per_gpu, gpu_count, total_memory]
         """
+        if self._gpu_info_cached is not None:
+            return self._gpu_info_cached
+        
+        # Без NVML - разовый вызов nvidia-smi, результат кэшируется
         try:
-            import subprocess
-            # Пробуем nvidia-smi для всех GPU
-            result = subprocess.run(
-                ["nvidia-smi", "--query-gpu=memory.total,name", "--format=csv,noheader,nounits"],
-                capture_output=True,
-                text=True,
-                timeout=5
+            # Пробуем nvidia-smi для всех GPU (не блокируя event loop)
+            proc = await asyncio.create_subprocess_exec(
+                "nvidia-smi", "--query-gpu=memory.total,name", "--format=csv,noheader,nounits",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
             )
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
+            try:
+                stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=5)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
+            if proc.returncode == 0:
+                lines = stdout.decode().strip().split('\n')
                 gpu_count = len(lines)
                 total_memory = 0.0
                 
@@ -270,7 +515,8 @@ class ResourceAwareSelector:
                 
                 logger.info(f"Detected {gpu_count} GPU(s) with {total_memory_gb:.1f} GB total VRAM")
                 
-                return memory_per_gpu, gpu_count, total_memory_gb
+                self._gpu_info_cached = (memory_per_gpu, gpu_count, total_memory_gb)
+                return self._gpu_info_cached
         except Exception as e:
             logger.debug(f"Failed to get GPU memory via nvidia-smi: {e}")
         
@@ -287,43 +533,19 @@ class ResourceAwareSelector:
         Оценивает capacity (количество параллельных запросов)
         с учётом multi-GPU конфигурации
         """
-        base_capacity = {
-            ResourceLevel.MINIMAL: 1,
-            ResourceLevel.LOW: 2,
-            ResourceLevel.MEDIUM: 5,
-            ResourceLevel.HIGH: 10,
-            ResourceLevel.MAXIMUM: 20
-        }
-        
-        capacity = base_capacity.get(level, 1)
-        
-        # Корректируем на основе GPU памяти (на одну карту)
-        if gpu_memory:
-            if gpu_memory >= 24:  # RTX 3090, RTX 4090, A100
-                capacity = min(capacity * 2, 30)
-            elif gpu_memory >= 16:  # RTX 4080, A10
-                capacity = min(int(capacity * 1.5), 20)
-            elif gpu_memory < 8:
-                capacity = max(1, capacity // 2)
-        
-        # MULTI-GPU: увеличиваем capacity пропорционально количеству GPU
+        key = (level, _gpu_bucket(gpu_memory), _cpu_bucket(cpu_cores), gpu_count)
+        capacity = _CAPACITY_TABLE.get(key)
+        if capacity is None:
+            # Больше GPU, чем в таблице, или нестандартный level
+            capacity = _compute_capacity(*key)
+        
         if gpu_count > 1:
-            # Каждый дополнительный GPU добавляет ~80% capacity
-            # (не 100% из-за overhead на координацию)
-            gpu_multiplier = 1 + (gpu_count - 1) * 0.8
-            capacity = int(capacity * gpu_multiplier)
-            logger.info(f"Multi-GPU capacity boost: {gpu_count} GPUs -> {gpu_multiplier:.1f}x multiplier")
-        
-        # Корректируем на основе CPU (12900K = 24 threads)
-        if cpu_cores >= 24:
-            capacity = min(capacity + 10, 50)
-        elif cpu_cores >= 16:
-            capacity = min(capacity + 5, 40)
-        elif cpu_cores < 4:
-            capacity = max(1, capacity - 1)
-        
-        # Верхний предел для стабильности
-        return min(capacity, 50)
+            logger.info(
+                "Multi-GPU capacity boost: {} GPUs -> {:.1f}x multiplier",
+                gpu_count, 1 + (gpu_count - 1) * 0.8
+            )
+        
+        return capacity
     
     async def select_adaptive_model(
         self,
@@ -360,60 +582,87 @@ class ResourceAwareSelector:
             complexity
         )
         
-        # ======= ИНТЕЛЛЕКТУАЛЬНАЯ МАРШРУТИЗАЦИЯ =======
-        intelligent_selection: Optional[ScoredModel] = None
-        
+        # Кэш выбора: ключ привязан к текущему ResourceInfo и сбрасывается вместе с ним
+        cache_key = None
+        if not self.distributed_router:
+            cache_key = (id(resources), preferred_model, task_type, complexity, quality_requirement)
+            cached = self._selection_cache.get(cache_key)
+            if cached is not None:
+                self._selection_cache.move_to_end(cache_key)
+                return cached
+        
+        # ======= ИНТЕЛЛЕКТУАЛЬНАЯ МАРШРУТИЗАЦИЯ + ЛОКАЛЬНЫЙ ВЫБОР (параллельно) =======
+        # Умный роутер и SmartModelSelector независимы - запускаем одновременно
+        pending: Dict[str, Any] = {}
         if hasattr(self, 'intelligent_router') and self.intelligent_router:
-            try:
-                # Умный роутер анализирует задачу и выбирает лучшую модель по скорингу
-                intelligent_selection = await self.intelligent_router.select_model(
-                    task=task,
-                    task_type=task_type or "chat",
-                    complexity=complexity or "simple",
-                    preferred_model=preferred_model
-                )
-                logger.info(
-                    f"Intelligent routing: {intelligent_selection.profile.name} @ {intelligent_selection.server_name} "
-                    f"(score: {intelligent_selection.total_score:.2f}, "
-                    f"caps: {intelligent_selection.capability_score:.2f}, "
-                    f"perf: {intelligent_selection.performance_score:.2f})"
-                )
-            except Exception as e:
-                logger.warning(f"Intelligent routing failed: {e}")
+            # Умный роутер анализирует задачу и выбирает лучшую модель по скорингу
+            pending["intelligent"] = self.intelligent_router.select_model(
+                task=task,
+                task_type=task_type or "chat",
+                complexity=complexity or "simple",
+                preferred_model=preferred_model
+            )
+        if self.smart_selector:
+            pending["smart"] = self.smart_selector.select_model(
+                task=task,
+                task_type=task_type,
+                complexity=complexity,
+                quality_requirement=quality_requirement
+            )
+        results = dict(zip(pending, await asyncio.gather(*pending.values(), return_exceptions=True)))
+        for outcome in results.values():
+            # Отмену и прочие BaseException не глотаем
+            if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+                raise outcome
+        
+        intelligent_selection: Optional[ScoredModel] = results.get("intelligent")
+        if isinstance(intelligent_selection, Exception):
+            logger.warning(f"Intelligent routing failed: {intelligent_selection}")
+            intelligent_selection = None
+        elif intelligent_selection is not None:
+            logger.info(
+                "Intelligent routing: {} @ {} (score: {:.2f}, caps: {:.2f}, perf: {:.2f})",
+                intelligent_selection.profile.name,
+                intelligent_selection.server_name,
+                intelligent_selection.total_score,
+                intelligent_selection.capability_score,
+                intelligent_selection.performance_score
+            )
         
         # Выбираем модель
         if self.smart_selector:
             try:
-                selection = await self.smart_selector.select_model(
-                    task=task,
-                    task_type=task_type,
-                    complexity=complexity,
-                    quality_requirement=quality_requirement
-                )
+                selection = results["smart"]
+                if isinstance(selection, Exception):
+                    raise selection
                 
                 # Используем интеллектуальный роутинг если доступен
                 if intelligent_selection:
                     selection.model = intelligent_selection.profile.name
                     selection.reason = f"Intelligent: {intelligent_selection.reason} (score: {intelligent_selection.total_score:.2f})"
-                    logger.debug(f"Using intelligent router: {intelligent_selection.profile.name}")
+                    logger.debug("Using intelligent router: {}", intelligent_selection.profile.name)
                 else:
                     # Fallback — проверяем доступность модели
-                    if selection.model not in resources.available_models:
+                    if selection.model not in resources.available_models_set:
                         selection = self._find_alternative_model(
                             selection,
                             resources,
                             complexity
                         )
                 
+                # Метрики выбранной модели - один lookup на обе оценки
+                metrics = self.performance_tracker.get_metrics(selection.provider, selection.model)
+                
                 # Оцениваем качество относительно идеала
                 quality_estimate = self._estimate_quality(
                     selection,
                     resources.level,
-                    complexity
+                    complexity,
+                    metrics
                 )
                 
                 # Оцениваем скорость
-                speed_estimate = self._estimate_speed(selection, resources)
+                speed_estimate = self._estimate_speed(selection, resources, metrics)
                 
                 # Находим fallback модели
                 fallback_models = self._find_fallback_models(
@@ -440,13 +689,16 @@ class ResourceAwareSelector:
                     reason=f"Intelligent: quality: {quality_estimate:.2f}, speed: {speed_estimate:.2f}" if used_intelligent 
                            else f"Local: quality: {quality_estimate:.2f}, speed: {speed_estimate:.2f}",
                     fallback_models=fallback_models,
+                    # Информация о сервере
+                    server_url=intelligent_selection.server_url if intelligent_selection else None,
+                    server_name=intelligent_selection.server_name if intelligent_selection else None,
                     used_distributed_routing=used_intelligent
                 )
                 
-                # Добавляем информацию о сервере
-                if intelligent_selection:
-                    result.server_url = intelligent_selection.server_url
-                    result.server_name = intelligent_selection.server_name
+                if cache_key is not None:
+                    self._selection_cache[cache_key] = result
+                    if len(self._selection_cache) > self._selection_cache_size:
+                        self._selection_cache.popitem(last=False)
                 
                 return result
             except Exception as e:
@@ -477,25 +729,7 @@ class ResourceAwareSelector:
     
     def _estimate_complexity(self, task: str, task_type: Optional[str] = None) -> str:
         """Оценивает сложность задачи"""
-        task_len = len(task)
-        
-        if task_len < 50:
-            return "low"
-        
-        complex_keywords = [
-            "система", "system", "framework", "фреймворк",
-            "приложение", "application", "app",
-            "игра", "game", "cloud", "облако",
-            "IDE", "редактор", "editor"
-        ]
-        
-        if any(keyword in task.lower() for keyword in complex_keywords):
-            return "high"
-        
-        if task_len < 200:
-            return "medium"
-        else:
-            return "high"
+        return _classify_complexity(task, task_type)
     
     def _find_alternative_model(
         self,
@@ -504,18 +738,11 @@ class ResourceAwareSelector:
         complexity: str
     ) -> ModelSelection:
         """Находит альтернативную модель если выбранная недоступна"""
-        # Ищем модель того же tier
-        tier_models = {
-            ModelTier.FAST: ["gemma3:1b", "tinyllama", "phi"],
-            ModelTier.BALANCED: ["llama2", "mistral", "neural-chat"],
-            ModelTier.POWERFUL: ["llama2:70b", "codellama:70b", "mistral:70b"]
-        }
-        
-        candidates = tier_models.get(selection.tier, [])
-        
-        # Ищем первую доступную
-        for candidate in candidates:
-            if candidate in resources.available_models:
+        candidates = _PREFERRED_ALTERNATIVES.get(selection.tier, ())
+        
+        # Ищем первую доступную: сначала известные модели, затем любую того же tier
+        for candidate in chain(candidates, resources.by_tier.get(selection.tier, ())):
+            if candidate in resources.available_models_set:
                 selection.model = candidate
                 selection.reason = f"Alternative model selected: {candidate}"
                 return selection
@@ -531,17 +758,12 @@ class ResourceAwareSelector:
         self,
         selection: ModelSelection,
         resource_level: ResourceLevel,
-        complexity: str
+        complexity: str,
+        metrics: ModelMetrics
     ) -> float:
         """Оценивает качество относительно идеала (0.0 - 1.0)"""
         # Базовое качество на основе tier
-        tier_quality = {
-            ModelTier.FAST: 0.6,
-            ModelTier.BALANCED: 0.8,
-            ModelTier.POWERFUL: 0.95
-        }
-        
-        base_quality = tier_quality.get(selection.tier, 0.7)
+        base_quality = _TIER_QUALITY.get(selection.tier, 0.7)
         
         # Корректируем на основе ресурсов
         if resource_level == ResourceLevel.MINIMAL:
@@ -554,9 +776,6 @@ class ResourceAwareSelector:
             base_quality *= 0.9  # Сложные задачи на быстрых моделях
         
         # Используем метрики производительности если доступны
-        tracker = get_performance_tracker()
-        metrics = tracker.get_metrics(selection.provider, selection.model)
-        
         if metrics.total_requests > 0:
             success_rate = metrics.successful_requests / metrics.total_requests
             base_quality = (base_quality + success_rate) / 2  # Усредняем
@@ -566,22 +785,14 @@ class ResourceAwareSelector:
     def _estimate_speed(
         self,
         selection: ModelSelection,
-        resources: ResourceInfo
+        resources: ResourceInfo,
+        metrics: ModelMetrics
     ) -> float:
         """Оценивает скорость (токенов в секунду)"""
         # Базовые скорости по tier
-        tier_speed = {
-            ModelTier.FAST: 50.0,
-            ModelTier.BALANCED: 20.0,
-            ModelTier.POWERFUL: 10.0
-        }
-        
-        base_speed = tier_speed.get(selection.tier, 20.0)
+        base_speed = _TIER_SPEED.get(selection.tier, 20.0)
         
         # Используем реальные метрики если доступны
-        tracker = get_performance_tracker()
-        metrics = tracker.get_metrics(selection.provider, selection.model)
-        
         if metrics.avg_tokens_per_sec > 0:
             base_speed = metrics.avg_tokens_per_sec
         
@@ -594,26 +805,24 @@ class ResourceAwareSelector:
         complexity: str
     ) -> List[str]:
         """Находит резервные модели для fallback"""
-        fallback = []
-        
-        # Ищем модели того же или более низкого tier
-        for model in resources.available_models:
-            if model == primary_model:
-                continue
-            
-            # Простые модели для простых задач
-            if complexity == "low":
-                if any(x in model.lower() for x in ["1b", "2b", "3b", "tiny"]):
-                    fallback.append(model)
-            # Более мощные для сложных
-            elif complexity == "high":
-                if any(x in model.lower() for x in ["7b", "13b", "14b", "70b"]):
-                    fallback.append(model)
-            else:
-                fallback.append(model)
+        by_tier = resources.by_tier
+        
+        # Простые модели для простых задач
+        if complexity == "low":
+            candidates = by_tier.get(ModelTier.FAST, ())
+        # Более мощные для сложных (сильнейшие первыми): только модели 7B+,
+        # модели без размера в названии в BALANCED не считаются мощными
+        elif complexity == "high":
+            size_tiers = resources.size_tiers
+            candidates = (
+                m for m in chain(by_tier.get(ModelTier.POWERFUL, ()), by_tier.get(ModelTier.BALANCED, ()))
+                if size_tiers.get(m, SIZE_UNKNOWN) >= SIZE_SMALL
+            )
+        else:
+            candidates = resources.available_models
         
         # Ограничиваем количество
-        return fallback[:3]
+        return list(islice((m for m in candidates if m != primary_model), 3))
     
     def _fallback_selection(
         self,
@@ -628,12 +837,10 @@ class ResourceAwareSelector:
         model = resources.available_models[0]
         
         # Определяем tier
-        if any(x in model.lower() for x in ["1b", "2b", "3b", "tiny"]):
-            tier = ModelTier.FAST
-        elif any(x in model.lower() for x in ["70b", "72b", "65b"]):
-            tier = ModelTier.POWERFUL
-        else:
-            tier = ModelTier.BALANCED
+        size = resources.size_tiers.get(model)
+        if size is None:
+            size = _classify_size(model.lower())
+        tier = _model_tier_for_size(size)
         
         return AdaptiveSelection(
             model=model,
@@ -648,7 +855,7 @@ class ResourceAwareSelector:
     
     def should_optimize_prompt(self, resource_level: ResourceLevel) -> bool:
         """Определяет нужно ли оптимизировать промпт для малых моделей"""
-        return (self.adaptation_config["enable_prompt_optimization"] and
+        return (self.adaptation_config.enable_prompt_optimization and
                 resource_level in [ResourceLevel.MINIMAL, ResourceLevel.LOW])
     
     def should_decompose_task(
@@ -657,7 +864,7 @@ class ResourceAwareSelector:
         complexity: str
     ) -> bool:
         """Определяет нужно ли декомпозировать задачу"""
-        return (self.adaptation_config["enable_task_decomposition"] and
+        return (self.adaptation_config.enable_task_decomposition and
                 resource_level in [ResourceLevel.MINIMAL, ResourceLevel.LOW] and
                 complexity == "high")
 
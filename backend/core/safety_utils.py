@@ -2,6 +2,7 @@
 Safety utilities for preventing crashes
 """
 
+import asyncio
 import signal
 import sys
 from functools import wraps
@@ -38,12 +39,54 @@ def safe_execute(func: Callable) -> Callable:
     return wrapper
 
 
+async def _graceful_shutdown(signum: int) -> None:
+    """Cancel pending tasks, close async generators and stop the loop"""
+    logger.info(f"Received signal {signum}, shutting down gracefully...")
+    loop = asyncio.get_running_loop()
+    current = asyncio.current_task()
+    tasks = [t for t in asyncio.all_tasks(loop) if t is not current]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await loop.shutdown_asyncgens()
+    loop.stop()
+
+
+# Strong references so shutdown tasks are not garbage collected mid-run
+_shutdown_tasks = set()
+
+
+def _schedule_shutdown(signum: int) -> None:
+    task = asyncio.get_running_loop().create_task(_graceful_shutdown(signum))
+    _shutdown_tasks.add(task)
+    task.add_done_callback(_shutdown_tasks.discard)
+
+
 def setup_signal_handlers():
-    """Setup signal handlers for graceful shutdown"""
+    """
+    Setup signal handlers for graceful shutdown
+    
+    Inside a running event loop the handlers schedule a cooperative shutdown
+    (pending coroutines are cancelled and awaited); otherwise the process exits
+    from a plain signal handler.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    
+    if loop is not None:
+        try:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, _schedule_shutdown, signum)
+            return
+        except (NotImplementedError, RuntimeError):
+            # Windows / not the main thread
+            pass
+    
     def signal_handler(signum, frame):
         logger.info(f"Received signal {signum}, shutting down gracefully...")
         sys.exit(0)
     
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-
@@ -3,7 +3,7 @@ LLM Provider Manager - Manages multiple LLM providers
 """
 
 import asyncio
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple, Union
 from ..core.logger import get_logger
 logger = get_logger(__name__)
 
@@ -306,8 +306,9 @@ class LLMProviderManager:
         provider_name: Optional[str] = None,
         model: Optional[str] = None,
         temperature: float = 0.7,
+        return_exceptions: bool = False,
         **kwargs
-    ) -> List[LLMResponse]:
+    ) -> List[Union[LLMResponse, Exception]]:
         """
         Execute multiple LLM requests in parallel with concurrency limit.
         
@@ -319,6 +320,8 @@ class LLMProviderManager:
             provider_name: Provider to use
             model: Model name
             temperature: Temperature setting
+            return_exceptions: Return the exception for a failed request
+                instead of an "Error: ..." response
             **kwargs: Additional parameters for all requests
             
         Returns:
@@ -346,6 +349,8 @@ class LLMProviderManager:
                     return (idx, response)
                 except Exception as e:
                     logger.warning(f"Batch request {idx} failed: {e}")
+                    if return_exceptions:
+                        return (idx, e)
                     # Return error response
                     return (idx, LLMResponse(
                         content=f"Error: {str(e)}",
@@ -14,6 +14,7 @@ from .core.logger import get_logger, configure_logging, create_logging_middlewar
 from .api.routers import tasks, code, tools, preview, config as config_router, monitoring, project, multimodal, metrics, batch, feedback, learning, chat, models, secret, code_intelligence, code_testing
 from .api.docs import custom_openapi
 from .core.preview_manager import PreviewManager
+from .core.metrics import metrics_collector
 from .core.rate_limiter import RateLimitMiddleware, RateLimiter
 from starlette.middleware.base import BaseHTTPMiddleware
 
@@ -45,6 +46,8 @@ async def lifespan(app: FastAPI):
     engine = IDAEngine(config)
     await engine.initialize()
     
+    metrics_collector.start()
+    
     preview_manager = PreviewManager(port_pool=set(range(9000, 9051)))
     
     # Store engine in app state
@@ -57,6 +60,9 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down AILLM API server...")
     if engine:
         await engine.shutdown()
+    if preview_manager:
+        await preview_manager.close()
+    metrics_collector.stop()
     engine = None
     preview_manager = None
 
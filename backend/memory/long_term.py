@@ -34,6 +34,7 @@ import numpy as np
 
 from ..config import MemoryConfig
 from ..core.exceptions import MemoryException
+from ..core.embeddings import get_embedder
 
 
 class LongTermMemory:
@@ -108,22 +109,8 @@ class LongTermMemory:
             self.embeddings_model = self.vector_store.embeddings_model
             logger.info("Reusing embeddings model from VectorStore")
         elif SENTENCE_TRANSFORMERS_AVAILABLE:
-            try:
-                # Set environment variables to prevent multiprocessing issues
-                import os
-                os.environ.setdefault('TORCH_MULTIPROCESSING', '0')
-                os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
-                os.environ.setdefault('OMP_NUM_THREADS', '1')
-                
-                # Only load if vector_store doesn't have it
-                self.embeddings_model = SentenceTransformer(
-                    "sentence-transformers/all-MiniLM-L6-v2",
-                    device="cpu"
-                )
-                logger.info("Loaded embeddings model for LongTermMemory")
-            except Exception as e:
-                logger.warning(f"Failed to load embeddings model: {e}")
-                self.embeddings_model = None
+            # Общая на процесс модель (загружается один раз)
+            self.embeddings_model = get_embedder()
         else:
             logger.warning("sentence-transformers not available, semantic search disabled")
             self.embeddings_model = None
@@ -41,6 +41,7 @@ except ImportError:
 
 from ..config import RAGConfig
 from ..core.exceptions import AILLMException
+from ..core.embeddings import get_embedder
 
 
 class VectorStore:
@@ -88,29 +89,8 @@ class VectorStore:
             device = embeddings_config.get("device", "cpu")
             cache_dir = embeddings_config.get("cache_dir", "embeddings_cache")
             
-            try:
-                # Fix for multiprocessing issues (Python 3.12+)
-                # Set environment variables BEFORE importing/loading SentenceTransformer
-                # This prevents multiprocessing/threading issues
-                import os
-                os.environ.setdefault('TORCH_MULTIPROCESSING', '0')
-                os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
-                os.environ.setdefault('OMP_NUM_THREADS', '1')
-                
-                # DO NOT call set_start_method - it can only be called once and causes
-                # "threads can only be started once" errors if called multiple times
-                # Environment variables are sufficient to prevent multiprocessing issues
-                
-                # Загружаем модель с отключенным multiprocessing
-                self.embeddings_model = SentenceTransformer(
-                    model_name,
-                    device=device,
-                    cache_folder=cache_dir
-                )
-                logger.info(f"Loaded embeddings model: {model_name}")
-            except Exception as e:
-                logger.warning(f"Failed to load embeddings model: {e}")
-                self.embeddings_model = None
+            # Общая на процесс модель (её же используют память и синтез)
+            self.embeddings_model = get_embedder(model_name, device, cache_dir)
         
         # Initialize or load FAISS index
         vector_config = self.config.vector_store
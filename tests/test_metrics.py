@@ -4,7 +4,7 @@ Tests for metrics
 
 import pytest
 import time
-from backend.core.metrics import MetricsCollector
+from backend.core.metrics import MetricsCollector, NUMPY_AVAILABLE, NUMPY_MIN_HISTORY
 
 
 def test_metrics_collector_initialization():
@@ -82,6 +82,30 @@ def test_record_task_execution():
     assert stats["tasks"]["success_rate"] == 1.0
 
 
+def test_record_nanosecond_durations():
+    """Test integer nanosecond recording is reported in seconds"""
+    collector = MetricsCollector()
+    
+    collector.record_agent_execution_ns("agent1", 1_500_000_000, True)
+    collector.record_agent_execution("agent1", 0.5, True)
+    
+    stats = collector.get_agent_stats("agent1")
+    assert stats["avg_duration"] == 1.0
+    assert stats["min_duration"] == 0.5
+    assert stats["max_duration"] == 1.5
+
+
+def test_llm_stats_with_slash_in_model():
+    """Test provider/model keys survive model names containing '/'"""
+    collector = MetricsCollector()
+    
+    collector.record_llm_request("ollama", "library/llama3", 1.0, tokens=10)
+    
+    stats = collector.get_all_stats()
+    assert stats["llm"]["ollama/library/llama3"]["model"] == "library/llama3"
+    assert stats["counters"]["llm_ollama/library/llama3_tokens"] == 10
+
+
 def test_get_all_stats():
     """Test getting all statistics"""
     collector = MetricsCollector()
@@ -97,6 +121,134 @@ def test_get_all_stats():
     assert "counters" in stats
 
 
+def test_get_recent_metrics():
+    """Test recent metrics are returned as plain dicts"""
+    collector = MetricsCollector()
+    
+    collector.record_agent_execution("agent1", 1.0, True, tokens_used=50)
+    collector.record_task_execution("task1", "agent1", 1.0, False)
+    
+    recent = collector.get_recent_metrics(minutes=5)
+    assert recent["period_minutes"] == 5
+    assert recent["agents"]["agent1"][0]["duration"] == 1.0
+    assert recent["agents"]["agent1"][0]["tokens_used"] == 50
+    assert recent["tasks"][0]["task"] == "task1"
+    assert recent["tasks"][0]["success"] is False
+
+
+def test_get_recent_metrics_excludes_old_records():
+    """Test records older than the window are not returned"""
+    collector = MetricsCollector()
+    
+    collector.record_agent_execution("agent1", 1.0, True)
+    collector.record_agent_execution("agent1", 2.0, True)
+    collector._agent_metrics["agent1"].records[0].timestamp -= 3600
+    
+    recent = collector.get_recent_metrics(minutes=5)
+    assert [m["duration"] for m in recent["agents"]["agent1"]] == [2.0]
+
+
+def test_history_is_capped():
+    """Test old records are evicted beyond max_history"""
+    collector = MetricsCollector(max_history=3)
+    
+    for i in range(10):
+        collector.record_agent_execution("agent1", float(i), i % 2 == 0)
+    
+    stats = collector.get_agent_stats("agent1")
+    assert stats["total_executions"] == 3
+    assert stats["success_rate"] == pytest.approx(1 / 3)
+    assert stats["min_duration"] == 7.0
+    assert stats["max_duration"] == 9.0
+    
+    recent = collector.get_recent_metrics(minutes=5)
+    assert [m["duration"] for m in recent["agents"]["agent1"]] == [7.0, 8.0, 9.0]
+
+
+@pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy not installed")
+def test_numpy_stats_match_python_stats():
+    """Test vectorized stats for large histories match the Python path"""
+    small = MetricsCollector(max_history=NUMPY_MIN_HISTORY - 1)
+    large = MetricsCollector(max_history=NUMPY_MIN_HISTORY)
+    
+    for collector in (small, large):
+        for i in range(10):
+            collector.record_agent_execution("agent1", 0.5 + i, i % 3 != 0, tokens_used=i * 10 or None)
+            collector.record_tool_execution("tool1", 0.1 * i, True)
+            collector.record_llm_request("ollama", "llama3", 1.0 + i, tokens=i or None)
+    
+    assert large.get_agent_stats("agent1") == pytest.approx(small.get_agent_stats("agent1"))
+    assert large.get_tool_stats("tool1") == pytest.approx(small.get_tool_stats("tool1"))
+    assert large.get_llm_stats("ollama", "llama3") == pytest.approx(small.get_llm_stats("ollama", "llama3"))
+
+
+def test_sampling_keeps_counters_exact():
+    """Test sampled histories keep exact stats and flag sampling"""
+    collector = MetricsCollector(sample_threshold=10, sample_rate=0.0)
+    
+    for i in range(50):
+        collector.record_agent_execution("agent1", float(i), i % 5 != 0, tokens_used=10)
+        collector.record_tool_execution("tool1", 1.0, True)
+        collector.record_llm_request("ollama", "llama3", 2.0, tokens=i or None)
+    
+    stats = collector.get_agent_stats("agent1")
+    assert stats["total_executions"] == 50
+    assert stats["success_rate"] == pytest.approx(0.8)
+    assert stats["avg_duration"] == pytest.approx(24.5)
+    assert stats["min_duration"] == 0.0
+    assert stats["max_duration"] == 49.0
+    assert stats["total_tokens"] == 500
+    assert stats["sampled"] is True
+    assert len(collector._agent_metrics["agent1"]) == 10
+    assert collector.get_all_stats()["counters"]["agent_agent1_total"] == 50
+    
+    assert collector.get_tool_stats("tool1")["total_executions"] == 50
+    llm_stats = collector.get_llm_stats("ollama", "llama3")
+    assert llm_stats["total_requests"] == 50
+    assert llm_stats["total_tokens"] == sum(range(50))
+    assert llm_stats["avg_tokens"] == pytest.approx(sum(range(50)) / 49)
+    
+    recent = collector.get_recent_metrics(minutes=5)
+    assert len(recent["agents"]["agent1"]) == 10
+
+
+def test_background_aggregation():
+    """Test queued events are visible to readers while aggregator runs"""
+    collector = MetricsCollector()
+    collector.start(flush_interval=10)
+    try:
+        for _ in range(5):
+            collector.record_agent_execution("agent1", 1.0, True)
+        collector.record_task_execution("task1", "agent1", 1.0, True)
+        
+        assert collector.get_agent_stats("agent1")["total_executions"] == 5
+        assert collector.get_all_stats()["tasks"]["total"] == 1
+        
+        collector.record_tool_execution("tool1", 0.5, False)
+    finally:
+        collector.stop()
+    
+    assert collector.get_tool_stats("tool1")["total_executions"] == 1
+
+
+def test_pushed_stats_snapshot():
+    """Test aggregator serves a pre-rendered get_all_stats snapshot"""
+    collector = MetricsCollector()
+    collector.start(flush_interval=0.01, snapshot_interval=0)
+    try:
+        collector.record_task_execution("task1", "agent1", 1.0, True)
+        
+        deadline = time.time() + 5
+        while collector._snapshot is None and time.time() < deadline:
+            time.sleep(0.01)
+        
+        stats = collector.get_all_stats()
+        assert stats is collector.get_all_stats()
+        assert stats["tasks"]["total"] == 1
+    finally:
+        collector.stop()
+
+
 def test_reset_metrics():
     """Test resetting metrics"""
     collector = MetricsCollector()
@@ -0,0 +1,286 @@
+"""
+Tests for model performance tracker
+"""
+
+import pytest
+import aiosqlite
+from backend.core import model_performance_tracker
+from backend.core.model_performance_tracker import ModelPerformanceTracker, ModelMetrics
+
+
+def test_model_metrics_update():
+    """Test metrics update on success and failure"""
+    metrics = ModelMetrics(model_name="llama3", provider="ollama")
+    
+    metrics.update(duration=2.0, tokens=100, success=True)
+    metrics.update(duration=1.0, tokens=0, success=False, error_type="timeout")
+    
+    stats = metrics.get_stats()
+    assert stats["total_requests"] == 2
+    assert stats["success_rate"] == 0.5
+    assert stats["avg_duration"] == 2.0
+    assert stats["avg_tokens_per_sec"] == 50.0
+    assert stats["error_types"] == {"timeout": 1}
+
+
+@pytest.mark.asyncio
+async def test_record_request_async_persists(tmp_path):
+    """Test batched writer persists metrics and history"""
+    db_path = tmp_path / "metrics.db"
+    tracker = ModelPerformanceTracker(db_path=str(db_path))
+    
+    for _ in range(3):
+        await tracker.record_request_async("ollama", "llama3", 1.0, 50, True)
+    await tracker.record_request_async("ollama", "llama3", 1.0, 0, False, "timeout", flush=True)
+    
+    # flush=True - строки уже в БД до shutdown
+    assert not tracker._pending_history
+    async with tracker.db.execute("SELECT COUNT(*) FROM request_history") as cursor:
+        assert (await cursor.fetchone())[0] == 4
+    await tracker.shutdown()
+    
+    async with aiosqlite.connect(str(db_path)) as db:
+        async with db.execute("SELECT COUNT(*) FROM request_history") as cursor:
+            assert (await cursor.fetchone())[0] == 4
+    
+    reloaded = ModelPerformanceTracker(db_path=str(db_path))
+    await reloaded.initialize()
+    try:
+        stats = reloaded.get_metrics("ollama", "llama3").get_stats()
+        assert stats["total_requests"] == 4
+        assert stats["failed_requests"] == 1
+        assert stats["error_types"] == {"timeout": 1}
+        assert stats["last_used"] == tracker.get_metrics("ollama", "llama3").get_stats()["last_used"]
+    finally:
+        await reloaded.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_persists_all_metrics(tmp_path):
+    """Test shutdown writes every model, including score-only changes"""
+    db_path = tmp_path / "metrics.db"
+    tracker = ModelPerformanceTracker(db_path=str(db_path))
+    await tracker.record_request_async("ollama", "llama3", 1.0, 50, True, flush=True)
+    
+    # Корректировка из feedback без нового запроса
+    tracker.get_metrics("ollama", "llama3").performance_score = 42.0
+    await tracker.shutdown()
+    
+    reloaded = ModelPerformanceTracker(db_path=str(db_path))
+    await reloaded.initialize()
+    try:
+        assert reloaded.get_metrics("ollama", "llama3").performance_score == pytest.approx(42.0)
+    finally:
+        await reloaded.shutdown()
+
+
+@pytest.mark.parametrize("vector_min_models", [0, 64])
+def test_get_best_models(tmp_path, monkeypatch, vector_min_models):
+    """Test best models are ranked by score and filtered by request count (numpy and Python paths)"""
+    monkeypatch.setattr(model_performance_tracker, "VECTOR_MIN_MODELS", vector_min_models)
+    tracker = ModelPerformanceTracker(db_path=str(tmp_path / "metrics.db"))
+    
+    fast = tracker.get_metrics("ollama", "fast")
+    slow = tracker.get_metrics("ollama", "slow")
+    rare = tracker.get_metrics("ollama", "rare")
+    for _ in range(5):
+        fast.update(1.0, 100, True)
+        slow.update(10.0, 100, True)
+    rare.update(1.0, 100, True)
+    
+    best = tracker.get_best_models(min_requests=5, limit=2)
+    assert [m["model_name"] for m in best] == ["fast", "slow"]
+
+
+def test_best_models_arrays_track_updates(tmp_path, monkeypatch):
+    """Test SoA arrays persist between calls and follow updates and score writes"""
+    monkeypatch.setattr(model_performance_tracker, "VECTOR_MIN_MODELS", 0)
+    tracker = ModelPerformanceTracker(db_path=str(tmp_path / "metrics.db"))
+    
+    fast = tracker.get_metrics("ollama", "fast")
+    slow = tracker.get_metrics("ollama", "slow")
+    for _ in range(5):
+        fast.update(1.0, 100, True)
+        slow.update(10.0, 100, True)
+    tracker.get_best_models(min_requests=5)
+    arr = tracker._arr
+    
+    # Обновление и явная установка рейтинга не перестраивают массивы
+    slow.update(10.0, 100, True)
+    assert tracker._arr["stale"][slow._row]
+    fast.performance_score = 1.0
+    best = tracker.get_best_models(min_requests=5)
+    assert tracker._arr is arr
+    assert tracker._arr["total_requests"][slow._row] == 6
+    assert [m["model_name"] for m in best] == ["slow", "fast"]
+    
+    # Новая модель - перестройка
+    tracker.get_metrics("openai", "gpt")
+    tracker.get_best_models(min_requests=5)
+    assert tracker._arr is not arr
+    assert [m["model_name"] for m in tracker.get_best_models(provider="openai", min_requests=0)] == ["gpt"]
+
+
+@pytest.mark.asyncio
+async def test_request_history_is_trimmed(tmp_path):
+    """Test periodic cleanup keeps only the newest history rows"""
+    db_path = tmp_path / "metrics.db"
+    tracker = ModelPerformanceTracker(db_path=str(db_path))
+    await tracker.initialize()
+    tracker._history_limit = 5
+    tracker._history_cleanup_every = 10
+    
+    for _ in range(12):
+        tracker.record_request("ollama", "llama3", 1.0, 10, True)
+    await tracker.shutdown()
+    
+    async with aiosqlite.connect(str(db_path)) as db:
+        async with db.execute("SELECT COUNT(*), MIN(id) FROM request_history") as cursor:
+            count, min_id = await cursor.fetchone()
+    assert count == 5
+    assert min_id == 8
+
+
+def test_streaming_stats_match_window():
+    """Test running aggregates track the bounded history window"""
+    import statistics
+    from backend.core.model_performance_tracker import HISTORY_SIZE
+    
+    metrics = ModelMetrics(model_name="llama3", provider="ollama")
+    for i in range(HISTORY_SIZE + 50):
+        metrics.update(duration=1.0 + (i % 7), tokens=10 * (i % 5 + 1), success=True)
+    
+    durations = list(metrics.duration_history)
+    assert len(durations) == HISTORY_SIZE
+    assert metrics._dur_mean == pytest.approx(statistics.mean(durations))
+    assert metrics._dur_m2 / (HISTORY_SIZE - 1) == pytest.approx(statistics.variance(durations))
+    assert metrics.avg_tokens_per_sec == pytest.approx(statistics.mean(metrics.tokens_per_sec_history))
+    
+    restored = ModelMetrics(
+        model_name="llama3",
+        provider="ollama",
+        duration_history=durations,
+        tokens_per_sec_history=list(metrics.tokens_per_sec_history)
+    )
+    assert restored._dur_mean == pytest.approx(metrics._dur_mean)
+    assert restored._dur_m2 == pytest.approx(metrics._dur_m2)
+
+
+def test_recompute_scores_matches_scalar_score(tmp_path):
+    """Test vectorized score kernel agrees with per-model calculation"""
+    tracker = ModelPerformanceTracker(db_path=str(tmp_path / "metrics.db"))
+    
+    stable = tracker.get_metrics("ollama", "stable")
+    flaky = tracker.get_metrics("ollama", "flaky")
+    tracker.get_metrics("ollama", "unused")
+    for i in range(20):
+        stable.update(2.0, 100, True)
+        flaky.update(1.0 + i, 50, i % 3 != 0, "timeout")
+    
+    # Рейтинг ленивый: после update помечен устаревшим, а не пересчитан
+    assert stable._score_dirty and flaky._score_dirty
+    
+    expected = {key: m.performance_score for key, m in tracker.metrics.items()}
+    assert not stable._score_dirty
+    for m in tracker.metrics.values():
+        m.performance_score = -1.0
+    
+    tracker.recompute_scores()
+    
+    for key, m in tracker.metrics.items():
+        assert m.performance_score == pytest.approx(expected[key])
+
+
+@pytest.mark.asyncio
+async def test_learning_insights(tmp_path):
+    """Test insights report top performers, underperformers and errors"""
+    tracker = ModelPerformanceTracker(db_path=str(tmp_path / "metrics.db"))
+    
+    for _ in range(5):
+        tracker.get_metrics("ollama", "good").update(1.0, 100, True)
+        tracker.get_metrics("ollama", "bad").update(1.0, 0, False, "timeout")
+    
+    insights = await tracker.get_learning_insights()
+    assert insights["total_experience"] == 10
+    assert insights["top_performers"][0]["model"] == "good"
+    assert [m["model"] for m in insights["underperformers"]] == ["bad"]
+    assert insights["error_patterns"] == {"timeout": 5}
+    
+    summary = tracker.get_all_stats()["summary"]
+    assert summary["total_requests"] == 10
+    assert summary["total_successful"] == 5
+    assert summary["total_failed"] == 5
+    scores = [m.performance_score for m in tracker.metrics.values()]
+    assert summary["avg_performance_score"] == pytest.approx(sum(scores) / len(scores))
+
+
+@pytest.mark.asyncio
+async def test_legacy_json_history_is_migrated(tmp_path):
+    """Test JSON histories from the old schema are converted to float32 blobs"""
+    db_path = tmp_path / "metrics.db"
+    async with aiosqlite.connect(str(db_path)) as db:
+        await db.execute("""
+            CREATE TABLE model_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                total_requests INTEGER DEFAULT 0,
+                successful_requests INTEGER DEFAULT 0,
+                failed_requests INTEGER DEFAULT 0,
+                total_duration REAL DEFAULT 0.0,
+                avg_duration REAL DEFAULT 0.0,
+                min_duration REAL DEFAULT 0.0,
+                max_duration REAL DEFAULT 0.0,
+                total_tokens INTEGER DEFAULT 0,
+                avg_tokens_per_sec REAL DEFAULT 0.0,
+                performance_score REAL DEFAULT 0.0,
+                error_types TEXT DEFAULT '{}',
+                duration_history TEXT DEFAULT '[]',
+                tokens_per_sec_history TEXT DEFAULT '[]',
+                last_used TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(provider, model_name)
+            )
+        """)
+        await db.execute("""
+            INSERT INTO model_metrics (provider, model_name, total_requests, successful_requests,
+                                       duration_history, tokens_per_sec_history)
+            VALUES ('ollama', 'llama3', 2, 2, '[1.5, 2.5]', '[10.0, 20.0]')
+        """)
+        await db.commit()
+    
+    tracker = ModelPerformanceTracker(db_path=str(db_path))
+    await tracker.initialize()
+    try:
+        metrics = tracker.get_metrics("ollama", "llama3")
+        assert list(metrics.duration_history) == [1.5, 2.5]
+        assert list(metrics.tokens_per_sec_history) == [10.0, 20.0]
+        
+        async with tracker.db.execute("SELECT typeof(duration_history) FROM model_metrics") as cursor:
+            assert (await cursor.fetchone())[0] == "blob"
+    finally:
+        await tracker.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_jit_failure_keeps_persistence(tmp_path, monkeypatch):
+    """Test a failing JIT warm-up falls back to numpy without disabling the database"""
+    import backend.core.model_performance_tracker as mpt
+    
+    def broken_kernel(*args):
+        raise RuntimeError("numba compilation failed")
+    monkeypatch.setattr(mpt, "compute_scores", broken_kernel)
+    
+    tracker = ModelPerformanceTracker(db_path=str(tmp_path / "metrics.db"))
+    await tracker.initialize()
+    try:
+        assert mpt.compute_scores is mpt._compute_scores
+        assert tracker.db is not None
+        assert tracker._writer_task is not None
+        
+        tracker.get_metrics("ollama", "llama3").update(1.0, 100, True)
+        tracker.recompute_scores()
+        assert tracker.get_metrics("ollama", "llama3").performance_score > 0
+    finally:
+        await tracker.shutdown()
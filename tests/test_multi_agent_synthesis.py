@@ -0,0 +1,418 @@
+"""
+Tests for multi-agent synthesis
+"""
+
+import asyncio
+import json
+import zlib
+
+import numpy as np
+import pytest
+
+from backend.core.multi_agent_synthesis import (
+    AgentResult,
+    MultiAgentSynthesizer,
+    SemanticResponseCache,
+    SynthesisStrategy,
+)
+from backend.llm.base import LLMResponse
+from backend.llm.providers import LLMProviderManager
+
+
+class FakeLLMManager:
+    """LLM manager stub: records prompts, answers through a callback"""
+
+    def __init__(self, answer=None, delay: float = 0.0):
+        self.answer = answer or (lambda prompt: "ok")
+        self.delay = delay
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+
+    async def generate(self, messages, **kwargs):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            content = self.answer(prompt)
+            if isinstance(content, Exception):
+                raise content
+            return LLMResponse(content=content, model="fake")
+        finally:
+            self.active -= 1
+
+    # Настоящая пачечная отправка поверх generate
+    generate_batch = LLMProviderManager.generate_batch
+
+
+def make_result(name: str, content: str, confidence: float = 0.5, agent_type: str = "code") -> AgentResult:
+    return AgentResult(
+        agent_name=name,
+        agent_type=agent_type,
+        result={"answer": content},
+        success=True,
+        confidence=confidence
+    )
+
+
+@pytest.mark.asyncio
+async def test_debate_runs_agents_concurrently():
+    """Test debate round issues per-agent calls in parallel and keeps answers on failure"""
+    def answer(prompt):
+        if prompt.startswith("Ты играешь роль агента b"):
+            return RuntimeError("provider down")
+        return "improved"
+
+    llm = FakeLLMManager(answer, delay=0.01)
+    synthesizer = MultiAgentSynthesizer(llm, max_concurrency=2)
+    results = [make_result("a", "answer a"), make_result("b", "answer b"), make_result("c", "answer c")]
+
+    synthesis = await synthesizer.synthesize(results, "task", SynthesisStrategy.DEBATE)
+
+    assert synthesis.strategy_used == SynthesisStrategy.DEBATE
+    assert llm.max_active == 2
+    # Агент b упал в первом раунде - во втором раунде другие видят его исходный ответ
+    second_round = [p for p in llm.prompts if p.startswith("Ты играешь роль")][3:6]
+    assert len(second_round) == 3
+    assert all("**b**: answer b" in p for p in second_round if "агента b" not in p)
+    assert all("**a**: improved" in p for p in second_round if "агента a" not in p)
+
+
+@pytest.mark.asyncio
+async def test_hierarchical_merges_groups_concurrently():
+    """Test hierarchical synthesis merges independent groups in parallel"""
+    llm = FakeLLMManager(lambda prompt: "80" if prompt.startswith("Оцени") else "merged", delay=0.01)
+    synthesizer = MultiAgentSynthesizer(llm)
+    results = [
+        make_result("a1", "code one", agent_type="code"),
+        make_result("a2", "code two", agent_type="code"),
+        make_result("r1", "review one", agent_type="review"),
+        make_result("r2", "review two", agent_type="review"),
+    ]
+
+    synthesis = await synthesizer.synthesize(results, "task", SynthesisStrategy.HIERARCHICAL)
+
+    assert llm.max_active == 2
+    group_prompts = [p for p in llm.prompts if p.startswith("Объедини")]
+    assert "code one" in group_prompts[0] and "review one" in group_prompts[1]
+    # Финальный синтез получает результаты групп
+    assert "=== synthesized_code (code)" in group_prompts[2]
+    assert synthesis.synthesized_content == "merged"
+
+
+def test_agent_result_content_is_cached():
+    """Test content extraction is memoized and trimmed views are reused"""
+    result = make_result("a", "x" * 100)
+    assert result.get_content() is result.get_content()
+    assert result.get_trimmed(10) == "x" * 10
+    assert result.get_trimmed(10) is result.get_trimmed(10)
+
+    # Промежуточные результаты синтеза хранят текст под ключом content
+    synthesized = AgentResult("s", "code", {"content": "merged"}, success=True)
+    assert synthesized.get_content() == "merged"
+
+
+def bag_of_words(texts):
+    """Детерминированный эмбеддинг для тестов: хэш слов в 256 корзин"""
+    vectors = np.zeros((len(texts), 256), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.split():
+            vectors[row, zlib.crc32(word.encode()) % 256] += 1.0
+    return vectors
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_reuses_near_duplicate_prompts():
+    """Test paraphrased repeats are served from the semantic cache"""
+    llm = FakeLLMManager(lambda prompt: "80" if prompt.startswith("Оцени") else "merged")
+    cache = SemanticResponseCache(bag_of_words, threshold=0.9)
+    synthesizer = MultiAgentSynthesizer(llm, semantic_cache=cache)
+    results = [make_result("a", "use a dict for lookups " * 20), make_result("b", "cache the parsed config " * 20)]
+
+    first = await synthesizer.synthesize(results, "speed up the config loader", SynthesisStrategy.MERGE)
+    await first.quality()
+    calls = len(llm.prompts)
+    second = await synthesizer.synthesize(results, "speed up config loader", SynthesisStrategy.MERGE)
+    await second.quality()
+
+    assert calls == 2  # merge + quality
+    # Синтез взят из семантического кэша, оценка качества - только точный кэш
+    assert len(llm.prompts) == calls + 1
+    assert llm.prompts[-1].startswith("Оцени")
+    assert second.synthesized_content == first.synthesized_content
+    assert cache.get_stats()["hits"] == 1
+
+    # Другие ответы агентов - промах для синтеза
+    other = [make_result("a", "rewrite it in rust " * 20), make_result("b", "add more servers " * 20)]
+    await synthesizer.synthesize(other, "speed up the config loader", SynthesisStrategy.MERGE)
+    assert llm.prompts[-1].startswith("Объедини")
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_separates_different_tasks():
+    """Test different tasks under the same merge template never share a synthesis"""
+    llm = FakeLLMManager(lambda prompt: "Paris" if "France" in prompt else "4")
+    cache = SemanticResponseCache(bag_of_words)
+    synthesizer = MultiAgentSynthesizer(llm, semantic_cache=cache)
+
+    france = await synthesizer.synthesize(
+        [make_result("a", "Paris"), make_result("b", "It is Paris")],
+        "What is the capital of France?",
+        SynthesisStrategy.MERGE
+    )
+    arithmetic = await synthesizer.synthesize(
+        [make_result("a", "4"), make_result("b", "four")],
+        "What is 2+2?",
+        SynthesisStrategy.MERGE
+    )
+
+    assert france.synthesized_content == "Paris"
+    assert arithmetic.synthesized_content == "4"
+    assert cache.get_stats()["hits"] == 0
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_embedding_failure_bypasses_one_call():
+    """Test an embedding error skips the cache for that call only"""
+    failures = []
+
+    def flaky_embed(texts):
+        if not failures:
+            failures.append(texts)
+            raise RuntimeError("model not loaded")
+        return bag_of_words(texts)
+
+    llm = FakeLLMManager(lambda prompt: "merged")
+    cache = SemanticResponseCache(flaky_embed)
+    synthesizer = MultiAgentSynthesizer(llm, semantic_cache=cache)
+    results = [make_result("a", "use a dict for lookups"), make_result("b", "cache the parsed config")]
+
+    for _ in range(3):
+        await synthesizer.synthesize(results, "speed up the config loader", SynthesisStrategy.MERGE)
+
+    assert synthesizer.semantic_cache is cache
+    assert len(failures) == 1
+    # Первый вызов мимо кэша, второй сохраняет, третий - попадание
+    assert len(llm.prompts) == 2
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_semantic_cache_ttl_and_lru():
+    """Test semantic cache evicts expired and least recently used entries"""
+    cache = SemanticResponseCache(bag_of_words, max_entries=2, ttl=3600)
+    keys = [cache.embed(text) for text in ("alpha beta", "gamma delta", "epsilon zeta")]
+    for key, value in zip(keys, ("one", "two", "three")):
+        cache.put("merge", key, value)
+
+    assert cache.get("merge", keys[0]) is None
+    assert cache.get("merge", keys[2]) == "three"
+    assert cache.get("other", keys[2]) is None
+
+    cache.ttl = -1
+    assert cache.get("merge", keys[2]) is None
+
+
+@pytest.mark.asyncio
+async def test_exact_cache_skips_repeated_evaluation():
+    """Test deterministic select/evaluate calls are answered from the exact cache"""
+    llm = FakeLLMManager(lambda prompt: '{"best_option": 2, "reason": "r", "score": 0.9}')
+    synthesizer = MultiAgentSynthesizer(llm)
+    results = [make_result("a", "first"), make_result("b", "second")]
+
+    first = await synthesizer.synthesize(results, "task", SynthesisStrategy.SELECT_BEST)
+    second = await synthesizer.synthesize(results, "task", SynthesisStrategy.SELECT_BEST)
+
+    assert len(llm.prompts) == 1
+    assert first.contributing_agents == second.contributing_agents == ["b"]
+    assert synthesizer.exact_cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_select_best_does_not_reuse_answer_for_reordered_options():
+    """Test prompts that differ only by option order never share a cached selection"""
+    def answer(prompt):
+        options = prompt.split("=== Option ")[1:]
+        best = next(i for i, option in enumerate(options, 1) if "cache the parsed config" in option)
+        return json.dumps({"best_option": best, "reason": "r", "score": 0.9})
+
+    llm = FakeLLMManager(answer)
+    # Мешок слов не видит порядок вариантов - такие промпты семантически идентичны
+    cache = SemanticResponseCache(bag_of_words, threshold=0.9)
+    synthesizer = MultiAgentSynthesizer(llm, semantic_cache=cache)
+    a = make_result("a", "use a dict for lookups")
+    b = make_result("b", "cache the parsed config")
+
+    first = await synthesizer.synthesize([a, b], "task", SynthesisStrategy.SELECT_BEST)
+    second = await synthesizer.synthesize([b, a], "task", SynthesisStrategy.SELECT_BEST)
+
+    assert first.contributing_agents == second.contributing_agents == ["b"]
+    assert len(llm.prompts) == 2
+    assert cache.get_stats()["hits"] == 0
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_coalesces_concurrent_requests():
+    """Test requests arriving within the window go out as one batch"""
+    from backend.core.multi_agent_synthesis import MicroBatcher
+    from backend.llm.base import LLMMessage
+
+    llm = FakeLLMManager(lambda prompt: prompt.upper())
+    batches = []
+    original = llm.generate_batch
+
+    async def recording_batch(requests, **kwargs):
+        batches.append(len(requests))
+        return await original(requests, **kwargs)
+
+    llm.generate_batch = recording_batch
+    batcher = MicroBatcher(llm, max_batch=8, max_wait_ms=5)
+
+    answers = await asyncio.gather(*(
+        batcher.generate([LLMMessage(role="user", content=f"q{i}")], temperature=0.4, max_tokens=10)
+        for i in range(3)
+    ))
+
+    assert answers == ["Q0", "Q1", "Q2"]
+    assert batches == [3]
+
+
+def test_find_json_handles_nesting_and_strings():
+    """Test JSON extraction returns the first balanced object"""
+    from backend.core.multi_agent_synthesis import _find_json
+
+    text = 'Ответ: {"best_option": 2, "meta": {"why": "has } brace", "q": "\\"x\\""}} trailing {"b": 1}'
+    assert json.loads(_find_json(text)) == {"best_option": 2, "meta": {"why": "has } brace", "q": '"x"'}}
+    assert _find_json("no json here") is None
+    assert _find_json('{"unterminated": 1') is None
+
+
+@pytest.mark.asyncio
+async def test_select_best_skips_llm_for_dominant_confidence():
+    """Test an obvious winner is selected without an LLM call"""
+    llm = FakeLLMManager()
+    synthesizer = MultiAgentSynthesizer(llm)
+    results = [make_result("a", "weak", confidence=0.5), make_result("b", "strong", confidence=0.95)]
+
+    synthesis = await synthesizer.synthesize(results, "task", SynthesisStrategy.SELECT_BEST)
+
+    assert llm.prompts == []
+    assert synthesis.synthesized_content == "strong"
+    assert synthesis.metadata["selection_reason"] == "dominant_confidence"
+
+
+@pytest.mark.asyncio
+async def test_merge_deduplicates_near_identical_answers():
+    """Test near-duplicate agent answers are sent to the LLM once"""
+    llm = FakeLLMManager(lambda prompt: "80" if prompt.startswith("Оцени") else "merged")
+    synthesizer = MultiAgentSynthesizer(llm)
+    shared = "use a dict keyed by user id for constant time lookups " * 5
+    results = [
+        make_result("a", shared, confidence=0.6),
+        make_result("b", shared + "done", confidence=0.8),
+        make_result("c", "profile first, then optimize the hot loop", confidence=0.5),
+    ]
+
+    synthesis = await synthesizer.synthesize(results, "task", SynthesisStrategy.MERGE)
+
+    merge_prompt = llm.prompts[0]
+    assert merge_prompt.count("use a dict keyed") == 5
+    assert "=== b (code) [confidence: 0.80] [то же ответили: a]" in merge_prompt
+    assert synthesis.conflicts_resolved == ["a ≈ b"]
+    assert synthesis.contributing_agents == ["a", "b", "c"]
+    assert synthesis.metadata["unique_answers"] == 2
+
+
+@pytest.mark.asyncio
+async def test_debate_stops_when_answers_converge():
+    """Test debate exits early once all agents give the same answer"""
+    llm = FakeLLMManager(lambda prompt: "80" if prompt.startswith("Оцени") else "agreed final answer")
+    synthesizer = MultiAgentSynthesizer(llm)
+    results = [make_result("a", "first idea"), make_result("b", "second idea")]
+
+    synthesis = await synthesizer._multi_agent_debate(results, "task", max_rounds=3)
+
+    debate_prompts = [p for p in llm.prompts if p.startswith("Ты играешь роль")]
+    assert len(debate_prompts) == 2
+    assert synthesis.metadata["debate_rounds_actual"] == 1
+    assert synthesis.metadata["debate_rounds"] == 3
+
+
+@pytest.mark.asyncio
+async def test_single_round_debate_skips_similarity():
+    """Test a one-round debate never computes answer similarity"""
+    llm = FakeLLMManager(lambda prompt: "80" if prompt.startswith("Оцени") else "improved answer")
+    synthesizer = MultiAgentSynthesizer(llm)
+    calls = []
+
+    async def similarity(answers):
+        calls.append(answers)
+        return 0.0
+
+    synthesizer._answers_similarity = similarity
+    results = [make_result("a", "first idea"), make_result("b", "second idea")]
+
+    synthesis = await synthesizer._multi_agent_debate(results, "task", max_rounds=1)
+
+    assert calls == []
+    assert synthesis.metadata["debate_rounds_actual"] == 1
+
+
+def test_similarity_matrices_match_pairwise_definitions():
+    """Test vectorized Jaccard and batched embeddings agree with per-pair math"""
+    from backend.core.multi_agent_synthesis import _jaccard_matrix, _shingles
+
+    texts = ["a b c d e f", "a b c d e g", "x y z", ""]
+    matrix = _jaccard_matrix(texts)
+    for i, a in enumerate(texts):
+        for j, b in enumerate(texts):
+            sa, sb = _shingles(a), _shingles(b)
+            assert matrix[i, j] == pytest.approx(len(sa & sb) / len(sa | sb))
+
+    cache = SemanticResponseCache(bag_of_words)
+    cache.CHUNK_SIZE = 8
+    texts = ["alpha beta gamma delta", "short", "epsilon " * 5]
+    batched = cache.embed_many(texts)
+    assert np.allclose(batched, np.stack([cache.embed(text) for text in texts]))
+    assert np.allclose(np.linalg.norm(batched, axis=1), 1.0)
+
+
+def test_output_budget_scales_with_input():
+    """Test max_tokens grows with agent content length and respects the cap"""
+    from backend.core.multi_agent_synthesis import OUTPUT_BUDGET_BASE, _output_budget, _token_len
+
+    assert _output_budget(["short"], 4000) == OUTPUT_BUDGET_BASE + 2 * _token_len("short")
+    assert _output_budget(["word " * 5000] * 3, 4000) == 4000
+    assert _output_budget(["a"], 100) == 100
+
+
+@pytest.mark.asyncio
+async def test_merge_returns_before_llm_quality_evaluation():
+    """Test merge returns with a heuristic quality and evaluates with the LLM only on demand"""
+    evaluated = asyncio.Event()
+
+    def answer(prompt):
+        if prompt.startswith("Оцени"):
+            evaluated.set()
+            return "90"
+        return "use a dict and cache the parsed config"
+
+    llm = FakeLLMManager(answer)
+    synthesizer = MultiAgentSynthesizer(llm)
+    results = [make_result("a", "use a dict", confidence=0.8), make_result("b", "cache the parsed config", confidence=0.6)]
+
+    synthesis = await synthesizer.synthesize(results, "task", SynthesisStrategy.MERGE)
+    await asyncio.sleep(0)
+
+    assert not evaluated.is_set()
+    assert len(llm.prompts) == 1
+    assert synthesis.quality_score == pytest.approx(1.0)  # все слова агентов вошли в синтез
+    assert synthesis.metadata["quality_source"] == "heuristic"
+    assert "_quality_eval" not in synthesis.to_dict()
+
+    assert await synthesis.quality() == pytest.approx(0.9)
+    assert len(llm.prompts) == 2
+    assert synthesis.confidence == pytest.approx(0.7 * 0.9)
+    assert synthesis.metadata["quality_source"] == "llm"
+    assert await synthesis.quality() == pytest.approx(0.9)
@@ -0,0 +1,178 @@
+"""
+Tests for preview manager
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+from backend.core.preview_manager import PreviewManager
+
+
+PORT_POOL = set(range(39100, 39110))
+
+
+async def wait_exit(state, timeout: float = 5.0):
+    await asyncio.wait_for(state.process.wait(), timeout)
+    await asyncio.gather(state._stdout_task, state._stderr_task)
+
+
+@pytest.mark.asyncio
+async def test_preview_logs_are_bounded():
+    """Test captured output keeps only the last log_limit bytes"""
+    manager = PreviewManager(port_pool=PORT_POOL, log_limit=1000)
+    command = f'{sys.executable} -c "import sys; sys.stdout.write(\'a\' * 5000 + \'END\'); sys.stderr.write(\'oops\')"'
+
+    state = await manager.start_preview(command)
+    await wait_exit(state)
+
+    status = await manager.get_status(state.id)
+    assert len(status["stdout"]) == 1000
+    assert status["stdout"].endswith("END")
+    assert status["stderr"] == "oops"
+    assert await manager.stop_preview(state.id)
+
+
+@pytest.mark.asyncio
+async def test_find_free_port_skips_busy_and_used_ports():
+    """Test port scan skips listening ports and ports held by previews"""
+    pool = sorted(PORT_POOL)
+    manager = PreviewManager(port_pool=PORT_POOL)
+    server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", pool[0])
+    try:
+        assert not await manager._is_port_free(pool[0])
+        state = await manager.start_preview(f"{sys.executable} -c pass")
+        assert state.port == pool[1]
+        assert await manager._find_free_port() == pool[2]
+        await manager.stop_preview(state.id)
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_previews_expire_via_single_reaper():
+    """Test TTL expiry is handled by one reaper task for all previews"""
+    manager = PreviewManager(port_pool=PORT_POOL)
+    command = f'exec {sys.executable} -c "import time; time.sleep(30)"'
+    short = await manager.start_preview(command, ttl=1)
+    long = await manager.start_preview(command, ttl=60)
+    reaper = manager._reaper
+
+    await asyncio.sleep(1.3)
+
+    assert manager._reaper is reaper
+    assert await manager.get_status(short.id) is None
+    assert (await manager.get_status(long.id))["running"]
+
+    await manager.close()
+    assert await manager.get_status(long.id) is None
+    assert reaper.done()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_starts_get_distinct_ports():
+    """Test parallel starts reserve different ports and stops run concurrently"""
+    manager = PreviewManager(port_pool=PORT_POOL)
+    command = f'exec {sys.executable} -c "import time; time.sleep(30)"'
+
+    states = await asyncio.gather(*(manager.start_preview(command) for _ in range(3)))
+
+    assert len({state.port for state in states}) == 3
+    assert not manager._reserved
+    assert all(await asyncio.gather(*(manager.stop_preview(state.id) for state in states)))
+    assert not manager._by_id and not manager._reserved
+    await manager.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="F_SETPIPE_SZ is Linux-only")
+async def test_preview_pipes_are_enlarged():
+    """Test stdout/stderr pipes are resized to PREVIEW_PIPE_SIZE"""
+    import fcntl
+    from backend.core.preview_manager import PREVIEW_PIPE_SIZE
+
+    manager = PreviewManager(port_pool=PORT_POOL)
+    state = await manager.start_preview(f'exec {sys.executable} -c "import time; time.sleep(30)"')
+    try:
+        pipe = state.process._transport.get_pipe_transport(1).get_extra_info("pipe")
+        assert fcntl.fcntl(pipe.fileno(), getattr(fcntl, "F_GETPIPE_SZ", 1032)) == PREVIEW_PIPE_SIZE
+    finally:
+        await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_reaper_survives_stop_failure():
+    """Test a failing TTL stop is logged and later expiries are still reaped"""
+    manager = PreviewManager(port_pool=PORT_POOL)
+    command = f'exec {sys.executable} -c "import time; time.sleep(30)"'
+    original_stop = manager.stop_preview
+    failures = []
+
+    async def flaky_stop(preview_id):
+        if not failures:
+            failures.append(preview_id)
+            raise ProcessLookupError("process already gone")
+        return await original_stop(preview_id)
+
+    manager.stop_preview = flaky_stop
+    try:
+        first = await manager.start_preview(command, ttl=1)
+        second = await manager.start_preview(command, ttl=2)
+
+        await asyncio.sleep(2.3)
+
+        assert failures == [first.id]
+        assert not manager._reaper.done()
+        assert await manager.get_status(second.id) is None
+    finally:
+        await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_close_cancels_busy_reaper():
+    """Test close() stops the reaper even right after it was woken"""
+    manager = PreviewManager(port_pool=PORT_POOL)
+    command = f'exec {sys.executable} -c "import time; time.sleep(30)"'
+    for _ in range(3):
+        await manager.start_preview(command)
+        await asyncio.sleep(0)
+
+    await asyncio.wait_for(manager.close(), timeout=10)
+    assert not manager._by_id
+
+
+@pytest.mark.asyncio
+async def test_port_hint_respects_reservations():
+    """Test a hinted port goes through the same busy/reserved checks as the scan"""
+    pool = sorted(PORT_POOL)
+    manager = PreviewManager(port_pool=PORT_POOL)
+    command = f'exec {sys.executable} -c "import time; time.sleep(30)"'
+    try:
+        hinted = await manager.start_preview(command, port_hint=pool[3])
+        assert hinted.port == pool[3]
+
+        # Порт в процессе выделения другим запуском
+        manager._reserved.add(pool[4])
+        other = await manager.start_preview(command, port_hint=pool[4])
+        assert other.port not in (pool[3], pool[4])
+        manager._reserved.discard(pool[4])
+
+        with pytest.raises(ValueError):
+            await manager.start_preview(command, port_hint=1)
+    finally:
+        await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_probe_timeout_counts_as_busy(monkeypatch):
+    """Test a port that does not answer the probe is not reported as free"""
+    import backend.core.preview_manager as preview_manager
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(preview_manager.asyncio, "open_connection", hang)
+    manager = PreviewManager(port_pool=PORT_POOL)
+    assert not await manager._is_port_free(min(PORT_POOL))
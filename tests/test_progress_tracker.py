@@ -0,0 +1,194 @@
+"""
+Tests for progress tracker
+"""
+
+import asyncio
+
+import pytest
+
+from backend.core.progress_tracker import FLUSH_INTERVAL, ProgressTracker
+
+
+def drain(queue: asyncio.Queue) -> list:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+@pytest.mark.asyncio
+async def test_slow_listener_keeps_latest_events():
+    """Test a full listener queue drops the oldest events instead of growing"""
+    tracker = ProgressTracker("op")
+    queue = tracker.subscribe(maxsize=3)
+
+    for i in range(10):
+        await tracker.update(f"stage {i}", f"file {i}", i / 10)
+    await tracker.complete()
+
+    items = drain(queue)
+    assert len(items) == 3
+    assert [e.message for e in items[:2]] == ["file 9", "Завершено"]
+    assert items[-1] is None
+    assert len(tracker.events) == 11
+
+
+@pytest.mark.asyncio
+async def test_stream_events_yields_shared_sse_frames():
+    """Test every subscriber receives the same pre-serialized SSE bytes"""
+    tracker = ProgressTracker("op")
+    await tracker.update("starting", "Начинаем", 0.0, {"files": 2})
+
+    streams = [tracker.stream_events(), tracker.stream_events()]
+    first = [await stream.__anext__() for stream in streams]
+    await tracker.complete()
+    second = [await stream.__anext__() for stream in streams]
+
+    assert first[0] == first[1]
+    assert first[0].startswith(b"data: ") and first[0].endswith(b"\n\n")
+    assert "Начинаем".encode() in first[0]
+    assert second[0] == second[1] == tracker.events[-1].sse_bytes
+    assert tracker.events[0].to_sse() == first[0].decode()
+    for stream in streams:
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_rapid_same_stage_updates_are_coalesced():
+    """Test bursts of same-stage updates publish only the latest one per flush"""
+    tracker = ProgressTracker("op")
+    queue = tracker.subscribe()
+
+    for i in range(100):
+        await tracker.update("scanning", f"file {i}", i / 100)
+    await tracker.update("analyzing", "AI", 0.6)
+    assert queue.empty()
+
+    await asyncio.sleep(FLUSH_INTERVAL * 2)
+    assert [e.message for e in drain(queue)] == ["file 99", "AI"]
+
+    await tracker.update("analyzing", "AI done", 0.9)
+    await tracker.complete()
+    assert [e.message for e in tracker.events] == ["file 99", "AI", "AI done", "Завершено"]
+
+    # Готовые события очереди отдаются одним SSE-куском
+    late = ProgressTracker("op2")
+    stream = late.stream_events()
+    pending = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    await late.update("a", "one", 0.1)
+    await late.update("b", "two", 0.2)
+    await late.complete()
+    chunk = await pending
+    assert chunk.count(b"data: ") == 3
+
+
+@pytest.mark.asyncio
+async def test_sse_response_streams_gzip_per_event():
+    """Test gzip SSE responses flush every event and decode to the plain stream"""
+    import zlib
+
+    from backend.core.progress_tracker import make_sse_response
+
+    tracker = ProgressTracker("op")
+    await tracker.update("starting", "Начинаем", 0.0)
+    await tracker.complete()
+
+    response = make_sse_response(tracker, accept_encoding="gzip, deflate")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["x-accel-buffering"] == "no"
+
+    decompressor = zlib.decompressobj(wbits=31)
+    chunks = [chunk async for chunk in response.body_iterator]
+    # Каждое событие распаковывается сразу, без ожидания конца потока
+    first = decompressor.decompress(chunks[0])
+    assert first == tracker.events[0].sse_bytes + tracker.events[1].sse_bytes
+    assert decompressor.decompress(b"".join(chunks[1:])) == b""
+    assert decompressor.eof
+
+    plain = make_sse_response(tracker)
+    assert "content-encoding" not in plain.headers
+
+
+def test_unsubscribe_removes_only_that_listener():
+    """Test listeners are tracked per queue and unsubscribe is idempotent"""
+    tracker = ProgressTracker("op")
+    first, second = tracker.subscribe(), tracker.subscribe()
+
+    tracker.unsubscribe(first)
+    tracker.unsubscribe(first)
+
+    assert list(tracker.listeners.values()) == [second]
+
+
+@pytest.mark.asyncio
+async def test_history_is_bounded_and_replay_is_limited():
+    """Test history keeps the newest events and subscribers replay only the tail"""
+    from backend.core.progress_tracker import HISTORY_SIZE
+
+    tracker = ProgressTracker("op")
+    for i in range(HISTORY_SIZE + 10):
+        await tracker.update(f"stage {i}", f"event {i}", 0.5)
+    await tracker.complete()
+
+    assert len(tracker.events) == HISTORY_SIZE
+    assert tracker.events[0].message == "event 11"
+
+    replayed = [e.message async for e in tracker.stream_events_obj(replay_last=2)]
+    assert replayed == [f"event {HISTORY_SIZE + 9}", "Завершено"]
+    assert [e async for e in tracker.stream_events_obj(replay_last=0)] == []
+
+
+@pytest.mark.asyncio
+async def test_events_are_compact_and_accept_stage_enum():
+    """Test events are slotted/frozen and enum stages are stored as plain strings"""
+    import dataclasses
+    from datetime import datetime
+
+    from backend.core.progress_tracker import ProgressStage
+
+    tracker = ProgressTracker("op")
+    await tracker.update(ProgressStage.SCANNING, "scan", 0.2)
+    await tracker.update("scanning", "scan more", 0.3)
+    await tracker.complete()
+
+    event = tracker.events[0]
+    assert [e.stage for e in tracker.events] == ["scanning", "completed"]
+    assert not hasattr(event, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        event.message = "changed"
+    assert datetime.fromisoformat(event.to_dict()["timestamp"]).timestamp() == pytest.approx(event.timestamp)
+
+
+@pytest.mark.asyncio
+async def test_manager_cleanup_removes_only_old_completed_trackers(monkeypatch):
+    """Test cleanup pops expired trackers from the heap and keeps running ones"""
+    import backend.core.progress_tracker as progress_module
+    from backend.core.progress_tracker import ProgressManager
+
+    from types import SimpleNamespace
+
+    now = [1000.0]
+    monkeypatch.setattr(progress_module, "time", SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0]))
+    manager = object.__new__(ProgressManager)
+    manager._initialized = False
+    manager.__init__()
+
+    old_done = await manager.create_tracker("a")
+    old_running = await manager.create_tracker("b")
+    removed_early = await manager.create_tracker("c")
+    now[0] += 50
+    fresh_done = await manager.create_tracker("d")
+    for tracker in (old_done, fresh_done, removed_early):
+        await tracker.complete()
+    await manager.remove_tracker(removed_early.operation_id)
+
+    now[0] += 20
+    assert await manager.cleanup_old_trackers(max_age_seconds=60) == 1
+    assert set(manager._trackers) == {old_running.operation_id, fresh_done.operation_id}
+
+    await old_running.complete()
+    now[0] += 100
+    assert await manager.cleanup_old_trackers(max_age_seconds=60) == 2
+    assert manager._trackers == {} and manager._created == []
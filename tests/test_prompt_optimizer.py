@@ -0,0 +1,69 @@
+"""
+Tests for prompt optimizer
+"""
+
+import pytest
+
+from backend.core.prompt_optimizer import PromptOptimizer
+from backend.llm.base import LLMMessage
+
+
+def test_simplify_instructions_single_pass():
+    """Test instruction simplification replaces phrases, longest first, keeping case"""
+    optimizer = PromptOptimizer()
+
+    result = optimizer._simplify_instructions(
+        "Необходимо реализовать парсер. необходимо убедиться, что следует стандарту"
+    )
+
+    assert result == "Нужно создать парсер. проверить, что нужно стандарту"
+
+
+def test_user_prompt_trimmed_by_sentences():
+    """Test long user prompts are cut on sentence boundaries or hard-cut as fallback"""
+    optimizer = PromptOptimizer()
+
+    assert optimizer._optimize_user_prompt("One two. Three four. Five six", 20) == "One two. Three four"
+    assert optimizer._optimize_user_prompt("A very long first sentence. Short", 10) == "A very lon"
+
+
+def test_remove_greetings_case_insensitive():
+    """Test lines containing greetings are dropped regardless of case"""
+    optimizer = PromptOptimizer()
+
+    content = "ПРИВЕТ, я ассистент\nОтвечай кратко\nthank YOU for asking\nИспользуй Python"
+
+    assert optimizer._remove_greetings(content) == "Отвечай кратко\nИспользуй Python"
+
+
+@pytest.mark.asyncio
+async def test_async_optimize_matches_sync():
+    """Test the thread-offloaded variant returns the same messages"""
+    optimizer = PromptOptimizer()
+    messages = [
+        LLMMessage(role="system", content="Привет!\nНеобходимо реализовать\n- a\n- b"),
+        LLMMessage(role="user", content="fix fix the bug"),
+    ]
+
+    assert await optimizer.aoptimize_for_small_model(messages, 200) == optimizer.optimize_for_small_model(messages, 200)
+
+
+def test_system_prompt_optimization_is_cached_per_rules():
+    """Test repeated system prompts hit the cache and rule changes miss it"""
+    from backend.core.prompt_optimizer import _optimize_system_prompt_cached
+
+    optimizer = PromptOptimizer()
+    content = "Привет!\nНеобходимо реализовать кэш кэш\n- a\n- b"
+    _optimize_system_prompt_cached.cache_clear()
+
+    first = optimizer._optimize_system_prompt(content, 500)
+    assert optimizer._optimize_system_prompt(content, 500) is first
+    assert _optimize_system_prompt_cached.cache_info().hits == 1
+
+    optimizer.remove_greetings = False
+    assert optimizer._optimize_system_prompt(content, 500).startswith("Привет")
+
+
+def test_compress_redundancy_collapses_adjacent_repeats():
+    """Test adjacent case-insensitive duplicate words collapse to the first spelling"""
+    assert PromptOptimizer._compress_redundancy("Fix fix  FIX the\nbug bug now fix") == "Fix the bug now fix"
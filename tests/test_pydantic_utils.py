@@ -0,0 +1,60 @@
+"""
+Tests for pydantic utilities
+"""
+
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from pydantic import BaseModel
+
+from backend.core.pydantic_utils import pydantic_to_dict, _DISPATCH
+
+
+class _Item(BaseModel):
+    name: str
+    count: int = 0
+
+
+class _Payload(dict):
+    pass
+
+
+class _LegacyModel:
+    def dict(self):
+        return {"legacy": True}
+
+
+def test_pydantic_to_dict_model():
+    """Test Pydantic models are dumped and their type is cached"""
+    assert pydantic_to_dict(_Item(name="a", count=2)) == {"name": "a", "count": 2}
+    assert pydantic_to_dict(_LegacyModel()) == {"legacy": True}
+    assert _Item in _DISPATCH
+
+
+def test_pydantic_to_dict_dicts():
+    """Test dicts and dict subclasses are returned as is"""
+    data = {"a": 1}
+    payload = _Payload(b=2)
+    
+    assert pydantic_to_dict(data) is data
+    assert pydantic_to_dict(payload) is payload
+
+
+def test_pydantic_to_dict_unknown():
+    """Test unsupported objects give an empty dict"""
+    assert pydantic_to_dict(42) == {}
+    assert pydantic_to_dict(None) == {}
+    assert pydantic_to_dict(SimpleNamespace(x=1)) == {}
+
+
+def test_pydantic_to_dict_instance_attributes():
+    """Test converters provided per instance are not cached by type"""
+    proxy = SimpleNamespace(model_dump=lambda: {"proxied": True})
+    mock = Mock()
+    mock.model_dump.return_value = {"mocked": True}
+    
+    assert pydantic_to_dict(SimpleNamespace()) == {}
+    assert pydantic_to_dict(proxy) == {"proxied": True}
+    assert pydantic_to_dict(mock) == {"mocked": True}
+    assert SimpleNamespace not in _DISPATCH
+    assert Mock not in _DISPATCH
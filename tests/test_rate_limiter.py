@@ -0,0 +1,111 @@
+"""
+Tests for rate limiter
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import backend.core.rate_limiter as rate_limiter_module
+from backend.core.rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter_module, "time", fake)
+    return fake
+
+
+def make_request(ip: str = "10.0.0.1", api_key: str = None):
+    headers = {"X-API-Key": api_key} if api_key else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=ip))
+
+
+def test_minute_limit_refills_over_time(clock):
+    """Test the per-minute limit blocks excess requests until tokens refill"""
+    limiter = RateLimiter(requests_per_minute=3, requests_per_hour=100, requests_per_day=1000)
+    request = make_request()
+
+    decisions = [limiter.is_allowed(request) for _ in range(4)]
+    assert [allowed for allowed, _, _ in decisions] == [True, True, True, False]
+    assert decisions[0][2] == {"per_minute": 2, "per_hour": 99, "per_day": 999}
+    assert decisions[-1][2] == limiter.get_remaining_requests(request) == {"per_minute": 0, "per_hour": 97, "per_day": 997}
+    # Другой клиент считается отдельно
+    assert limiter.is_allowed(make_request(ip="10.0.0.2"))[0]
+
+    # Токены пополняются равномерно: 1 запрос в минутном лимите - через 20 секунд
+    clock.now += 10
+    assert not limiter.is_allowed(request)[0]
+    clock.now += 10
+    assert limiter.is_allowed(request)[:2] == (True, None)
+    assert limiter.get_remaining_requests(request)["per_hour"] == 96
+
+
+def test_hour_limit_and_cleanup(clock):
+    """Test longer windows keep counting after the minute window expires"""
+    limiter = RateLimiter(requests_per_minute=10, requests_per_hour=2, requests_per_day=1000)
+    request = make_request(api_key="key")
+
+    assert limiter.is_allowed(request)[0]
+    clock.now += 120
+    assert limiter.is_allowed(request)[0]
+    clock.now += 120
+    allowed, message, _ = limiter.is_allowed(request)
+    assert not allowed and "per hour" in message
+
+    # Корзины снова полные - клиент удаляется при очистке
+    clock.now += 86400 + limiter.cleanup_interval
+    limiter._cleanup_old_requests()
+    assert limiter.requests == {}
+
+
+def test_middleware_returns_429_with_remaining_headers():
+    """Test the middleware rejects over-limit clients with a 429 body and sets headers"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from backend.core.rate_limiter import RateLimitMiddleware
+
+    app = FastAPI()
+
+    @app.get("/items")
+    def items():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, rate_limiter=RateLimiter(requests_per_minute=1))
+    client = TestClient(app)
+
+    ok = client.get("/items")
+    assert ok.status_code == 200
+    assert ok.headers["X-RateLimit-Remaining-Minute"] == "0"
+
+    limited = client.get("/items")
+    assert limited.status_code == 429
+    assert limited.json()["detail"]["remaining"]["per_minute"] == 0
+
+    # Системные endpoints не расходуют лимит
+    assert client.get("/openapi.json").status_code == 200
+    assert "X-RateLimit-Remaining-Minute" not in client.get("/docs").headers
+
+
+def test_concurrent_threads_never_exceed_limit():
+    """Test sharded locking admits exactly the limit under thread contention"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    limiter = RateLimiter(requests_per_minute=50, requests_per_hour=10_000, requests_per_day=10_000)
+    requests = [make_request(ip=f"10.0.0.{i % 4}") for i in range(800)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        decisions = list(pool.map(lambda r: limiter.is_allowed(r)[0], requests))
+
+    assert sum(decisions) == 4 * 50
+    assert len(limiter.requests) == 4
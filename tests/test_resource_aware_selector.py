@@ -0,0 +1,323 @@
+"""
+Tests for resource-aware model selector
+"""
+
+import pytest
+from backend.core.types import ModelTier, ModelSelection
+from backend.core.resource_aware_selector import (
+    ResourceAwareSelector, ResourceInfo, ResourceLevel, _classify_size, _build_tier_index,
+    SIZE_UNKNOWN, SIZE_TINY, SIZE_SMALL, SIZE_MEDIUM, SIZE_LARGE, SIZE_XL
+)
+
+
+def _resources(models):
+    tiers = {m: _classify_size(m.lower()) for m in models}
+    return ResourceInfo(
+        level=ResourceLevel.LOW,
+        available_models=list(models),
+        available_models_set=frozenset(models),
+        size_tiers=tiers,
+        by_tier=_build_tier_index(tiers)
+    )
+
+
+def test_classify_size():
+    """Test model size is parsed from the name without substring false positives"""
+    assert _classify_size("gemma3:1b") == SIZE_TINY
+    assert _classify_size("tinyllama") == SIZE_TINY
+    assert _classify_size("llama3.1:8b") == SIZE_SMALL
+    assert _classify_size("mixtral:8x7b") == SIZE_SMALL
+    assert _classify_size("qwen2.5:14b-instruct") == SIZE_MEDIUM
+    assert _classify_size("codellama:34b") == SIZE_LARGE
+    assert _classify_size("llama3:70b") == SIZE_XL
+    assert _classify_size("mistral") == SIZE_UNKNOWN
+    # "13b" не должен считаться "3b"
+    assert _classify_size("llama2:13b") == SIZE_MEDIUM
+
+
+def test_determine_resource_level():
+    """Test resource level follows the largest available model"""
+    selector = ResourceAwareSelector()
+    level = selector._determine_resource_level
+    assert level({}) == ResourceLevel.MINIMAL
+    assert level({"mistral": SIZE_UNKNOWN}) == ResourceLevel.LOW
+    assert level({"a": SIZE_TINY, "b": SIZE_MEDIUM}) == ResourceLevel.MEDIUM
+    assert level({"a": SIZE_LARGE}) == ResourceLevel.HIGH
+    assert level({"a": SIZE_SMALL, "b": SIZE_XL}) == ResourceLevel.MAXIMUM
+
+
+def test_find_fallback_models():
+    """Test fallback models are taken from the cached tier index"""
+    selector = ResourceAwareSelector()
+    resources = _resources(["gemma3:1b", "tinyllama", "llama3.1:8b", "llama3:70b", "mistral", "llama2"])
+    
+    assert selector._find_fallback_models("gemma3:1b", resources, "low") == ["tinyllama"]
+    # Модели без размера в названии (mistral, llama2) не идут в fallback для сложных задач
+    assert selector._find_fallback_models("mistral", resources, "high") == ["llama3:70b", "llama3.1:8b"]
+    assert selector._find_fallback_models("llama3:70b", resources, "high") == ["llama3.1:8b"]
+    assert selector._find_fallback_models("mistral", resources, "medium") == [
+        "gemma3:1b", "tinyllama", "llama3.1:8b"
+    ]
+
+
+def test_estimate_complexity():
+    """Test complexity heuristic by length and keywords"""
+    selector = ResourceAwareSelector()
+    assert selector._estimate_complexity("Привет") == "low"
+    assert selector._estimate_complexity("Напиши функцию сортировки списка чисел по убыванию значения") == "medium"
+    assert selector._estimate_complexity("Создай веб-приложение для учёта задач команды с авторизацией") == "high"
+    assert selector._estimate_complexity("Build a small GAME loop with a score counter and a restart") == "high"
+    assert selector._estimate_complexity("x" * 250) == "high"
+
+
+def test_find_alternative_model():
+    """Test unavailable model is replaced by an available one of the same tier"""
+    selector = ResourceAwareSelector()
+    resources = _resources(["gemma3:1b", "qwen2.5:14b", "llama3:70b"])
+    
+    def pick(tier):
+        selection = ModelSelection(model="missing", provider="ollama", tier=tier)
+        return selector._find_alternative_model(selection, resources, "medium").model
+    
+    assert pick(ModelTier.FAST) == "gemma3:1b"
+    assert pick(ModelTier.BALANCED) == "qwen2.5:14b"
+    assert pick(ModelTier.POWERFUL) == "llama3:70b"
+
+
+@pytest.mark.asyncio
+async def test_gpu_info_is_cached(monkeypatch):
+    """Test GPU memory is not re-queried once known"""
+    import asyncio
+    selector = ResourceAwareSelector()
+    selector._gpu_info_cached = (24.0, 3, 72.0)
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("nvidia-smi should not be called")
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fail)
+    
+    assert await selector._estimate_gpu_memory() == (24.0, 3, 72.0)
+
+
+class _FakeOllama:
+    def __init__(self, models):
+        self.models = models
+        self.calls = 0
+    
+    async def list_models(self):
+        self.calls += 1
+        return list(self.models)
+
+
+class _FakeManager:
+    def __init__(self, provider):
+        self.providers = {"ollama": provider}
+
+
+@pytest.mark.asyncio
+async def test_discover_resources(monkeypatch):
+    """Test discovery collects models and system info into a cached ResourceInfo"""
+    import backend.core.resource_aware_selector as ras
+    monkeypatch.setattr(ras, "_CPU_CORES", 24)
+    monkeypatch.setattr(ras, "_TOTAL_MEMORY_GB", 64.0)
+    provider = _FakeOllama(["gemma3:1b", "qwen2.5:14b"])
+    selector = ResourceAwareSelector()
+    selector.llm_manager = _FakeManager(provider)
+    selector._gpu_info_cached = (24.0, 1, 24.0)
+    
+    info = await selector.discover_resources()
+    assert info.available_models == ["gemma3:1b", "qwen2.5:14b"]
+    assert info.level == ResourceLevel.MEDIUM
+    assert info.available_models_set == {"gemma3:1b", "qwen2.5:14b"}
+    assert info.size_tiers == {"gemma3:1b": SIZE_TINY, "qwen2.5:14b": SIZE_MEDIUM}
+    assert info.gpu_memory_gb == 24.0
+    assert info.cpu_cores == 24
+    assert info.total_memory_gb == 64.0
+    
+    assert await selector.discover_resources() is info
+    assert provider.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_discovery_is_single_flight():
+    """Test concurrent callers on an expired cache share one refresh"""
+    import asyncio
+    
+    class SlowOllama(_FakeOllama):
+        async def list_models(self):
+            await asyncio.sleep(0.05)
+            return await super().list_models()
+    
+    provider = SlowOllama(["mistral:7b"])
+    selector = ResourceAwareSelector()
+    selector.llm_manager = _FakeManager(provider)
+    selector._gpu_info_cached = (8.0, 1, 8.0)
+    
+    results = await asyncio.gather(*(selector.discover_resources() for _ in range(5)))
+    assert provider.calls == 1
+    assert all(info is results[0] for info in results)
+    assert selector._inflight is None
+
+
+def test_adaptation_flags():
+    """Test prompt optimization and decomposition follow resource level and config"""
+    import dataclasses
+    selector = ResourceAwareSelector()
+    assert selector.should_optimize_prompt(ResourceLevel.LOW)
+    assert not selector.should_optimize_prompt(ResourceLevel.HIGH)
+    assert selector.should_decompose_task(ResourceLevel.MINIMAL, "high")
+    assert not selector.should_decompose_task(ResourceLevel.MINIMAL, "medium")
+    
+    selector.adaptation_config = dataclasses.replace(selector.adaptation_config, enable_prompt_optimization=False)
+    assert not selector.should_optimize_prompt(ResourceLevel.LOW)
+
+
+def test_estimates_use_passed_metrics():
+    """Test quality and speed estimates blend in the given model metrics"""
+    from backend.core.model_performance_tracker import ModelMetrics
+    selector = ResourceAwareSelector()
+    selection = ModelSelection(model="mistral:7b", provider="ollama", tier=ModelTier.BALANCED)
+    resources = _resources(["mistral:7b"])
+    
+    fresh = ModelMetrics(model_name="mistral:7b", provider="ollama")
+    assert selector._estimate_quality(selection, ResourceLevel.HIGH, "medium", fresh) == pytest.approx(0.8)
+    assert selector._estimate_speed(selection, resources, fresh) == 20.0
+    
+    used = ModelMetrics(model_name="mistral:7b", provider="ollama")
+    used.update(duration=2.0, tokens=100, success=True)
+    assert selector._estimate_quality(selection, ResourceLevel.HIGH, "medium", used) == pytest.approx(0.9)
+    assert selector._estimate_speed(selection, resources, used) == pytest.approx(50.0)
+
+
+@pytest.mark.asyncio
+async def test_distributed_discovery_merges_servers():
+    """Test models from available servers are merged without duplicates"""
+    from types import SimpleNamespace
+    
+    class FakeRouter:
+        async def discover_all_servers(self):
+            return {
+                "a": SimpleNamespace(is_available=True, available_models=["llama3:8b", "gemma3:1b"]),
+                "b": SimpleNamespace(is_available=False, available_models=["llama3:70b"]),
+                "c": SimpleNamespace(is_available=True, available_models=["gemma3:1b", "qwen2.5:14b"]),
+            }
+    
+    selector = ResourceAwareSelector()
+    selector.distributed_router = FakeRouter()
+    assert await selector._discover_models() == ["llama3:8b", "gemma3:1b", "qwen2.5:14b"]
+
+
+def test_fallback_selection():
+    """Test simple fallback picks the first available model and its tier"""
+    selector = ResourceAwareSelector()
+    result = selector._fallback_selection(_resources(["gemma3:1b", "mistral:7b", "llama3:70b"]), "low")
+    assert result.model == "gemma3:1b"
+    assert result.tier == ModelTier.FAST
+    assert result.fallback_models == ["mistral:7b", "llama3:70b"]
+    assert not hasattr(result, "__dict__")
+    
+    with pytest.raises(ValueError):
+        selector._fallback_selection(_resources([]), "low")
+
+
+def test_estimate_capacity():
+    """Test capacity lookup table for single, multi-GPU and large rigs"""
+    selector = ResourceAwareSelector()
+    capacity = selector._estimate_capacity
+    assert capacity(ResourceLevel.MINIMAL, None, 8, 0) == 1
+    assert capacity(ResourceLevel.LOW, 6.0, 2, 1) == 1
+    assert capacity(ResourceLevel.MEDIUM, 16.0, 8, 1) == 7
+    assert capacity(ResourceLevel.MAXIMUM, 24.0, 24, 3) == 50
+    assert capacity(ResourceLevel.MEDIUM, 12.0, 16, 2) == 14
+    # Вне таблицы - тот же расчёт напрямую
+    assert capacity(ResourceLevel.MINIMAL, 10.0, 8, 12) == 9
+
+
+def _selector_with_models(models):
+    selector = ResourceAwareSelector()
+    selector.llm_manager = _FakeManager(_FakeOllama(models))
+    selector._gpu_info_cached = (24.0, 1, 24.0)
+    return selector
+
+
+class _SlowSmartSelector:
+    def __init__(self, model, fail=False):
+        self.model = model
+        self.fail = fail
+    
+    async def select_model(self, **kwargs):
+        import asyncio
+        await asyncio.sleep(0.1)
+        if self.fail:
+            raise RuntimeError("selector down")
+        return ModelSelection(model=self.model, provider="ollama", tier=ModelTier.BALANCED)
+
+
+@pytest.mark.asyncio
+async def test_select_adaptive_model_runs_routers_concurrently():
+    """Test intelligent routing and local selection are awaited together"""
+    import asyncio
+    import time
+    from types import SimpleNamespace
+    
+    class SlowIntelligentRouter:
+        async def select_model(self, **kwargs):
+            await asyncio.sleep(0.1)
+            return SimpleNamespace(
+                profile=SimpleNamespace(name="qwen2.5:14b"),
+                server_name="gpu-1", server_url="http://gpu-1:11434", reason="best fit",
+                total_score=0.9, capability_score=0.8, performance_score=0.7,
+                quality_score=0.85, speed_score=30.0
+            )
+    
+    selector = _selector_with_models(["mistral:7b", "qwen2.5:14b"])
+    selector.smart_selector = _SlowSmartSelector("mistral:7b")
+    selector.intelligent_router = SlowIntelligentRouter()
+    await selector.discover_resources()
+    
+    start = time.perf_counter()
+    result = await selector.select_adaptive_model("Напиши функцию сортировки списка чисел по убыванию значения")
+    assert time.perf_counter() - start < 0.19
+    assert result.model == "qwen2.5:14b"
+    assert result.server_url == "http://gpu-1:11434"
+    assert result.used_distributed_routing
+
+
+@pytest.mark.asyncio
+async def test_select_adaptive_model_falls_back_on_selector_error():
+    """Test a failing smart selector falls back to the first available model"""
+    selector = _selector_with_models(["mistral:7b", "gemma3:1b"])
+    selector.smart_selector = _SlowSmartSelector("mistral:7b", fail=True)
+    
+    result = await selector.select_adaptive_model("Привет")
+    assert result.reason == "Fallback selection"
+    assert result.model == "mistral:7b"
+
+
+@pytest.mark.asyncio
+async def test_selection_cache_until_resource_refresh():
+    """Test identical selections are served from cache until resources refresh"""
+    import dataclasses
+    
+    class CountingSelector(_SlowSmartSelector):
+        calls = 0
+        
+        async def select_model(self, **kwargs):
+            CountingSelector.calls += 1
+            return ModelSelection(model=self.model, provider="ollama", tier=ModelTier.BALANCED)
+    
+    selector = _selector_with_models(["mistral:7b"])
+    selector.smart_selector = CountingSelector("mistral:7b")
+    
+    first = await selector.select_adaptive_model("Привет", task_type="chat")
+    second = await selector.select_adaptive_model("Как дела?", task_type="chat")
+    assert second is first
+    assert CountingSelector.calls == 1
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        first.model = "other"
+    
+    await selector.select_adaptive_model("Привет", task_type="code")
+    assert CountingSelector.calls == 2
+    
+    selector._last_resource_check = 0.0
+    await selector.select_adaptive_model("Привет", task_type="chat")
+    assert CountingSelector.calls == 3
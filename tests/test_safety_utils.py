@@ -0,0 +1,22 @@
+"""
+Tests for safety utilities
+"""
+
+import asyncio
+import signal
+
+from backend.core.safety_utils import _graceful_shutdown
+
+
+def test_graceful_shutdown_cancels_tasks_and_stops_loop():
+    """Test shutdown cancels pending coroutines before stopping the loop"""
+    loop = asyncio.new_event_loop()
+    try:
+        worker = loop.create_task(asyncio.sleep(3600))
+        loop.call_soon(lambda: loop.create_task(_graceful_shutdown(signal.SIGTERM)))
+        loop.run_forever()
+        
+        assert worker.cancelled()
+        assert not loop.is_running()
+    finally:
+        loop.close()